@@ -7,16 +7,28 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 import os
 from dotenv import load_dotenv
+from app.utils.database import (
+    RoutingSession,
+    configure_engine,
+    create_missing_columns,
+    create_missing_indexes,
+    engine_options,
+    init_replica_routing,
+    replica_binds
+)
+from app.utils.conditional import init_conditional_requests
+from app.utils.serialization import FastJSONProvider
 
 load_dotenv()
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 
 
 def create_app(config_name: str = None) -> Flask:
     """Create and configure the Flask application."""
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     
     # Configuration
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
@@ -31,13 +43,31 @@ def create_app(config_name: str = None) -> Flask:
         database_url = 'sqlite:///study_companion.db'
     
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(database_url)
+    # Optional read replicas for GET traffic (comma separated URLs)
+    app.config['SQLALCHEMY_BINDS'] = replica_binds(os.getenv('DATABASE_REPLICA_URLS', ''))
+    app.config['REPLICA_STICKY_SECONDS'] = float(os.getenv('REPLICA_STICKY_SECONDS', '5'))
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Result cache for list endpoints: in-process LRU, or shared through Redis
+    app.config['RESULT_CACHE_SIZE'] = int(os.getenv('RESULT_CACHE_SIZE', '1024'))
+    app.config['RESULT_CACHE_URL'] = os.getenv('RESULT_CACHE_URL')
+    app.config['RESULT_CACHE_TTL'] = int(os.getenv('RESULT_CACHE_TTL', '3600'))
+    app.config['SCHEDULER'] = os.getenv('SCHEDULER', 'fsrs')
+    app.config['DESIRED_RETENTION'] = float(os.getenv('DESIRED_RETENTION', '0.9'))
+    app.config['DUE_QUEUE'] = os.getenv('DUE_QUEUE', 'false').lower() in ('1', 'true', 'yes')
+    # Let the language model judge short answers the local rules mark wrong
+    app.config['SEMANTIC_GRADING'] = os.getenv('SEMANTIC_GRADING', 'false').lower() in ('1', 'true', 'yes')
     app.config['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
     app.config['OPENAI_BASE_URL'] = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1')
     
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
+    with app.app_context():
+        for engine in db.engines.values():
+            configure_engine(engine)
+    init_replica_routing(app)
+    init_conditional_requests(app)
     
     # Configure CORS - allow frontend and localhost for development
     frontend_url = os.getenv('FRONTEND_URL', 'http://localhost:3000').rstrip('/')
@@ -45,6 +75,7 @@ def create_app(config_name: str = None) -> Flask:
          origins=[frontend_url, 'http://localhost:3000', 'http://localhost:3001'],
          supports_credentials=True,
          allow_headers=['Content-Type', 'Authorization'],
+         expose_headers=['X-Next-Cursor', 'Link', 'ETag', 'Last-Modified'],
          methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS', 'PATCH'])
     
     # Register blueprints
@@ -54,6 +85,8 @@ def create_app(config_name: str = None) -> Flask:
     from app.routes.quizzes import quizzes_bp
     from app.routes.tutor import tutor_bp
     from app.routes.subjects import subjects_bp
+    from app.routes.search import search_bp
+    from app.routes.sync import sync_bp
     
     app.register_blueprint(lectures_bp, url_prefix='/api/lectures')
     app.register_blueprint(notes_bp, url_prefix='/api/notes')
@@ -61,6 +94,8 @@ def create_app(config_name: str = None) -> Flask:
     app.register_blueprint(quizzes_bp, url_prefix='/api/quizzes')
     app.register_blueprint(tutor_bp, url_prefix='/api/tutor')
     app.register_blueprint(subjects_bp, url_prefix='/api/subjects')
+    app.register_blueprint(search_bp, url_prefix='/api/search')
+    app.register_blueprint(sync_bp, url_prefix='/api/sync')
     
     # Health check endpoint
     @app.route('/api/health')
@@ -69,6 +104,52 @@ def create_app(config_name: str = None) -> Flask:
     
     # Create database tables
     with app.app_context():
-        db.create_all()
+        # Replicas are read-only copies of the primary's schema
+        db.create_all(bind_key=None)
+        create_missing_columns(db.engine, db.metadata)
+        create_missing_indexes(db.engine, db.metadata)
+        
+        # Dictionaries for compressed text columns
+        from app.models.types import dictionaries
+        dictionaries.load()
+    
+    from app.commands import register_commands
+    register_commands(app)
+    
+    # Full-text search: FTS5 on SQLite, tsvector/GIN on Postgres
+    from app.services.search_service import search_service
+    search_service.init_app(app)
+    
+    # Near-duplicate (MinHash/LSH) index over cards and quiz questions
+    from app.services.dedupe_service import dedupe_service
+    dedupe_service.init_app(app)
+    
+    # Versioned result cache, invalidated by commits touching a subject
+    from app.services.cache_service import cache_service
+    cache_service.init_app(app)
+    
+    # Change log behind delta sync for offline clients
+    from app.services.sync_service import sync_service
+    sync_service.init_app(app)
+    
+    # Spaced-repetition model for flashcard reviews
+    from app.services.scheduler_service import scheduler_service
+    scheduler_service.init_app(app)
+    
+    # Due-card lookups, optionally from a precomputed daily queue
+    from app.services.due_queue_service import due_queue_service
+    due_queue_service.init_app(app)
+    
+    # Per-subject dashboard totals, maintained on write
+    from app.services.dashboard_service import dashboard_service
+    dashboard_service.init_app(app)
+    
+    # Per-question difficulty and discrimination, maintained on write
+    from app.services.question_stats_service import question_stats_service
+    question_stats_service.init_app(app)
+    
+    # Passages of notes and lectures retrieved for the AI tutor
+    from app.services.retrieval_service import retrieval_service
+    retrieval_service.init_app(app)
     
     return app
@@ -0,0 +1,299 @@
+"""
+Maintenance and data migration commands (``flask <command>``)
+
+The schema itself is created by ``db.create_all()``; these commands move
+existing databases onto newer column layouts in place.
+"""
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, column, insert, inspect, select, text, update
+from app import db
+
+
+def register_commands(app) -> None:
+    """Attach the maintenance commands to the app's CLI."""
+    app.cli.add_command(compress_text_command)
+    app.cli.add_command(train_compression_dict_command)
+    app.cli.add_command(cascade_deletes_command)
+    app.cli.add_command(quiz_json_command)
+
+
+def compressed_columns():
+    from app.models import Lecture, Note, ChatMessage
+    return [
+        (Lecture, 'transcription'),
+        (Lecture, 'summary'),
+        (Note, 'content'),
+        (ChatMessage, 'content'),
+    ]
+
+
+@click.command('compress-text')
+@with_appcontext
+@click.option('--batch-size', default=500, show_default=True)
+@click.option('--recompress', is_flag=True, help='Also rewrite rows that are already compressed.')
+def compress_text_command(batch_size: int, recompress: bool):
+    """Convert large text columns to compressed storage."""
+    from app.models.types import MAGIC, MIN_COMPRESS_BYTES, decompress_text
+
+    engine = db.engine
+    for model, name in compressed_columns():
+        table = model.__table__
+        if engine.dialect.name == 'postgresql':
+            data_type = db.session.execute(text(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_name = :table AND column_name = :column"
+            ), {'table': table.name, 'column': name}).scalar()
+            if data_type == 'text':
+                db.session.execute(text(
+                    f'ALTER TABLE {table.name} ALTER COLUMN {name} '
+                    f"TYPE bytea USING convert_to({name}, 'UTF8')"
+                ))
+                db.session.commit()
+
+        # Read the raw stored value so already-compressed rows can be skipped
+        raw = column(name)
+        statement = update(table).where(table.c.id == bindparam('row_id')).values(
+            {name: bindparam('value', type_=table.c[name].type)}
+        )
+        last_id, rewritten = 0, 0
+        while True:
+            rows = db.session.execute(
+                select(table.c.id, raw).select_from(table)
+                .where(table.c.id > last_id, raw.isnot(None))
+                .order_by(table.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            params = []
+            for row_id, value in rows:
+                stored = value.encode('utf-8') if isinstance(value, str) else bytes(value)
+                if stored.startswith(MAGIC):
+                    if not recompress:
+                        continue
+                elif len(stored) < MIN_COMPRESS_BYTES:
+                    # Short values are stored as plain UTF-8 anyway
+                    continue
+                params.append({'row_id': row_id, 'value': decompress_text(value)})
+            if params:
+                db.session.execute(statement, params, execution_options={'synchronize_session': False})
+                db.session.commit()
+                rewritten += len(params)
+        click.echo(f'{table.name}.{name}: rewrote {rewritten} rows')
+
+
+@click.command('train-compression-dict')
+@with_appcontext
+@click.option('--samples', default=1000, show_default=True, help='Number of recent transcripts to sample.')
+@click.option('--codec', type=click.Choice(['zstd', 'zlib']), default=None)
+def train_compression_dict_command(samples: int, codec: str):
+    """Train a compression dictionary on lecture transcripts."""
+    from app.models import Lecture, CompressionDictionary
+    from app.models.types import default_codec, dictionaries, train_dictionary
+
+    codec = codec or default_codec()
+    texts = db.session.execute(
+        select(Lecture.transcription)
+        .where(Lecture.transcription.isnot(None))
+        .order_by(Lecture.id.desc()).limit(samples)
+    ).scalars().all()
+    if not texts:
+        raise click.ClickException('No transcripts to train on')
+
+    data = train_dictionary(texts, codec=codec)
+    db.session.add(CompressionDictionary(codec=codec, data=data, sample_count=len(texts)))
+    db.session.commit()
+    dictionaries.register(codec, data)
+    click.echo(
+        f'Trained a {len(data)} byte {codec} dictionary on {len(texts)} transcripts; '
+        'run "flask compress-text --recompress" to apply it to existing rows'
+    )
+
+
+def stale_foreign_keys(connection):
+    """Tables whose foreign keys lack the ``ondelete`` rule declared on the model.
+
+    Yields ``(table, [(reflected_fk, model_fk), ...])``.
+    """
+    inspector = inspect(connection)
+    existing = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        reflected = {
+            (tuple(fk['constrained_columns']), fk['referred_table']): fk
+            for fk in inspector.get_foreign_keys(table.name)
+        }
+        stale = []
+        for fk in table.foreign_key_constraints:
+            if not fk.ondelete:
+                continue
+            current = reflected.get((tuple(fk.column_keys), fk.referred_table.name))
+            if current is None or (current.get('options') or {}).get('ondelete', '').upper() != fk.ondelete:
+                stale.append((current, fk))
+        if stale:
+            yield table, stale
+
+
+def _rebuild_sqlite_table(connection, table) -> None:
+    """SQLite cannot alter constraints; copy the table into a fresh definition."""
+    old_name = f'{table.name}__old'
+    old_columns = {c['name'] for c in inspect(connection).get_columns(table.name)}
+    columns = ', '.join(c.name for c in table.columns if c.name in old_columns)
+
+    connection.exec_driver_sql(f'ALTER TABLE {table.name} RENAME TO {old_name}')
+    # Index names are global in SQLite and stay with the renamed table
+    for (index_name,) in connection.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+        (old_name,)
+    ).all():
+        connection.exec_driver_sql(f'DROP INDEX {index_name}')
+    table.create(connection)
+    connection.exec_driver_sql(
+        f'INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {old_name}'
+    )
+    connection.exec_driver_sql(f'DROP TABLE {old_name}')
+
+
+def _remove_orphans(connection, table) -> None:
+    """Apply each foreign key's ondelete rule to rows whose parent is already gone.
+
+    SQLite never enforced the keys, so e.g. chat messages of deleted subjects
+    still point at them.
+    """
+    for fk in table.foreign_key_constraints:
+        if not fk.ondelete:
+            continue
+        column, parent = fk.column_keys[0], fk.elements[0].column
+        orphaned = (f'{column} IS NOT NULL AND {column} NOT IN '
+                    f'(SELECT {parent.name} FROM {parent.table.name})')
+        if fk.ondelete == 'SET NULL':
+            connection.exec_driver_sql(f'UPDATE {table.name} SET {column} = NULL WHERE {orphaned}')
+        else:
+            connection.exec_driver_sql(f'DELETE FROM {table.name} WHERE {orphaned}')
+
+
+@click.command('cascade-deletes')
+@with_appcontext
+def cascade_deletes_command():
+    """Add ON DELETE CASCADE to foreign keys of an existing database."""
+    engine = db.engine
+    sqlite = engine.dialect.name == 'sqlite'
+    with engine.connect() as connection:
+        if sqlite:
+            dbapi_connection = connection.connection.driver_connection
+            # pysqlite only opens transactions before DML; run the table
+            # rebuilds inside one explicit transaction instead
+            dbapi_connection.isolation_level = None
+            # Must be off, and set outside a transaction, or swapping a
+            # parent table would cascade-delete its children
+            connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            connection.exec_driver_sql('PRAGMA legacy_alter_table=ON')
+            connection.exec_driver_sql('BEGIN')
+
+        try:
+            stale = list(stale_foreign_keys(connection))
+            for table, foreign_keys in stale:
+                if sqlite:
+                    _rebuild_sqlite_table(connection, table)
+                    _remove_orphans(connection, table)
+                else:
+                    for current, fk in foreign_keys:
+                        if current is not None:
+                            connection.execute(text(
+                                f'ALTER TABLE {table.name} DROP CONSTRAINT {current["name"]}'
+                            ))
+                        name = current['name'] if current is not None else f'{table.name}_{fk.column_keys[0]}_fkey'
+                        connection.execute(text(
+                            f'ALTER TABLE {table.name} ADD CONSTRAINT {name} '
+                            f'FOREIGN KEY ({", ".join(fk.column_keys)}) '
+                            f'REFERENCES {fk.referred_table.name} '
+                            f'({", ".join(e.column.name for e in fk.elements)}) '
+                            f'ON DELETE {fk.ondelete}'
+                        ))
+                click.echo(f'{table.name}: ' + ', '.join(
+                    f'{fk.column_keys[0]} ON DELETE {fk.ondelete}' for _, fk in foreign_keys
+                ))
+
+            if sqlite:
+                violations = connection.exec_driver_sql('PRAGMA foreign_key_check').all()
+                if violations:
+                    raise click.ClickException(
+                        f'{len(violations)} rows still reference missing parents; nothing was changed'
+                    )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            if sqlite:
+                connection.exec_driver_sql('PRAGMA legacy_alter_table=OFF')
+                connection.exec_driver_sql('PRAGMA foreign_keys=ON')
+                connection.commit()
+                dbapi_connection.isolation_level = ''
+
+    if not stale:
+        click.echo('Foreign keys already cascade')
+
+
+@click.command('quiz-json')
+@with_appcontext
+@click.option('--batch-size', default=500, show_default=True)
+def quiz_json_command(batch_size: int):
+    """Move quiz options/answers to native JSON and fill per-question answers."""
+    from app.models import QuizQuestion, QuizAttempt, QuizAttemptAnswer
+
+    if db.engine.dialect.name == 'postgresql':
+        for table, name in (('quiz_questions', 'options'), ('quiz_attempts', 'answers')):
+            data_type = db.session.execute(text(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_name = :table AND column_name = :column"
+            ), {'table': table, 'column': name}).scalar()
+            if data_type == 'text':
+                db.session.execute(text(
+                    f'ALTER TABLE {table} ALTER COLUMN {name} '
+                    f"TYPE jsonb USING NULLIF({name}, '')::jsonb"
+                ))
+                db.session.commit()
+                click.echo(f'{table}.{name}: converted to jsonb')
+    # SQLite keeps JSON as text, which the existing rows already are
+
+    answered = select(QuizAttemptAnswer.id).where(QuizAttemptAnswer.attempt_id == QuizAttempt.id)
+    last_id, filled = 0, 0
+    while True:
+        attempts = db.session.execute(
+            select(QuizAttempt.id, QuizAttempt.quiz_id, QuizAttempt.answers)
+            .where(QuizAttempt.id > last_id, ~answered.exists())
+            .order_by(QuizAttempt.id).limit(batch_size)
+        ).all()
+        if not attempts:
+            break
+        last_id = attempts[-1].id
+
+        questions = db.session.execute(
+            select(QuizQuestion.id, QuizQuestion.quiz_id, QuizQuestion.correct_answer, QuizQuestion.points)
+            .where(QuizQuestion.quiz_id.in_({a.quiz_id for a in attempts}))
+        ).all()
+        rows = []
+        for attempt in attempts:
+            answers = attempt.answers or {}
+            for question in questions:
+                if question.quiz_id != attempt.quiz_id:
+                    continue
+                answer = answers.get(str(question.id))
+                # Same rule submit_quiz graded with
+                is_correct = bool(answer) and isinstance(answer, str) and \
+                    answer.strip().lower() == question.correct_answer.strip().lower()
+                rows.append({
+                    'attempt_id': attempt.id,
+                    'question_id': question.id,
+                    'answer': answer if answer is None or isinstance(answer, str) else str(answer),
+                    'is_correct': is_correct,
+                    'points_awarded': question.points if is_correct else 0,
+                })
+        if rows:
+            db.session.execute(insert(QuizAttemptAnswer), rows)
+        db.session.commit()
+        filled += len(attempts)
+    click.echo(f'quiz_attempt_answers: filled {filled} attempts')
@@ -7,10 +7,24 @@ from app.models.models import (
     Note,
     FlashcardSet,
     Flashcard,
+    AppliedReviewEvent,
+    DueQueueEntry,
+    ReviewLog,
+    MinHashSignature,
+    MinHashBand,
+    TextChunk,
+    NEW_CARD_DUE,
     Quiz,
     QuizQuestion,
     QuizAttempt,
-    ChatMessage
+    QuizAttemptAnswer,
+    SemanticGrade,
+    ChatMessage,
+    ChangeLogEntry,
+    SubjectStats,
+    QuestionStats,
+    SubjectDailyStats,
+    CompressionDictionary
 )
 
 __all__ = [
@@ -19,8 +33,22 @@ __all__ = [
     'Note',
     'FlashcardSet',
     'Flashcard',
+    'AppliedReviewEvent',
+    'DueQueueEntry',
+    'ReviewLog',
+    'MinHashSignature',
+    'MinHashBand',
+    'TextChunk',
+    'NEW_CARD_DUE',
     'Quiz',
     'QuizQuestion',
     'QuizAttempt',
-    'ChatMessage'
+    'QuizAttemptAnswer',
+    'SemanticGrade',
+    'ChatMessage',
+    'ChangeLogEntry',
+    'SubjectStats',
+    'QuestionStats',
+    'SubjectDailyStats',
+    'CompressionDictionary'
 ]
@@ -2,7 +2,9 @@
 Database Models for AI Study Companion
 """
 from app import db
-from datetime import datetime
+from app.models.types import CompressedText, JSONDocument
+from app.utils.fields import ALL_FIELDS, FieldSelection
+from datetime import date, datetime
 from typing import Optional
 
 
@@ -16,123 +18,185 @@ class Subject(db.Model):
     color: str = db.Column(db.String(7), default='#3B82F6')  # Hex color
     created_at: datetime = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at: datetime = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Also moves when related rows shown in its body change; drives ETags only
+    etag_at: Optional[datetime] = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    lectures = db.relationship('Lecture', backref='subject', lazy='dynamic', cascade='all, delete-orphan')
-    notes = db.relationship('Note', backref='subject', lazy='dynamic', cascade='all, delete-orphan')
-    flashcard_sets = db.relationship('FlashcardSet', backref='subject', lazy='dynamic', cascade='all, delete-orphan')
-    quizzes = db.relationship('Quiz', backref='subject', lazy='dynamic', cascade='all, delete-orphan')
+    lectures = db.relationship('Lecture', backref='subject', lazy='dynamic', cascade='all, delete-orphan',
+                               passive_deletes=True)
+    notes = db.relationship('Note', backref='subject', lazy='dynamic', cascade='all, delete-orphan',
+                            passive_deletes=True)
+    flashcard_sets = db.relationship('FlashcardSet', backref='subject', lazy='dynamic', cascade='all, delete-orphan',
+                                     passive_deletes=True)
+    quizzes = db.relationship('Quiz', backref='subject', lazy='dynamic', cascade='all, delete-orphan',
+                              passive_deletes=True)
     
-    def to_dict(self) -> dict:
-        return {
+    def to_dict(self, fields: FieldSelection = ALL_FIELDS) -> dict:
+        data = {
             'id': self.id,
             'name': self.name,
             'description': self.description,
             'color': self.color,
             'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'lecture_count': self.lectures.count(),
-            'note_count': self.notes.count(),
-            'flashcard_set_count': self.flashcard_sets.count(),
-            'quiz_count': self.quizzes.count()
+            'updated_at': self.updated_at.isoformat()
         }
+        if 'lecture_count' in fields:
+            data['lecture_count'] = self.lectures.count()
+        if 'note_count' in fields:
+            data['note_count'] = self.notes.count()
+        if 'flashcard_set_count' in fields:
+            data['flashcard_set_count'] = self.flashcard_sets.count()
+        if 'quiz_count' in fields:
+            data['quiz_count'] = self.quizzes.count()
+        return fields.filter(data)
 
 
 class Lecture(db.Model):
     """Lecture model for storing transcriptions and recordings."""
     __tablename__ = 'lectures'
+    __deferrable__ = ('transcription', 'summary')
+    __table_args__ = (
+        db.Index('ix_lectures_subject_created', 'subject_id', 'created_at', 'id'),
+        db.Index('ix_lectures_created', 'created_at', 'id'),
+    )
     
     id: int = db.Column(db.Integer, primary_key=True)
     title: str = db.Column(db.String(300), nullable=False)
     source_type: str = db.Column(db.String(50), nullable=False)  # 'live', 'youtube', 'upload'
     source_url: Optional[str] = db.Column(db.String(500))
-    transcription: Optional[str] = db.Column(db.Text)
-    summary: Optional[str] = db.Column(db.Text)
+    # Compressed, and only loaded (and decompressed) on first access
+    transcription = db.deferred(db.Column(CompressedText))  # Optional[str]
+    summary = db.deferred(db.Column(CompressedText))  # Optional[str]
     duration_seconds: Optional[int] = db.Column(db.Integer)
-    subject_id: int = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False)
+    subject_id: int = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'), nullable=False)
     created_at: datetime = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at: datetime = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Also moves when related rows shown in its body change; drives ETags only
+    etag_at: Optional[datetime] = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    notes = db.relationship('Note', backref='lecture', lazy='dynamic', cascade='all, delete-orphan')
+    notes = db.relationship('Note', backref='lecture', lazy='dynamic', cascade='all, delete-orphan',
+                            passive_deletes=True)
     
-    def to_dict(self) -> dict:
-        return {
+    def to_dict(self, fields: FieldSelection = ALL_FIELDS) -> dict:
+        # Large and computed values are only touched when requested, so
+        # deferred columns are never loaded just to be thrown away
+        data = {
             'id': self.id,
             'title': self.title,
             'source_type': self.source_type,
             'source_url': self.source_url,
-            'transcription': self.transcription,
-            'summary': self.summary,
             'duration_seconds': self.duration_seconds,
             'subject_id': self.subject_id,
-            'subject_name': self.subject.name if self.subject else None,
             'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'note_count': self.notes.count()
+            'updated_at': self.updated_at.isoformat()
         }
+        if 'transcription' in fields:
+            data['transcription'] = self.transcription
+        if 'summary' in fields:
+            data['summary'] = self.summary
+        if 'subject_name' in fields:
+            data['subject_name'] = self.subject.name if self.subject else None
+        if 'note_count' in fields:
+            data['note_count'] = self.notes.count()
+        return fields.filter(data)
 
 
 class Note(db.Model):
     """Note model for storing study notes."""
     __tablename__ = 'notes'
+    __deferrable__ = ('content', 'summary')
+    __table_args__ = (
+        db.Index('ix_notes_subject_updated', 'subject_id', 'updated_at', 'id'),
+        db.Index('ix_notes_lecture_updated', 'lecture_id', 'updated_at', 'id'),
+        db.Index('ix_notes_updated', 'updated_at', 'id'),
+    )
     
     id: int = db.Column(db.Integer, primary_key=True)
     title: str = db.Column(db.String(300), nullable=False)
-    content: str = db.Column(db.Text, nullable=False)
+    content = db.deferred(db.Column(CompressedText, nullable=False))  # str
     summary: Optional[str] = db.Column(db.Text)
     tags: Optional[str] = db.Column(db.String(500))  # Comma-separated tags
-    subject_id: int = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False)
-    lecture_id: Optional[int] = db.Column(db.Integer, db.ForeignKey('lectures.id'))
+    subject_id: int = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'), nullable=False)
+    lecture_id: Optional[int] = db.Column(db.Integer, db.ForeignKey('lectures.id', ondelete='CASCADE'))
     created_at: datetime = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at: datetime = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Also moves when related rows shown in its body change; drives ETags only
+    etag_at: Optional[datetime] = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def to_dict(self) -> dict:
-        return {
+    def to_dict(self, fields: FieldSelection = ALL_FIELDS) -> dict:
+        data = {
             'id': self.id,
             'title': self.title,
-            'content': self.content,
-            'summary': self.summary,
             'tags': self.tags.split(',') if self.tags else [],
             'subject_id': self.subject_id,
-            'subject_name': self.subject.name if self.subject else None,
             'lecture_id': self.lecture_id,
-            'lecture_title': self.lecture.title if self.lecture else None,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
+        if 'content' in fields:
+            data['content'] = self.content
+        if 'summary' in fields:
+            data['summary'] = self.summary
+        if 'subject_name' in fields:
+            data['subject_name'] = self.subject.name if self.subject else None
+        if 'lecture_title' in fields:
+            data['lecture_title'] = self.lecture.title if self.lecture else None
+        return fields.filter(data)
 
 
 class FlashcardSet(db.Model):
     """Flashcard Set model for grouping flashcards."""
     __tablename__ = 'flashcard_sets'
+    __table_args__ = (
+        db.Index('ix_flashcard_sets_subject_updated', 'subject_id', 'updated_at', 'id'),
+        db.Index('ix_flashcard_sets_updated', 'updated_at', 'id'),
+        # review_log keeps a deleted set's id; a new set must never inherit that history
+        {'sqlite_autoincrement': True},
+    )
     
     id: int = db.Column(db.Integer, primary_key=True)
     title: str = db.Column(db.String(300), nullable=False)
     description: Optional[str] = db.Column(db.Text)
-    subject_id: int = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False)
+    subject_id: int = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'), nullable=False)
     created_at: datetime = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at: datetime = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Also moves when related rows shown in its body change; drives ETags only
+    etag_at: Optional[datetime] = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    flashcards = db.relationship('Flashcard', backref='flashcard_set', lazy='dynamic', cascade='all, delete-orphan')
+    flashcards = db.relationship('Flashcard', backref='flashcard_set', lazy='dynamic', cascade='all, delete-orphan',
+                                 passive_deletes=True)
     
-    def to_dict(self) -> dict:
-        return {
+    def to_dict(self, fields: FieldSelection = ALL_FIELDS) -> dict:
+        data = {
             'id': self.id,
             'title': self.title,
             'description': self.description,
             'subject_id': self.subject_id,
-            'subject_name': self.subject.name if self.subject else None,
-            'card_count': self.flashcards.count(),
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
+        if 'subject_name' in fields:
+            data['subject_name'] = self.subject.name if self.subject else None
+        if 'card_count' in fields:
+            data['card_count'] = self.flashcards.count()
+        return fields.filter(data)
+
+
+# next_review of a never-reviewed card: sorts first and keeps due lookups index range scans
+NEW_CARD_DUE = datetime(1970, 1, 1)
 
 
 class Flashcard(db.Model):
     """Individual flashcard model."""
     __tablename__ = 'flashcards'
+    __table_args__ = (
+        db.Index('ix_flashcards_set_next_review', 'flashcard_set_id', 'next_review', 'id'),
+        db.Index('ix_flashcards_next_review', 'next_review', 'id'),
+        # Likewise for a deleted card's reviews
+        {'sqlite_autoincrement': True},
+    )
     
     id: int = db.Column(db.Integer, primary_key=True)
     front: str = db.Column(db.Text, nullable=False)  # Question/Term
@@ -141,8 +205,11 @@ class Flashcard(db.Model):
     times_reviewed: int = db.Column(db.Integer, default=0)
     times_correct: int = db.Column(db.Integer, default=0)
     last_reviewed: Optional[datetime] = db.Column(db.DateTime)
-    next_review: Optional[datetime] = db.Column(db.DateTime)
-    flashcard_set_id: int = db.Column(db.Integer, db.ForeignKey('flashcard_sets.id'), nullable=False)
+    next_review: datetime = db.Column(db.DateTime, default=NEW_CARD_DUE)
+    # Memory model state (see scheduler_service); NULL until first reviewed
+    stability: Optional[float] = db.Column(db.Float)
+    memory_difficulty: Optional[float] = db.Column(db.Float)
+    flashcard_set_id: int = db.Column(db.Integer, db.ForeignKey('flashcard_sets.id', ondelete='CASCADE'), nullable=False)
     created_at: datetime = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self) -> dict:
@@ -155,37 +222,137 @@ class Flashcard(db.Model):
             'times_correct': self.times_correct,
             'accuracy': round(self.times_correct / self.times_reviewed * 100, 1) if self.times_reviewed > 0 else None,
             'last_reviewed': self.last_reviewed.isoformat() if self.last_reviewed else None,
-            'next_review': self.next_review.isoformat() if self.next_review else None,
+            'next_review': self.next_review.isoformat() if self.next_review and self.next_review != NEW_CARD_DUE else None,
+            'stability': round(self.stability, 2) if self.stability is not None else None,
             'flashcard_set_id': self.flashcard_set_id,
             'created_at': self.created_at.isoformat()
         }
 
 
+class AppliedReviewEvent(db.Model):
+    """Client event id of a review already applied, so retried batches are no-ops."""
+    __tablename__ = 'applied_review_events'
+    
+    event_id: str = db.Column(db.String(64), primary_key=True)
+    flashcard_id: int = db.Column(db.Integer, db.ForeignKey('flashcards.id', ondelete='CASCADE'), nullable=False, index=True)
+    applied_at: datetime = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ReviewLog(db.Model):
+    """One flashcard review, appended by every review path and never updated.
+    
+    Kept compact for analytics: no foreign keys (history outlives deleted
+    cards), times as Unix seconds.
+    """
+    __tablename__ = 'review_log'
+    
+    id: int = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    flashcard_id: int = db.Column(db.Integer, nullable=False, index=True)
+    flashcard_set_id: int = db.Column(db.Integer, nullable=False)
+    ts: int = db.Column(db.BigInteger, nullable=False)  # Unix seconds (UTC)
+    grade: int = db.Column(db.SmallInteger, nullable=False)  # 1 again .. 4 easy
+    elapsed_days: Optional[float] = db.Column(db.Float)  # Since the previous review; NULL on the first
+
+
+class DueQueueEntry(db.Model):
+    """A card due by the end of the queue's day (the optional precomputed due queue)."""
+    __tablename__ = 'due_queue'
+    __table_args__ = (
+        db.Index('ix_due_queue_subject_due', 'subject_id', 'due_at', 'flashcard_id'),
+        db.Index('ix_due_queue_set_due', 'flashcard_set_id', 'due_at', 'flashcard_id'),
+        db.Index('ix_due_queue_due', 'due_at', 'flashcard_id'),
+    )
+    
+    flashcard_id: int = db.Column(db.Integer, db.ForeignKey('flashcards.id', ondelete='CASCADE'), primary_key=True)
+    flashcard_set_id: int = db.Column(db.Integer, db.ForeignKey('flashcard_sets.id', ondelete='CASCADE'), nullable=False)
+    subject_id: int = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'), nullable=False)
+    due_at: datetime = db.Column(db.DateTime, nullable=False)
+    queue_day: date = db.Column(db.Date, nullable=False, index=True)
+
+
+class MinHashSignature(db.Model):
+    """MinHash signature of a flashcard or quiz question, for near-duplicate checks."""
+    __tablename__ = 'minhash_signatures'
+    __table_args__ = (
+        db.Index('ix_minhash_signatures_parent', 'kind', 'parent_id'),
+    )
+    
+    kind: str = db.Column(db.String(10), primary_key=True)  # 'flashcard' or 'question'
+    item_id: int = db.Column(db.Integer, primary_key=True)
+    subject_id: int = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'), nullable=False)
+    parent_id: int = db.Column(db.Integer, nullable=False)  # flashcard set or quiz
+    signature: bytes = db.Column(db.LargeBinary, nullable=False)
+
+
+class MinHashBand(db.Model):
+    """One LSH band of a signature; items sharing a bucket are duplicate candidates."""
+    __tablename__ = 'minhash_bands'
+    __table_args__ = (
+        db.Index('ix_minhash_bands_bucket', 'subject_id', 'kind', 'bucket', 'item_id'),
+    )
+    
+    kind: str = db.Column(db.String(10), primary_key=True)
+    item_id: int = db.Column(db.Integer, primary_key=True)
+    band: int = db.Column(db.SmallInteger, primary_key=True)
+    subject_id: int = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'), nullable=False)
+    bucket: int = db.Column(db.BigInteger, nullable=False)
+
+
+class TextChunk(db.Model):
+    """A passage of a note or lecture transcription with its hashed term weights, for tutor retrieval."""
+    __tablename__ = 'text_chunks'
+    __table_args__ = (
+        db.Index('ix_text_chunks_subject', 'subject_id', 'id'),
+        db.Index('ix_text_chunks_note', 'note_id'),
+        db.Index('ix_text_chunks_lecture', 'lecture_id'),
+        # Ids are never reused, so a subject's chunk count and highest id version its index
+        {'sqlite_autoincrement': True},
+    )
+    
+    id: int = db.Column(db.Integer, primary_key=True)
+    subject_id: int = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'), nullable=False)
+    note_id: Optional[int] = db.Column(db.Integer, db.ForeignKey('notes.id', ondelete='CASCADE'))
+    lecture_id: Optional[int] = db.Column(db.Integer, db.ForeignKey('lectures.id', ondelete='CASCADE'))
+    position: int = db.Column(db.Integer, nullable=False)  # chunk number within its source
+    text: str = db.Column(db.Text, nullable=False)
+    terms: bytes = db.Column(db.LargeBinary, nullable=False)  # float32 weights, then uint16 buckets
+
+
 class Quiz(db.Model):
     """Quiz model for practice tests."""
     __tablename__ = 'quizzes'
+    __table_args__ = (
+        db.Index('ix_quizzes_subject_created', 'subject_id', 'created_at', 'id'),
+        db.Index('ix_quizzes_created', 'created_at', 'id'),
+    )
     
     id: int = db.Column(db.Integer, primary_key=True)
     title: str = db.Column(db.String(300), nullable=False)
     description: Optional[str] = db.Column(db.Text)
-    subject_id: int = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False)
+    subject_id: int = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'), nullable=False)
     created_at: datetime = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
-    questions = db.relationship('QuizQuestion', backref='quiz', lazy='dynamic', cascade='all, delete-orphan')
-    attempts = db.relationship('QuizAttempt', backref='quiz', lazy='dynamic', cascade='all, delete-orphan')
+    questions = db.relationship('QuizQuestion', backref='quiz', lazy='dynamic', cascade='all, delete-orphan',
+                                passive_deletes=True)
+    attempts = db.relationship('QuizAttempt', backref='quiz', lazy='dynamic', cascade='all, delete-orphan',
+                               passive_deletes=True)
     
-    def to_dict(self) -> dict:
-        return {
+    def to_dict(self, fields: FieldSelection = ALL_FIELDS) -> dict:
+        data = {
             'id': self.id,
             'title': self.title,
             'description': self.description,
             'subject_id': self.subject_id,
-            'subject_name': self.subject.name if self.subject else None,
-            'question_count': self.questions.count(),
-            'attempt_count': self.attempts.count(),
             'created_at': self.created_at.isoformat()
         }
+        if 'subject_name' in fields:
+            data['subject_name'] = self.subject.name if self.subject else None
+        if 'question_count' in fields:
+            data['question_count'] = self.questions.count()
+        if 'attempt_count' in fields:
+            data['attempt_count'] = self.attempts.count()
+        return fields.filter(data)
 
 
 class QuizQuestion(db.Model):
@@ -195,19 +362,18 @@ class QuizQuestion(db.Model):
     id: int = db.Column(db.Integer, primary_key=True)
     question: str = db.Column(db.Text, nullable=False)
     question_type: str = db.Column(db.String(50), nullable=False)  # 'multiple_choice', 'true_false', 'short_answer'
-    options: Optional[str] = db.Column(db.Text)  # JSON string for multiple choice options
+    options = db.Column(JSONDocument)  # Optional[list]: multiple choice options
     correct_answer: str = db.Column(db.Text, nullable=False)
     explanation: Optional[str] = db.Column(db.Text)
     points: int = db.Column(db.Integer, default=1)
-    quiz_id: int = db.Column(db.Integer, db.ForeignKey('quizzes.id'), nullable=False)
+    quiz_id: int = db.Column(db.Integer, db.ForeignKey('quizzes.id', ondelete='CASCADE'), nullable=False)
     
     def to_dict(self) -> dict:
-        import json
         return {
             'id': self.id,
             'question': self.question,
             'question_type': self.question_type,
-            'options': json.loads(self.options) if self.options else None,
+            'options': self.options or None,
             'correct_answer': self.correct_answer,
             'explanation': self.explanation,
             'points': self.points,
@@ -218,17 +384,25 @@ class QuizQuestion(db.Model):
 class QuizAttempt(db.Model):
     """Quiz attempt/result model."""
     __tablename__ = 'quiz_attempts'
+    __table_args__ = (
+        db.Index('ix_quiz_attempts_quiz_completed', 'quiz_id', 'completed_at', 'id'),
+        db.Index('ix_quiz_attempts_learner_completed', 'learner', 'completed_at', 'id'),
+    )
     
     id: int = db.Column(db.Integer, primary_key=True)
-    quiz_id: int = db.Column(db.Integer, db.ForeignKey('quizzes.id'), nullable=False)
+    quiz_id: int = db.Column(db.Integer, db.ForeignKey('quizzes.id', ondelete='CASCADE'), nullable=False)
     score: int = db.Column(db.Integer, nullable=False)
     total_points: int = db.Column(db.Integer, nullable=False)
     time_taken_seconds: Optional[int] = db.Column(db.Integer)
-    answers: Optional[str] = db.Column(db.Text)  # JSON string of user answers
+    answers = db.Column(JSONDocument)  # Optional[dict]: {question_id: user_answer}
+    learner: Optional[str] = db.Column(db.String(100))  # client-chosen id of who took it (there are no accounts)
     completed_at: datetime = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Relationships
+    question_answers = db.relationship('QuizAttemptAnswer', backref='attempt', lazy='dynamic',
+                                       cascade='all, delete-orphan', passive_deletes=True)
+    
     def to_dict(self) -> dict:
-        import json
         return {
             'id': self.id,
             'quiz_id': self.quiz_id,
@@ -237,20 +411,66 @@ class QuizAttempt(db.Model):
             'total_points': self.total_points,
             'percentage': round(self.score / self.total_points * 100, 1) if self.total_points > 0 else 0,
             'time_taken_seconds': self.time_taken_seconds,
-            'answers': json.loads(self.answers) if self.answers else None,
+            'answers': self.answers or None,
+            'learner': self.learner,
             'completed_at': self.completed_at.isoformat()
         }
 
 
+class QuizAttemptAnswer(db.Model):
+    """One question's answer within a quiz attempt, for per-question analytics."""
+    __tablename__ = 'quiz_attempt_answers'
+    __table_args__ = (
+        db.Index('ix_quiz_attempt_answers_question', 'question_id', 'is_correct'),
+    )
+    
+    id: int = db.Column(db.Integer, primary_key=True)
+    attempt_id: int = db.Column(db.Integer, db.ForeignKey('quiz_attempts.id', ondelete='CASCADE'),
+                                nullable=False, index=True)
+    question_id: int = db.Column(db.Integer, db.ForeignKey('quiz_questions.id', ondelete='CASCADE'),
+                                 nullable=False)
+    answer: Optional[str] = db.Column(db.Text)  # None when the question was skipped
+    is_correct: bool = db.Column(db.Boolean, nullable=False, default=False)
+    points_awarded: int = db.Column(db.Integer, nullable=False, default=0)
+    time_seconds: Optional[int] = db.Column(db.Integer)  # when the client timed each question
+    
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'attempt_id': self.attempt_id,
+            'question_id': self.question_id,
+            'answer': self.answer,
+            'is_correct': self.is_correct,
+            'points_awarded': self.points_awarded,
+            'time_seconds': self.time_seconds
+        }
+
+
+class SemanticGrade(db.Model):
+    """A language model's verdict on one short answer to one question, reused for repeat answers."""
+    __tablename__ = 'semantic_grades'
+    
+    question_id: int = db.Column(db.Integer, db.ForeignKey('quiz_questions.id', ondelete='CASCADE'),
+                                 primary_key=True)
+    # SHA-1 of the normalized correct answer and student answer, so editing
+    # the correct answer retires the question's old verdicts
+    digest: str = db.Column(db.String(40), primary_key=True)
+    is_correct: bool = db.Column(db.Boolean, nullable=False)
+    created_at: datetime = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 class ChatMessage(db.Model):
     """Chat message model for AI tutor conversations."""
     __tablename__ = 'chat_messages'
+    __table_args__ = (
+        db.Index('ix_chat_messages_session_created', 'session_id', 'created_at', 'id'),
+    )
     
     id: int = db.Column(db.Integer, primary_key=True)
     session_id: str = db.Column(db.String(100), nullable=False, index=True)
     role: str = db.Column(db.String(20), nullable=False)  # 'user' or 'assistant'
-    content: str = db.Column(db.Text, nullable=False)
-    subject_id: Optional[int] = db.Column(db.Integer, db.ForeignKey('subjects.id'))
+    content: str = db.Column(CompressedText, nullable=False)
+    subject_id: Optional[int] = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='SET NULL'))
     created_at: datetime = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self) -> dict:
@@ -262,3 +482,99 @@ class ChatMessage(db.Model):
             'subject_id': self.subject_id,
             'created_at': self.created_at.isoformat()
         }
+
+
+class ChangeLogEntry(db.Model):
+    """Latest change of a synced item, ordered by a monotonic sequence.
+    
+    Each item keeps only its most recent entry; a deletion leaves a
+    tombstone. No foreign keys: tombstones outlive what they describe.
+    """
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        db.Index('ix_change_log_item', 'kind', 'item_id', unique=True),
+        db.Index('ix_change_log_subject', 'subject_id'),
+        # Never reuse a sequence number, even after the newest entry is compacted away
+        {'sqlite_autoincrement': True},
+    )
+    
+    seq: int = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    kind: str = db.Column(db.String(20), nullable=False)  # 'subject', 'note', 'flashcard_set', 'flashcard', 'quiz'
+    item_id: int = db.Column(db.Integer, nullable=False)
+    subject_id: Optional[int] = db.Column(db.Integer)
+    deleted: bool = db.Column(db.Boolean, nullable=False, default=False)
+    changed_at: datetime = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class SubjectStats(db.Model):
+    """Running totals behind the subject dashboard, maintained on write."""
+    __tablename__ = 'subject_stats'
+    
+    subject_id: int = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'), primary_key=True)
+    lecture_count: int = db.Column(db.Integer, nullable=False, default=0)
+    note_count: int = db.Column(db.Integer, nullable=False, default=0)
+    flashcard_set_count: int = db.Column(db.Integer, nullable=False, default=0)
+    flashcard_count: int = db.Column(db.Integer, nullable=False, default=0)
+    quiz_count: int = db.Column(db.Integer, nullable=False, default=0)
+    question_count: int = db.Column(db.Integer, nullable=False, default=0)
+    attempt_count: int = db.Column(db.Integer, nullable=False, default=0)
+    attempt_percentage_sum: float = db.Column(db.Float, nullable=False, default=0)
+    review_count: int = db.Column(db.Integer, nullable=False, default=0)
+    correct_count: int = db.Column(db.Integer, nullable=False, default=0)
+
+
+class QuestionStats(db.Model):
+    """Running answer totals for one quiz question, maintained on write.
+    
+    The ``rest_*`` sums are over the attempt's score on the *other*
+    questions (0-1), from which the point-biserial discrimination is
+    derived without revisiting attempts. Every question has a row, so
+    with its subject, type and difficulty the table doubles as the
+    question bank's index.
+    """
+    __tablename__ = 'question_stats'
+    __table_args__ = (
+        db.Index('ix_question_stats_bank', 'subject_id', 'question_type', 'difficulty'),
+    )
+    
+    question_id: int = db.Column(db.Integer, db.ForeignKey('quiz_questions.id', ondelete='CASCADE'),
+                                 primary_key=True)
+    subject_id: Optional[int] = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'))
+    question_type: Optional[str] = db.Column(db.String(50))
+    difficulty: Optional[float] = db.Column(db.Float)  # share of answers that were wrong; None until answered
+    answers: int = db.Column(db.Integer, nullable=False, default=0)
+    correct: int = db.Column(db.Integer, nullable=False, default=0)
+    skipped: int = db.Column(db.Integer, nullable=False, default=0)
+    timed: int = db.Column(db.Integer, nullable=False, default=0)
+    time_sum: float = db.Column(db.Float, nullable=False, default=0)
+    rest_count: int = db.Column(db.Integer, nullable=False, default=0)
+    rest_correct: int = db.Column(db.Integer, nullable=False, default=0)
+    rest_sum: float = db.Column(db.Float, nullable=False, default=0)
+    rest_sq_sum: float = db.Column(db.Float, nullable=False, default=0)
+    rest_correct_sum: float = db.Column(db.Float, nullable=False, default=0)
+
+
+class SubjectDailyStats(db.Model):
+    """Per-subject, per-day activity plus how many cards fall due that day."""
+    __tablename__ = 'subject_daily_stats'
+    
+    subject_id: int = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'), primary_key=True)
+    day: date = db.Column(db.Date, primary_key=True)
+    reviews: int = db.Column(db.Integer, nullable=False, default=0)
+    correct: int = db.Column(db.Integer, nullable=False, default=0)
+    attempts: int = db.Column(db.Integer, nullable=False, default=0)
+    attempt_percentage_sum: float = db.Column(db.Float, nullable=False, default=0)
+    items_created: int = db.Column(db.Integer, nullable=False, default=0)
+    # Cards whose next review falls on this day (never-reviewed cards: creation day)
+    cards_due: int = db.Column(db.Integer, nullable=False, default=0)
+
+
+class CompressionDictionary(db.Model):
+    """Trained dictionary used by CompressedText columns."""
+    __tablename__ = 'compression_dictionaries'
+    
+    id: int = db.Column(db.Integer, primary_key=True)
+    codec: str = db.Column(db.String(10), nullable=False)  # 'zstd' or 'zlib'
+    data: bytes = db.Column(db.LargeBinary, nullable=False)
+    sample_count: int = db.Column(db.Integer, default=0)
+    created_at: datetime = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,189 @@
+"""
+Custom column types for AI Study Companion
+"""
+from sqlalchemy import JSON, LargeBinary, select
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import TypeDecorator
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+import re
+import struct
+import threading
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional dependency, zlib is always available
+    zstandard = None
+
+
+# Stored values are either raw UTF-8 or MAGIC + codec byte [+ dict id] + payload.
+# Text never starts with a NUL byte in practice; values that do are escaped.
+MAGIC = b'\x00'
+CODEC_RAW = b'r'
+CODEC_ZLIB = b'z'
+CODEC_ZSTD = b's'
+
+# Below this size the header and deflate overhead outweigh any saving
+MIN_COMPRESS_BYTES = 200
+
+
+class CompressionDictionaries:
+    """Registry of trained compression dictionaries, keyed by id.
+
+    Dictionaries live in the ``compression_dictionaries`` table so every
+    worker can decompress rows written with any of them; the newest one for
+    the active codec is used for new writes.
+    """
+
+    def __init__(self):
+        self._by_id: Dict[int, Tuple[str, bytes]] = {}
+        self._active: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def dict_id(data: bytes) -> int:
+        return zlib.crc32(data) or 1
+
+    def register(self, codec: str, data: bytes, active: bool = True) -> int:
+        dict_id = self.dict_id(data)
+        with self._lock:
+            self._by_id[dict_id] = (codec, data)
+            if active:
+                self._active[codec] = dict_id
+        return dict_id
+
+    def active(self, codec: str) -> Tuple[int, Optional[bytes]]:
+        dict_id = self._active.get(codec)
+        if dict_id is None:
+            return 0, None
+        return dict_id, self._by_id[dict_id][1]
+
+    def get(self, dict_id: int) -> bytes:
+        if dict_id not in self._by_id:
+            self.load()
+        return self._by_id[dict_id][1]
+
+    def load(self) -> None:
+        """(Re)load every stored dictionary, newest last so it becomes active."""
+        from app import db
+        from app.models.models import CompressionDictionary
+
+        with db.engine.connect() as connection:
+            rows = connection.execute(
+                select(CompressionDictionary.codec, CompressionDictionary.data)
+                .order_by(CompressionDictionary.id)
+            ).all()
+        for codec, data in rows:
+            self.register(codec, data)
+
+
+dictionaries = CompressionDictionaries()
+
+
+def default_codec() -> str:
+    return 'zstd' if zstandard is not None else 'zlib'
+
+
+def compress_text(value: str, codec: Optional[str] = None) -> bytes:
+    """Encode text for storage, compressing it when that pays off."""
+    raw = value.encode('utf-8')
+    if len(raw) < MIN_COMPRESS_BYTES:
+        return MAGIC + CODEC_RAW + raw if raw.startswith(MAGIC) else raw
+
+    codec = codec or default_codec()
+    dict_id, zdict = dictionaries.active(codec)
+    header = struct.pack('>I', dict_id)
+    if codec == 'zstd':
+        compressor = zstandard.ZstdCompressor(
+            level=9,
+            dict_data=zstandard.ZstdCompressionDict(zdict) if zdict else None
+        )
+        payload = MAGIC + CODEC_ZSTD + header + compressor.compress(raw)
+    else:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, zlib.Z_DEFAULT_STRATEGY, zdict or b'')
+        payload = MAGIC + CODEC_ZLIB + header + compressor.compress(raw) + compressor.flush()
+
+    return payload if len(payload) < len(raw) else raw
+
+
+def decompress_text(value) -> str:
+    """Inverse of ``compress_text``; also accepts legacy uncompressed values."""
+    if isinstance(value, str):
+        return value
+    value = bytes(value)
+    if not value.startswith(MAGIC):
+        return value.decode('utf-8')
+
+    codec = value[1:2]
+    if codec == CODEC_RAW:
+        return value[2:].decode('utf-8')
+
+    dict_id = struct.unpack('>I', value[2:6])[0]
+    zdict = dictionaries.get(dict_id) if dict_id else None
+    payload = value[6:]
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read this value')
+        decompressor = zstandard.ZstdDecompressor(
+            dict_data=zstandard.ZstdCompressionDict(zdict) if zdict else None
+        )
+        return decompressor.decompress(payload).decode('utf-8')
+    decompressor = zlib.decompressobj(15, zdict or b'')
+    return (decompressor.decompress(payload) + decompressor.flush()).decode('utf-8')
+
+
+def train_dictionary(samples: Iterable[str], codec: Optional[str] = None, size: int = 32 * 1024) -> bytes:
+    """Build a dictionary from sample texts (e.g. lecture transcripts).
+
+    zstd has a real trainer; for zlib the dictionary is the most frequent
+    words and word pairs, most frequent last since deflate prefers close
+    matches.
+    """
+    codec = codec or default_codec()
+    samples = [s.encode('utf-8') for s in samples if s]
+    if codec == 'zstd':
+        return zstandard.train_dictionary(size * 4, samples).as_bytes()
+
+    counts: Counter = Counter()
+    for sample in samples:
+        words = re.findall(rb'\w+[ ,.]?', sample.lower())
+        counts.update(words)
+        counts.update(a + b for a, b in zip(words, words[1:]))
+
+    chunks = []
+    total = 0
+    for chunk, _ in counts.most_common():
+        if total + len(chunk) > size:
+            break
+        chunks.append(chunk)
+        total += len(chunk)
+    return b''.join(reversed(chunks))
+
+
+class CompressedText(TypeDecorator):
+    """Text stored as zstd/zlib-compressed bytes, optionally with a trained dictionary.
+
+    Values are compressed on write and decompressed when the column is
+    loaded; map large columns as deferred so that only happens on first
+    attribute access.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decompress_text(value)
+
+
+# Native JSON documents: JSONB on Postgres, JSON text elsewhere. Values are
+# decoded once when the row loads (with the engine's json_deserializer), and
+# None is stored as SQL NULL rather than a JSON 'null'.
+JSONDocument = JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), 'postgresql')
@@ -7,6 +7,7 @@ from app.routes.notes import notes_bp
 from app.routes.flashcards import flashcards_bp
 from app.routes.quizzes import quizzes_bp
 from app.routes.tutor import tutor_bp
+from app.routes.search import search_bp
 
 __all__ = [
     'subjects_bp',
@@ -14,5 +15,6 @@ __all__ = [
     'notes_bp',
     'flashcards_bp',
     'quizzes_bp',
-    'tutor_bp'
+    'tutor_bp',
+    'search_bp'
 ]
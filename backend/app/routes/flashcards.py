@@ -2,10 +2,18 @@
 Flashcards API Routes
 """
 from flask import Blueprint, request, jsonify
+from sqlalchemy.exc import IntegrityError
 from app import db
 from app.models import FlashcardSet, Flashcard, Subject, Note, Lecture
-from app.services import ai_service
-from datetime import datetime, timedelta
+from app.services import (
+    ai_service, analytics_service, bulk_service, cache_service, dedupe_service, due_queue_service, scheduler_service
+)
+from app.services.analytics_service import MAX_FORECAST_DAYS
+from app.services.due_queue_service import DEFAULT_DUE_LIMIT, MAX_DUE_LIMIT
+from app.services.scheduler_service import grade_from_request, validate_review_events
+from app.utils.conditional import collection_version, not_modified, resource_version
+from app.utils.fields import FieldSelection, requested_fields
+from app.utils.pagination import Page, paginate, paginated_response
 import json
 
 flashcards_bp = Blueprint('flashcards', __name__)
@@ -13,20 +21,40 @@ flashcards_bp = Blueprint('flashcards', __name__)
 
 @flashcards_bp.route('/sets', methods=['GET'])
 def get_flashcard_sets():
-    """Get all flashcard sets, optionally filtered by subject."""
+    """Get all flashcard sets, optionally filtered by subject (cursor paginated)."""
     subject_id = request.args.get('subject_id', type=int)
     
     query = FlashcardSet.query
     if subject_id:
         query = query.filter_by(subject_id=subject_id)
     
-    sets = query.order_by(FlashcardSet.updated_at.desc()).all()
-    return jsonify([s.to_dict() for s in sets])
+    try:
+        fields = requested_fields(FlashcardSet)
+        response = not_modified(collection_version(query, FlashcardSet), weak=True)
+        if response:
+            return response
+        
+        def load_page():
+            page = paginate(
+                query, FlashcardSet.updated_at, FlashcardSet.id,
+                key=lambda s: (s.updated_at, s.id)
+            )
+            return {'items': [s.to_dict(fields) for s in page.items], 'next_cursor': page.next_cursor}
+        
+        result = cache_service.cached(subject_id, load_page)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return paginated_response(result['items'], Page(result['items'], result['next_cursor']))
 
 
 @flashcards_bp.route('/sets/<int:set_id>', methods=['GET'])
 def get_flashcard_set(set_id: int):
     """Get a specific flashcard set with all cards."""
+    response = not_modified(resource_version(FlashcardSet, set_id))
+    if response:
+        return response
+    
     flashcard_set = FlashcardSet.query.get_or_404(set_id)
     result = flashcard_set.to_dict()
     result['flashcards'] = [f.to_dict() for f in flashcard_set.flashcards.all()]
@@ -108,21 +136,25 @@ def generate_flashcards():
         db.session.add(flashcard_set)
         db.session.flush()  # Get the ID
         
-        # Create flashcards
-        for card_data in generated_cards:
+        # Create flashcards in one set-based insert
+        cards = [
+            card_data for card_data in generated_cards
             # Ensure card_data has the required fields
-            if isinstance(card_data, dict) and 'front' in card_data and 'back' in card_data:
-                flashcard = Flashcard(
-                    front=card_data['front'],
-                    back=card_data['back'],
-                    flashcard_set_id=flashcard_set.id
-                )
-                db.session.add(flashcard)
+            if isinstance(card_data, dict) and 'front' in card_data and 'back' in card_data
+        ]
+        # Drop cards the subject already has (or that repeat within the batch)
+        skipped = []
+        if not data.get('allow_duplicates'):
+            cards, skipped = dedupe_service.filter_new('flashcard', flashcard_set.subject_id, cards)
+        flashcards = bulk_service.insert_flashcards(flashcard_set, cards)
         
         db.session.commit()
         
-        result = flashcard_set.to_dict()
-        result['flashcards'] = [f.to_dict() for f in flashcard_set.flashcards.all()]
+        # Build the response from the inserted rows instead of re-querying
+        result = flashcard_set.to_dict(FieldSelection(exclude=('card_count',)))
+        result['card_count'] = len(flashcards)
+        result['flashcards'] = flashcards
+        result['duplicates_skipped'] = len(skipped)
         return jsonify(result), 201
         
     except Exception as e:
@@ -133,6 +165,38 @@ def generate_flashcards():
         return jsonify({'error': f'Failed to generate flashcards: {str(e)}'}), 500
 
 
+@flashcards_bp.route('/sets/<int:set_id>/cards/bulk', methods=['POST'])
+def bulk_import_flashcards(set_id: int):
+    """Import many cards into a set with a single INSERT.
+    
+    Body: ``{"cards": [{"front": "...", "back": "..."}, ...]}``
+    """
+    flashcard_set = FlashcardSet.query.get_or_404(set_id)
+    data = request.get_json() or {}
+    
+    try:
+        cards = bulk_service.validate_cards(data.get('cards'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        skipped = []
+        if not data.get('allow_duplicates'):
+            cards, skipped = dedupe_service.filter_new('flashcard', flashcard_set.subject_id, cards)
+        flashcards = bulk_service.insert_flashcards(flashcard_set, cards)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to import flashcards: {str(e)}'}), 500
+    
+    return jsonify({
+        'flashcard_set_id': flashcard_set.id,
+        'created': len(flashcards),
+        'flashcards': flashcards,
+        'duplicates': skipped
+    }), 201
+
+
 @flashcards_bp.route('/sets/<int:set_id>', methods=['PUT'])
 def update_flashcard_set(set_id: int):
     """Update a flashcard set."""
@@ -183,7 +247,14 @@ def create_flashcard():
     if not data.get('flashcard_set_id'):
         return jsonify({'error': 'Flashcard set ID is required'}), 400
     
-    FlashcardSet.query.get_or_404(data['flashcard_set_id'])
+    flashcard_set = FlashcardSet.query.get_or_404(data['flashcard_set_id'])
+    
+    if not data.get('allow_duplicates'):
+        match, = dedupe_service.find_duplicates(
+            'flashcard', flashcard_set.subject_id, [f"{data['front']} {data['back']}"]
+        )
+        if match:
+            return jsonify({'error': 'A near-duplicate card already exists in this subject', **match}), 409
     
     flashcard = Flashcard(
         front=data['front'],
@@ -215,31 +286,54 @@ def update_flashcard(card_id: int):
 
 @flashcards_bp.route('/<int:card_id>/review', methods=['POST'])
 def review_flashcard(card_id: int):
-    """Record a flashcard review result for spaced repetition."""
-    flashcard = Flashcard.query.get_or_404(card_id)
-    data = request.get_json()
+    """Record a flashcard review result for spaced repetition.
     
-    was_correct = data.get('correct', False)
-    
-    flashcard.times_reviewed += 1
-    if was_correct:
-        flashcard.times_correct += 1
-        flashcard.difficulty = max(0, flashcard.difficulty - 1)
-        # Increase interval for correct answers
-        days_until_next = 2 ** flashcard.difficulty
-    else:
-        flashcard.difficulty = min(5, flashcard.difficulty + 1)
-        # Reset to 1 day for incorrect answers
-        days_until_next = 1
+    Accepts ``grade`` (1 again, 2 hard, 3 good, 4 easy) or ``correct``.
+    """
+    flashcard = Flashcard.query.get_or_404(card_id)
+    data = request.get_json() or {}
     
-    flashcard.last_reviewed = datetime.utcnow()
-    flashcard.next_review = datetime.utcnow() + timedelta(days=days_until_next)
+    try:
+        grade = grade_from_request(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
     
+    scheduler_service.review(flashcard, grade)
     db.session.commit()
     
     return jsonify(flashcard.to_dict())
 
 
+@flashcards_bp.route('/reviews', methods=['POST'])
+def review_flashcards_batch():
+    """Record a whole review session in one transaction.
+    
+    Body: ``{"events": [{"event_id": "...", "card_id": 1, "grade": 3,
+    "reviewed_at": "2024-05-01T10:00:00Z"}, ...]}`` in review order;
+    ``correct`` may stand in for ``grade``. Events whose ``event_id`` was
+    already applied are skipped, so a retried upload is safe.
+    """
+    data = request.get_json() or {}
+    
+    try:
+        events = validate_review_events(data.get('events'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        result = scheduler_service.submit_reviews(events)
+        db.session.commit()
+    except IntegrityError:
+        # The same events were applied by a concurrent request
+        db.session.rollback()
+        return jsonify({'error': 'These review events are already being applied; retry'}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to record reviews: {str(e)}'}), 500
+    
+    return jsonify(result)
+
+
 @flashcards_bp.route('/<int:card_id>', methods=['DELETE'])
 def delete_flashcard(card_id: int):
     """Delete a flashcard."""
@@ -253,18 +347,27 @@ def delete_flashcard(card_id: int):
 
 @flashcards_bp.route('/due', methods=['GET'])
 def get_due_flashcards():
-    """Get flashcards due for review."""
+    """Get flashcards due for review, most overdue first (new cards before all)."""
     subject_id = request.args.get('subject_id', type=int)
-    limit = request.args.get('limit', 20, type=int)
+    set_id = request.args.get('set_id', type=int)
+    limit = min(max(request.args.get('limit', DEFAULT_DUE_LIMIT, type=int), 1), MAX_DUE_LIMIT)
     
-    query = Flashcard.query.filter(
-        (Flashcard.next_review <= datetime.utcnow()) | 
-        (Flashcard.next_review == None)
-    )
+    flashcards = due_queue_service.due_cards(subject_id=subject_id, set_id=set_id, limit=limit)
     
-    if subject_id:
-        query = query.join(FlashcardSet).filter(FlashcardSet.subject_id == subject_id)
+    return jsonify([f.to_dict() for f in flashcards])
+
+
+@flashcards_bp.route('/analytics', methods=['GET'])
+def get_review_analytics():
+    """Retention curve, per-set forgetting rates and a review workload forecast.
     
-    flashcards = query.order_by(Flashcard.next_review.asc().nullsfirst()).limit(limit).all()
+    Optional ``subject_id`` / ``set_id`` narrow the log; ``days`` sets the
+    forecast length.
+    """
+    subject_id = request.args.get('subject_id', type=int)
+    set_id = request.args.get('set_id', type=int)
+    days = request.args.get('days', 30, type=int)
+    if not 1 <= days <= MAX_FORECAST_DAYS:
+        return jsonify({'error': f'days must be between 1 and {MAX_FORECAST_DAYS}'}), 400
     
-    return jsonify([f.to_dict() for f in flashcards])
+    return jsonify(analytics_service.report(subject_id=subject_id, set_id=set_id, days=days))
@@ -5,6 +5,10 @@ from flask import Blueprint, request, jsonify
 from app import db
 from app.models import Lecture, Subject
 from app.services import ai_service, youtube_service
+from app.utils.conditional import collection_version, not_modified, resource_version
+from app.utils.fields import requested_fields, load_options
+from app.utils.pagination import paginate, paginated_response
+from app.utils.serialization import stream_format, streamed_response
 from youtube_transcript_api._errors import TranscriptsDisabled
 
 lectures_bp = Blueprint('lectures', __name__)
@@ -12,22 +16,55 @@ lectures_bp = Blueprint('lectures', __name__)
 
 @lectures_bp.route('', methods=['GET'])
 def get_lectures():
-    """Get all lectures, optionally filtered by subject."""
+    """Get all lectures, optionally filtered by subject.
+    
+    Supports ``?view=summary`` or ``?fields=a,b`` to leave out transcripts,
+    and ``?cursor=`` / ``?limit=`` for keyset pagination. ``?stream=json``
+    or ``?stream=ndjson`` streams every matching lecture instead.
+    """
     subject_id = request.args.get('subject_id', type=int)
     
     query = Lecture.query
     if subject_id:
         query = query.filter_by(subject_id=subject_id)
     
-    lectures = query.order_by(Lecture.created_at.desc()).all()
-    return jsonify([l.to_dict() for l in lectures])
+    try:
+        fields = requested_fields(Lecture)
+        fmt = stream_format()
+        if fmt:
+            return streamed_response(
+                query.options(*load_options(Lecture, fields))
+                .order_by(Lecture.created_at.desc(), Lecture.id.desc()),
+                lambda l: l.to_dict(fields), fmt
+            )
+        response = not_modified(collection_version(query, Lecture), weak=True)
+        if response:
+            return response
+        page = paginate(
+            query.options(*load_options(Lecture, fields)),
+            Lecture.created_at, Lecture.id,
+            key=lambda l: (l.created_at, l.id)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return paginated_response([l.to_dict(fields) for l in page.items], page)
 
 
 @lectures_bp.route('/<int:lecture_id>', methods=['GET'])
 def get_lecture(lecture_id: int):
     """Get a specific lecture by ID."""
-    lecture = Lecture.query.get_or_404(lecture_id)
-    return jsonify(lecture.to_dict())
+    try:
+        fields = requested_fields(Lecture)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = not_modified(resource_version(Lecture, lecture_id))
+    if response:
+        return response
+    
+    lecture = Lecture.query.options(*load_options(Lecture, fields)).get_or_404(lecture_id)
+    return jsonify(lecture.to_dict(fields))
 
 
 @lectures_bp.route('/youtube', methods=['POST'])
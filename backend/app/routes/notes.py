@@ -5,13 +5,22 @@ from flask import Blueprint, request, jsonify
 from app import db
 from app.models import Note, Subject, Lecture
 from app.services import ai_service
+from app.utils.conditional import collection_version, not_modified, resource_version
+from app.utils.fields import requested_fields, load_options
+from app.utils.pagination import paginate, paginated_response
+from app.utils.serialization import stream_format, streamed_response
 
 notes_bp = Blueprint('notes', __name__)
 
 
 @notes_bp.route('', methods=['GET'])
 def get_notes():
-    """Get all notes, optionally filtered by subject or lecture."""
+    """Get all notes, optionally filtered by subject or lecture.
+    
+    Supports ``?view=summary`` or ``?fields=a,b`` to leave out note bodies,
+    and ``?cursor=`` / ``?limit=`` for keyset pagination. ``?stream=json``
+    or ``?stream=ndjson`` streams every matching note instead.
+    """
     subject_id = request.args.get('subject_id', type=int)
     lecture_id = request.args.get('lecture_id', type=int)
     
@@ -21,15 +30,43 @@ def get_notes():
     if lecture_id:
         query = query.filter_by(lecture_id=lecture_id)
     
-    notes = query.order_by(Note.updated_at.desc()).all()
-    return jsonify([n.to_dict() for n in notes])
+    try:
+        fields = requested_fields(Note)
+        fmt = stream_format()
+        if fmt:
+            return streamed_response(
+                query.options(*load_options(Note, fields))
+                .order_by(Note.updated_at.desc(), Note.id.desc()),
+                lambda n: n.to_dict(fields), fmt
+            )
+        response = not_modified(collection_version(query, Note), weak=True)
+        if response:
+            return response
+        page = paginate(
+            query.options(*load_options(Note, fields)),
+            Note.updated_at, Note.id,
+            key=lambda n: (n.updated_at, n.id)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return paginated_response([n.to_dict(fields) for n in page.items], page)
 
 
 @notes_bp.route('/<int:note_id>', methods=['GET'])
 def get_note(note_id: int):
     """Get a specific note by ID."""
-    note = Note.query.get_or_404(note_id)
-    return jsonify(note.to_dict())
+    try:
+        fields = requested_fields(Note)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = not_modified(resource_version(Note, note_id))
+    if response:
+        return response
+    
+    note = Note.query.options(*load_options(Note, fields)).get_or_404(note_id)
+    return jsonify(note.to_dict(fields))
 
 
 @notes_bp.route('', methods=['POST'])
@@ -3,24 +3,42 @@ Quizzes API Routes
 """
 from flask import Blueprint, request, jsonify
 from app import db
-from app.models import Quiz, QuizQuestion, QuizAttempt, Subject, Note, Lecture
-from app.services import ai_service
-import json
+from app.models import Quiz, QuizQuestion, QuizAttempt, QuizAttemptAnswer, Subject, Note, Lecture
+from app.services import (
+    ai_service, bulk_service, cache_service, dedupe_service, grading_service, question_bank_service,
+    question_stats_service
+)
+from app.utils.fields import FieldSelection, requested_fields
+from app.utils.pagination import Page, paginate, paginated_response
+from app.utils.serialization import stream_format, streamed_response
 
 quizzes_bp = Blueprint('quizzes', __name__)
 
 
 @quizzes_bp.route('', methods=['GET'])
 def get_quizzes():
-    """Get all quizzes, optionally filtered by subject."""
+    """Get all quizzes, optionally filtered by subject (cursor paginated)."""
     subject_id = request.args.get('subject_id', type=int)
     
     query = Quiz.query
     if subject_id:
         query = query.filter_by(subject_id=subject_id)
     
-    quizzes = query.order_by(Quiz.created_at.desc()).all()
-    return jsonify([q.to_dict() for q in quizzes])
+    try:
+        fields = requested_fields(Quiz)
+        
+        def load_page():
+            page = paginate(
+                query, Quiz.created_at, Quiz.id,
+                key=lambda q: (q.created_at, q.id)
+            )
+            return {'items': [q.to_dict(fields) for q in page.items], 'next_cursor': page.next_cursor}
+        
+        result = cache_service.cached(subject_id, load_page)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return paginated_response(result['items'], Page(result['items'], result['next_cursor']))
 
 
 @quizzes_bp.route('/<int:quiz_id>', methods=['GET'])
@@ -117,22 +135,24 @@ def generate_quiz():
         db.session.add(quiz)
         db.session.flush()
         
-        # Create questions
-        for q_data in generated_questions:
-            question = QuizQuestion(
-                question=q_data['question'],
-                question_type=q_data['question_type'],
-                options=json.dumps(q_data.get('options')) if q_data.get('options') else None,
-                correct_answer=q_data['correct_answer'],
-                explanation=q_data.get('explanation'),
-                quiz_id=quiz.id
-            )
-            db.session.add(question)
+        # Drop questions the subject already has (or that repeat within the batch)
+        skipped = []
+        if not data.get('allow_duplicates'):
+            generated_questions, skipped = dedupe_service.filter_new('question', quiz.subject_id, generated_questions)
+        
+        # Create questions in one set-based insert
+        questions = bulk_service.insert_questions(quiz, [
+            {**q_data, 'points': 1} for q_data in generated_questions
+        ])
         
         db.session.commit()
         
-        result = quiz.to_dict()
-        result['questions'] = [q.to_dict() for q in quiz.questions.all()]
+        # Build the response from the inserted rows instead of re-querying
+        result = quiz.to_dict(FieldSelection(exclude=('question_count', 'attempt_count')))
+        result['question_count'] = len(questions)
+        result['attempt_count'] = 0
+        result['questions'] = questions
+        result['duplicates_skipped'] = len(skipped)
         return jsonify(result), 201
         
     except Exception as e:
@@ -140,6 +160,74 @@ def generate_quiz():
         return jsonify({'error': str(e)}), 500
 
 
+@quizzes_bp.route('/assemble', methods=['POST'])
+def assemble_quiz():
+    """Assemble a practice quiz from the subject's existing questions.
+    
+    Body: ``{"subject_id": 1, "num_questions": 10}``, optionally with
+    ``question_types``, ``difficulty`` (``easy``/``medium``/``hard``),
+    ``learner`` (whose recent misses to revisit), ``exclude_question_ids``
+    and ``top_up: false`` to never call the language model. When the bank
+    is short, the missing questions are generated from ``note_id``,
+    ``lecture_id`` or ``content`` (default: the subject's latest notes).
+    Answers go to ``POST /api/quizzes/practice``.
+    """
+    data = request.get_json() or {}
+    
+    if not data.get('subject_id'):
+        return jsonify({'error': 'Subject ID is required'}), 400
+    
+    subject = Subject.query.get_or_404(data['subject_id'])
+    
+    try:
+        learner = grading_service.learner(data)
+        result = question_bank_service.assemble(
+            subject,
+            count=data.get('num_questions', 10),
+            question_types=data.get('question_types'),
+            difficulty=data.get('difficulty'),
+            learner=learner,
+            exclude=data.get('exclude_question_ids'),
+            top_up=data.get('top_up', True) is not False,
+            source={name: data[name] for name in ('note_id', 'lecture_id', 'content') if data.get(name)}
+        )
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify(result)
+
+
+@quizzes_bp.route('/practice', methods=['POST'])
+def submit_practice():
+    """Submit answers to an assembled quiz.
+    
+    Body: ``{"answers": {question_id: answer}, "question_ids": [...], "learner": "..."}``
+    plus the usual ``time_taken_seconds``, ``question_times`` and
+    ``semantic``. Questions asked but not answered count as wrong; one
+    attempt is saved per quiz the questions came from.
+    """
+    data = request.get_json() or {}
+    
+    try:
+        result = question_bank_service.submit(data)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to grade practice quiz: {str(e)}'}), 500
+    
+    if result['semantic_grading'] is None:
+        del result['semantic_grading']
+    return jsonify(result)
+
+
 @quizzes_bp.route('/<int:quiz_id>/questions', methods=['POST'])
 def add_question(quiz_id: int):
     """Add a question to a quiz."""
@@ -152,10 +240,15 @@ def add_question(quiz_id: int):
     if not data.get('correct_answer'):
         return jsonify({'error': 'Correct answer is required'}), 400
     
+    if not data.get('allow_duplicates'):
+        match, = dedupe_service.find_duplicates('question', quiz.subject_id, [data['question']])
+        if match:
+            return jsonify({'error': 'A near-duplicate question already exists in this subject', **match}), 409
+    
     question = QuizQuestion(
         question=data['question'],
         question_type=data.get('question_type', 'short_answer'),
-        options=json.dumps(data['options']) if data.get('options') else None,
+        options=data.get('options') or None,
         correct_answer=data['correct_answer'],
         explanation=data.get('explanation'),
         points=data.get('points', 1),
@@ -168,6 +261,38 @@ def add_question(quiz_id: int):
     return jsonify(question.to_dict()), 201
 
 
+@quizzes_bp.route('/<int:quiz_id>/questions/bulk', methods=['POST'])
+def bulk_import_questions(quiz_id: int):
+    """Import many questions into a quiz with a single INSERT.
+    
+    Body: ``{"questions": [{"question": "...", "correct_answer": "...", ...}, ...]}``
+    """
+    quiz = Quiz.query.get_or_404(quiz_id)
+    data = request.get_json() or {}
+    
+    try:
+        questions = bulk_service.validate_questions(data.get('questions'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        skipped = []
+        if not data.get('allow_duplicates'):
+            questions, skipped = dedupe_service.filter_new('question', quiz.subject_id, questions)
+        created = bulk_service.insert_questions(quiz, questions)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to import questions: {str(e)}'}), 500
+    
+    return jsonify({
+        'quiz_id': quiz.id,
+        'created': len(created),
+        'questions': created,
+        'duplicates': skipped
+    }), 201
+
+
 @quizzes_bp.route('/questions/<int:question_id>', methods=['PUT'])
 def update_question(question_id: int):
     """Update a quiz question."""
@@ -179,7 +304,7 @@ def update_question(question_id: int):
     if data.get('question_type'):
         question.question_type = data['question_type']
     if 'options' in data:
-        question.options = json.dumps(data['options']) if data['options'] else None
+        question.options = data['options'] or None
     if data.get('correct_answer'):
         question.correct_answer = data['correct_answer']
     if 'explanation' in data:
@@ -214,57 +339,146 @@ def submit_quiz(quiz_id: int):
     
     answers = data['answers']  # Dict: {question_id: user_answer}
     time_taken = data.get('time_taken_seconds')
-    
-    # Calculate score
-    score = 0
-    total_points = 0
+    try:
+        question_times = grading_service.question_times(data)
+        learner = grading_service.learner(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Graded against the quiz's cached answer key (option letters, boolean
+    # synonyms and small short-answer typos are accepted); "semantic": true
+    # also lets the language model judge the short answers marked wrong
+    semantic = grading_service.semantic_enabled(data.get('semantic'))
+    graded = grading_service.grade(quiz.id, answers, semantic=semantic)
+    score = graded['score']
+    total_points = graded['total_points']
     results = []
+    answer_rows = []
     
-    for question in quiz.questions.all():
-        total_points += question.points
-        user_answer = answers.get(str(question.id))
-        is_correct = False
-        
-        if user_answer:
-            # Simple string comparison (case-insensitive)
-            is_correct = user_answer.strip().lower() == question.correct_answer.strip().lower()
-            if is_correct:
-                score += question.points
-        
+    for key, user_answer, is_correct, points in graded['results']:
         results.append({
-            'question_id': question.id,
-            'question': question.question,
+            'question_id': key.question_id,
+            'question': key.question,
             'user_answer': user_answer,
-            'correct_answer': question.correct_answer,
+            'correct_answer': key.correct_answer,
             'is_correct': is_correct,
-            'explanation': question.explanation,
-            'points': question.points if is_correct else 0
+            'explanation': key.explanation,
+            'points': points
         })
-    
-    # Save attempt
+        answer_rows.append(QuizAttemptAnswer(
+            question_id=key.question_id,
+            answer=user_answer,
+            is_correct=is_correct,
+            points_awarded=points,
+            time_seconds=question_times.get(str(key.question_id))
+        ))
+    
+    # Save attempt, with one row per question for per-question analytics
     attempt = QuizAttempt(
         quiz_id=quiz.id,
         score=score,
         total_points=total_points,
         time_taken_seconds=time_taken,
-        answers=json.dumps(answers)
+        answers=answers,
+        learner=learner
     )
+    attempt.question_answers = answer_rows
     
     db.session.add(attempt)
     db.session.commit()
     
-    return jsonify({
+    response = {
         'attempt': attempt.to_dict(),
         'results': results
-    })
+    }
+    if 'semantic' in graded:
+        response['semantic_grading'] = graded['semantic']
+    return jsonify(response)
+
+
+@quizzes_bp.route('/<int:quiz_id>/grade', methods=['POST'])
+def grade_submissions(quiz_id: int):
+    """Grade many submissions for one quiz in a single call (e.g. a whole class).
+    
+    Body: ``{"submissions": [{"answers": {question_id: answer}, "time_taken_seconds": 300}, ...]}``,
+    optionally with per-question ``question_times`` (``{question_id: seconds}``)
+    and the ``learner`` who answered.
+    Each submission is saved as an attempt unless ``"record": false``;
+    ``"semantic": true`` lets the language model judge short answers the
+    local rules mark wrong. Results come back in submission order.
+    """
+    quiz = Quiz.query.get_or_404(quiz_id)
+    data = request.get_json() or {}
+    
+    try:
+        submissions = grading_service.validate_submissions(data.get('submissions'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        graded = grading_service.grade_many(
+            quiz, submissions,
+            record=data.get('record', True) is not False,
+            semantic=grading_service.semantic_enabled(data.get('semantic'))
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to grade submissions: {str(e)}'}), 500
+    
+    percentages = [g['percentage'] for g in graded['submissions']]
+    response = {
+        'quiz_id': quiz.id,
+        'graded': len(percentages),
+        'average_percentage': round(sum(percentages) / len(percentages), 1),
+        'submissions': graded['submissions']
+    }
+    if graded['semantic'] is not None:
+        response['semantic_grading'] = graded['semantic']
+    return jsonify(response)
+
+
+@quizzes_bp.route('/<int:quiz_id>/stats', methods=['GET'])
+def get_question_stats(quiz_id: int):
+    """Per-question answers, correct rate, skip rate, average time and discrimination.
+    
+    ``?sort=correct_rate`` lists the most-missed questions first,
+    ``?sort=discrimination`` the ones that separate strong and weak
+    students worst.
+    """
+    quiz = Quiz.query.get_or_404(quiz_id)
+    
+    try:
+        questions = question_stats_service.quiz_stats(quiz.id, sort=request.args.get('sort'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'quiz_id': quiz.id, 'questions': questions})
 
 
 @quizzes_bp.route('/<int:quiz_id>/attempts', methods=['GET'])
 def get_quiz_attempts(quiz_id: int):
-    """Get all attempts for a quiz."""
+    """Get all attempts for a quiz (cursor paginated, newest first).
+    
+    ``?stream=json`` or ``?stream=ndjson`` streams every attempt instead.
+    """
     quiz = Quiz.query.get_or_404(quiz_id)
-    attempts = quiz.attempts.order_by(QuizAttempt.completed_at.desc()).all()
-    return jsonify([a.to_dict() for a in attempts])
+    
+    try:
+        fmt = stream_format()
+        if fmt:
+            return streamed_response(
+                quiz.attempts.order_by(QuizAttempt.completed_at.desc(), QuizAttempt.id.desc()),
+                lambda a: a.to_dict(), fmt
+            )
+        page = paginate(
+            quiz.attempts, QuizAttempt.completed_at, QuizAttempt.id,
+            key=lambda a: (a.completed_at, a.id)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return paginated_response([a.to_dict() for a in page.items], page)
 
 
 @quizzes_bp.route('/<int:quiz_id>', methods=['PUT'])
@@ -0,0 +1,39 @@
+"""
+Search API Routes
+"""
+from flask import Blueprint, request, jsonify
+from app.services.search_service import search_service, KINDS
+
+search_bp = Blueprint('search', __name__)
+
+
+@search_bp.route('', methods=['GET'])
+def search():
+    """Full-text search across notes, lectures, flashcards and quiz questions.
+    
+    Query parameters: ``q`` (required), ``subject_id``, ``types`` (comma
+    separated: note, lecture, flashcard, question) and ``limit``.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Search query (q) is required'}), 400
+    
+    subject_id = request.args.get('subject_id', type=int)
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    
+    kinds = None
+    if request.args.get('types'):
+        kinds = [k.strip() for k in request.args['types'].split(',') if k.strip()]
+        unknown = [k for k in kinds if k not in KINDS]
+        if unknown:
+            return jsonify({'error': f"Unknown types: {', '.join(unknown)}"}), 400
+    
+    try:
+        results = search_service.search(query, subject_id=subject_id, kinds=kinds, limit=limit)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503
+    
+    return jsonify({
+        'query': query,
+        'results': results
+    })
@@ -1,9 +1,14 @@
 """
 Subjects API Routes
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from app import db
 from app.models import Subject
+from app.services import (
+    archive_service, cache_service, dashboard_service, dedupe_service, deletion_service, question_stats_service
+)
+from app.utils.conditional import collection_version, not_modified, resource_version
+from app.utils.fields import requested_fields
 
 subjects_bp = Blueprint('subjects', __name__)
 
@@ -11,15 +16,131 @@ subjects_bp = Blueprint('subjects', __name__)
 @subjects_bp.route('', methods=['GET'])
 def get_subjects():
     """Get all subjects."""
-    subjects = Subject.query.order_by(Subject.name).all()
-    return jsonify([s.to_dict() for s in subjects])
+    try:
+        fields = requested_fields(Subject)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = not_modified(collection_version(Subject.query, Subject), weak=True)
+    if response:
+        return response
+    
+    return jsonify(cache_service.cached(None, lambda: [
+        s.to_dict(fields) for s in Subject.query.order_by(Subject.name).all()
+    ]))
 
 
 @subjects_bp.route('/<int:subject_id>', methods=['GET'])
 def get_subject(subject_id: int):
     """Get a specific subject by ID."""
+    try:
+        fields = requested_fields(Subject)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = not_modified(resource_version(Subject, subject_id))
+    if response:
+        return response
+    
     subject = Subject.query.get_or_404(subject_id)
-    return jsonify(subject.to_dict())
+    return jsonify(subject.to_dict(fields))
+
+
+@subjects_bp.route('/dashboard', methods=['GET'])
+def get_dashboards():
+    """Get the dashboard of every subject plus overall totals."""
+    subjects = dashboard_service.dashboards()
+    totals = {}
+    for dashboard in subjects:
+        for key, value in dashboard['counts'].items():
+            totals[key] = totals.get(key, 0) + value
+    
+    return jsonify({
+        'subjects': subjects,
+        'totals': {
+            **totals,
+            'due_today': sum(d['due']['today'] for d in subjects),
+            'quiz_attempts': sum(d['quizzes']['attempts'] for d in subjects),
+            'reviews': sum(d['reviews']['total'] for d in subjects),
+        }
+    })
+
+
+@subjects_bp.route('/<int:subject_id>/dashboard', methods=['GET'])
+def get_dashboard(subject_id: int):
+    """Get counts, due cards, quiz scores and recent activity for a subject."""
+    dashboards = dashboard_service.dashboards(subject_id)
+    if not dashboards:
+        return jsonify({'error': 'Subject not found'}), 404
+    return jsonify(dashboards[0])
+
+
+@subjects_bp.route('/<int:subject_id>/question-stats', methods=['GET'])
+def get_question_stats(subject_id: int):
+    """Per-question statistics for every quiz in a subject (``?sort=`` as for one quiz)."""
+    subject = Subject.query.get_or_404(subject_id)
+    
+    try:
+        questions = question_stats_service.subject_stats(subject.id, sort=request.args.get('sort'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'subject_id': subject.id, 'questions': questions})
+
+
+@subjects_bp.route('/<int:subject_id>/dedupe', methods=['POST'])
+def dedupe_subject(subject_id: int):
+    """Find near-duplicate cards/questions in a subject and optionally remove them.
+    
+    Body: ``{"kinds": ["flashcard", "question"], "dry_run": true}``; a dry
+    run (the default) only reports the clusters.
+    """
+    Subject.query.get_or_404(subject_id)
+    data = request.get_json(silent=True) or {}
+    kinds = data.get('kinds', ['flashcard'])
+    if not isinstance(kinds, list) or not kinds or any(k not in ('flashcard', 'question') for k in kinds):
+        return jsonify({'error': "kinds must be a list of 'flashcard' and/or 'question'"}), 400
+    
+    try:
+        result = dedupe_service.dedupe(subject_id, kinds, dry_run=data.get('dry_run', True) is not False)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to remove duplicates: {str(e)}'}), 500
+    return jsonify(result)
+
+
+@subjects_bp.route('/<int:subject_id>/export', methods=['GET'])
+def export_subject(subject_id: int):
+    """Download a subject and everything under it as a gzip-compressed NDJSON archive."""
+    subject = Subject.query.get_or_404(subject_id)
+    return Response(
+        stream_with_context(archive_service.export_subject(subject.id)),
+        mimetype='application/gzip',
+        headers={'Content-Disposition': f'attachment; filename="subject-{subject.id}.ndjson.gz"'}
+    )
+
+
+@subjects_bp.route('/import', methods=['POST'])
+def import_subject():
+    """Recreate a subject from an export archive, in one transaction.
+    
+    Send the archive as the request body or as the ``archive`` file of a
+    multipart form; ``?name=`` renames the imported subject.
+    """
+    upload = request.files.get('archive')
+    stream = upload.stream if upload else request.stream
+    
+    try:
+        result = archive_service.import_subject(stream, name=request.args.get('name'))
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to import subject: {str(e)}'}), 500
+    
+    return jsonify({'subject': result['subject'].to_dict(), 'imported': result['counts']}), 201
 
 
 @subjects_bp.route('', methods=['POST'])
@@ -62,9 +183,18 @@ def update_subject(subject_id: int):
 
 @subjects_bp.route('/<int:subject_id>', methods=['DELETE'])
 def delete_subject(subject_id: int):
-    """Delete a subject and all related materials."""
+    """Delete a subject and all related materials.
+    
+    Child rows are removed by ON DELETE CASCADE. With ``?async=true`` very
+    large subjects are deleted in batches in the background instead (202).
+    """
     subject = Subject.query.get_or_404(subject_id)
     
+    if request.args.get('async', '').lower() in ('1', 'true'):
+        if not deletion_service.delete_subject_async(current_app._get_current_object(), subject.id):
+            return jsonify({'message': 'Subject deletion already in progress'}), 202
+        return jsonify({'message': 'Subject deletion started'}), 202
+    
     db.session.delete(subject)
     db.session.commit()
     
@@ -0,0 +1,64 @@
+"""
+Sync API Routes - Delta sync for offline clients
+"""
+from flask import Blueprint, request, jsonify
+from app import db
+from app.services.sync_service import (
+    DEFAULT_SYNC_LIMIT, MAX_SYNC_LIMIT, parse_token, sync_service, validate_changes
+)
+
+sync_bp = Blueprint('sync', __name__)
+
+
+@sync_bp.route('', methods=['GET'])
+def pull_changes():
+    """Everything created, updated or deleted since a change token.
+    
+    Query parameters: ``since`` (the ``token`` of the previous sync; omit
+    for a full sync) and ``limit``. Keep calling with the returned token
+    while ``has_more`` is true.
+    """
+    try:
+        since = parse_token(request.args.get('since'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = max(1, min(request.args.get('limit', DEFAULT_SYNC_LIMIT, type=int), MAX_SYNC_LIMIT))
+    
+    return jsonify(sync_service.changes(since, limit))
+
+
+@sync_bp.route('', methods=['POST'])
+def push_changes():
+    """Apply a batch of client changes in one transaction.
+    
+    Body: ``{"changes": [{"kind": "flashcard", "op": "create", "ref": "c1",
+    "data": {"front": "...", "back": "...", "flashcard_set_id": "s1"}},
+    {"kind": "note", "op": "update", "id": 4, "base": "120", "data": {...}},
+    {"kind": "flashcard_set", "op": "delete", "id": 9}]}``. Creates name a
+    client ``ref`` that later changes can use as a parent id. Updates and
+    deletes with a ``base`` token are skipped as conflicts if the item
+    changed on the server after it.
+    """
+    data = request.get_json() or {}
+    changes = data.get('changes')
+    if isinstance(changes, list):
+        # Tokens are handed out as strings; accept them back either way
+        for change in changes:
+            if isinstance(change, dict) and isinstance(change.get('base'), str):
+                try:
+                    change['base'] = parse_token(change['base'])
+                except ValueError:
+                    return jsonify({'error': 'base must be a change token'}), 400
+    
+    try:
+        changes = validate_changes(changes)
+        result = sync_service.apply_changes(changes)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to apply changes: {str(e)}'}), 500
+    
+    return jsonify(result)
@@ -4,7 +4,10 @@ AI Tutor API Routes
 from flask import Blueprint, request, jsonify
 from app import db
 from app.models import ChatMessage, Subject
-from app.services import ai_service
+from app.services import ai_service, retrieval_service
+from app.services.retrieval_service import MAX_K, TOP_K
+from app.utils.pagination import paginate, paginated_response
+from app.utils.serialization import stream_format, streamed_response
 import uuid
 
 tutor_bp = Blueprint('tutor', __name__)
@@ -12,7 +15,13 @@ tutor_bp = Blueprint('tutor', __name__)
 
 @tutor_bp.route('/chat', methods=['POST'])
 def chat():
-    """Send a message to the AI tutor and get a response."""
+    """Send a message to the AI tutor and get a response.
+    
+    With a ``subject_id`` the passages of the subject's notes and lecture
+    transcriptions closest to the message are added to the prompt
+    (``note_id`` or ``lecture_id`` narrows them to one source,
+    ``"use_materials": false`` leaves them out).
+    """
     data = request.get_json()
     
     if not data or not data.get('message'):
@@ -23,10 +32,15 @@ def chat():
     
     # Get subject context if provided
     subject_context = None
+    study_material = []
     if subject_id:
         subject = Subject.query.get(subject_id)
         if subject:
             subject_context = subject.name
+            if data.get('use_materials', True) is not False:
+                study_material = retrieval_service.search(
+                    subject.id, data['message'], note_id=data.get('note_id'), lecture_id=data.get('lecture_id')
+                )
     
     # Get conversation history for this session
     history_messages = ChatMessage.query.filter_by(
@@ -43,7 +57,8 @@ def chat():
         response = ai_service.chat_tutor(
             message=data['message'],
             conversation_history=conversation_history,
-            subject_context=subject_context
+            subject_context=subject_context,
+            study_material=study_material
         )
         
         # Save user message
@@ -68,7 +83,8 @@ def chat():
         
         return jsonify({
             'session_id': session_id,
-            'message': assistant_message.to_dict()
+            'message': assistant_message.to_dict(),
+            'sources': [{k: v for k, v in p.items() if k != 'text'} for p in study_material]
         })
         
     except Exception as e:
@@ -80,41 +96,65 @@ def chat():
 
 @tutor_bp.route('/sessions', methods=['GET'])
 def get_sessions():
-    """Get all chat sessions."""
-    sessions = db.session.query(
+    """Get all chat sessions, most recently active first (cursor paginated)."""
+    last_message_at = db.func.max(ChatMessage.created_at)
+    query = db.session.query(
         ChatMessage.session_id,
         db.func.min(ChatMessage.created_at).label('started_at'),
-        db.func.max(ChatMessage.created_at).label('last_message_at'),
+        last_message_at.label('last_message_at'),
         db.func.count(ChatMessage.id).label('message_count')
-    ).group_by(ChatMessage.session_id).order_by(
-        db.func.max(ChatMessage.created_at).desc()
-    ).all()
+    ).group_by(ChatMessage.session_id)
+    
+    try:
+        page = paginate(
+            query, last_message_at, ChatMessage.session_id,
+            key=lambda s: (s.last_message_at, s.session_id),
+            having=True
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify([
+    return paginated_response([
         {
             'session_id': s.session_id,
             'started_at': s.started_at.isoformat(),
             'last_message_at': s.last_message_at.isoformat(),
             'message_count': s.message_count
         }
-        for s in sessions
-    ])
+        for s in page.items
+    ], page)
 
 
 @tutor_bp.route('/sessions/<session_id>', methods=['GET'])
 def get_session(session_id: str):
-    """Get all messages in a chat session."""
-    messages = ChatMessage.query.filter_by(
-        session_id=session_id
-    ).order_by(ChatMessage.created_at.asc()).all()
+    """Get the messages in a chat session, oldest first (cursor paginated).
+    
+    ``?stream=json`` or ``?stream=ndjson`` streams every message instead.
+    """
+    query = ChatMessage.query.filter_by(session_id=session_id)
     
-    if not messages:
+    try:
+        fmt = stream_format()
+        if fmt:
+            return streamed_response(
+                query.order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc()),
+                lambda m: m.to_dict(), fmt
+            )
+        page = paginate(
+            query, ChatMessage.created_at, ChatMessage.id,
+            key=lambda m: (m.created_at, m.id),
+            descending=False
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not page.items and not request.args.get('cursor'):
         return jsonify({'error': 'Session not found'}), 404
     
-    return jsonify({
+    return paginated_response({
         'session_id': session_id,
-        'messages': [m.to_dict() for m in messages]
-    })
+        'messages': [m.to_dict() for m in page.items]
+    }, page)
 
 
 @tutor_bp.route('/sessions/<session_id>', methods=['DELETE'])
@@ -135,21 +175,54 @@ def quick_ask():
         return jsonify({'error': 'Question is required'}), 400
     
     subject_context = None
+    study_material = []
     if data.get('subject_id'):
         subject = Subject.query.get(data['subject_id'])
         if subject:
             subject_context = subject.name
+            if data.get('use_materials', True) is not False:
+                study_material = retrieval_service.search(
+                    subject.id, data['question'], note_id=data.get('note_id'), lecture_id=data.get('lecture_id')
+                )
     
     try:
         response = ai_service.chat_tutor(
             message=data['question'],
-            subject_context=subject_context
+            subject_context=subject_context,
+            study_material=study_material
         )
         
         return jsonify({
             'question': data['question'],
-            'answer': response
+            'answer': response,
+            'sources': [{k: v for k, v in p.items() if k != 'text'} for p in study_material]
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+@tutor_bp.route('/context', methods=['GET'])
+def get_context():
+    """The note and lecture passages the tutor would be given for a question.
+    
+    ``?subject_id=1&q=...`` with optional ``k`` (default 4), ``note_id``
+    and ``lecture_id``.
+    """
+    subject_id = request.args.get('subject_id', type=int)
+    query = request.args.get('q', '').strip()
+    k = request.args.get('k', TOP_K, type=int)
+    
+    if not subject_id or not query:
+        return jsonify({'error': 'subject_id and q are required'}), 400
+    if not 1 <= k <= MAX_K:
+        return jsonify({'error': f'k must be from 1 to {MAX_K}'}), 400
+    
+    subject = Subject.query.get_or_404(subject_id)
+    passages = retrieval_service.search(
+        subject.id, query, k,
+        note_id=request.args.get('note_id', type=int),
+        lecture_id=request.args.get('lecture_id', type=int)
+    )
+    
+    return jsonify({'subject_id': subject.id, 'query': query, 'passages': passages})
@@ -3,10 +3,55 @@ Services package for AI Study Companion
 """
 from app.services.ai_service import ai_service, AIService
 from app.services.youtube_service import youtube_service, YouTubeService
+from app.services.search_service import search_service, SearchService
+from app.services.bulk_service import bulk_service, BulkService
+from app.services.deletion_service import deletion_service, DeletionService
+from app.services.cache_service import cache_service, CacheService
+from app.services.dashboard_service import dashboard_service, DashboardService
+from app.services.scheduler_service import scheduler_service, SchedulerService
+from app.services.due_queue_service import due_queue_service, DueQueueService
+from app.services.analytics_service import analytics_service, AnalyticsService
+from app.services.dedupe_service import dedupe_service, DedupeService
+from app.services.sync_service import sync_service, SyncService
+from app.services.archive_service import archive_service, ArchiveService
+from app.services.grading_service import grading_service, GradingService
+from app.services.question_stats_service import question_stats_service, QuestionStatsService
+from app.services.question_bank_service import question_bank_service, QuestionBankService
+from app.services.retrieval_service import retrieval_service, RetrievalService
 
 __all__ = [
     'ai_service',
     'AIService',
     'youtube_service',
-    'YouTubeService'
+    'YouTubeService',
+    'search_service',
+    'SearchService',
+    'bulk_service',
+    'BulkService',
+    'deletion_service',
+    'DeletionService',
+    'cache_service',
+    'CacheService',
+    'dashboard_service',
+    'DashboardService',
+    'scheduler_service',
+    'SchedulerService',
+    'due_queue_service',
+    'DueQueueService',
+    'analytics_service',
+    'AnalyticsService',
+    'dedupe_service',
+    'DedupeService',
+    'sync_service',
+    'SyncService',
+    'archive_service',
+    'ArchiveService',
+    'grading_service',
+    'GradingService',
+    'question_stats_service',
+    'QuestionStatsService',
+    'question_bank_service',
+    'QuestionBankService',
+    'retrieval_service',
+    'RetrievalService'
 ]
@@ -0,0 +1,262 @@
+"""
+Analytics Service - Retention and workload statistics from the review log
+"""
+from sqlalchemy import func, select
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+import threading
+import numpy as np
+
+
+# Lower edges (days since the previous review) of the retention curve buckets
+RETENTION_BUCKETS = np.array([0, 1, 2, 3, 5, 7, 10, 14, 21, 30, 45, 60, 90, 120, 180, 365], dtype=float)
+# Bucket of each whole day 0..365: a table lookup is several times faster than np.digitize
+_BUCKET_OF_DAY = np.searchsorted(RETENTION_BUCKETS, np.arange(366), side='right') - 1
+MAX_FORECAST_DAYS = 365
+MAX_SETS = 200
+LOAD_BATCH_SIZE = 100000
+# Postgres ids can commit out of order; re-read this many ids below the watermark
+ID_OVERLAP = 1000
+
+# Log columns and the narrowest dtype that holds each: 29 bytes a review instead of 48 as float64
+COLUMNS = {
+    'id': np.int64,
+    'flashcard_id': np.int32,
+    'flashcard_set_id': np.int32,
+    'ts': np.int64,
+    'grade': np.uint8,
+    'elapsed_days': np.float32,
+}
+
+
+def _rate(numerator: np.ndarray, denominator: np.ndarray) -> List[Optional[float]]:
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = numerator / denominator
+    return [None if not np.isfinite(v) else round(float(v), 4) for v in values]
+
+
+class AnalyticsService:
+    """Keeps the review log in NumPy arrays and computes statistics over it.
+
+    The log is append-only, so after the first load each request only
+    fetches rows past the highest id seen; every statistic is then a few
+    vectorized passes (masks, ``bincount``, table lookups) over the arrays.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # One array per column of COLUMNS, a review per position; grown by doubling
+        self._buffer = self._empty(0)
+        self._size = 0
+        self._last_id = 0
+        self._url = None
+
+    @staticmethod
+    def _empty(size: int) -> Dict[str, np.ndarray]:
+        return {name: np.empty(size, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+    @staticmethod
+    def _fetch(after: int) -> Dict[str, np.ndarray]:
+        """Up to LOAD_BATCH_SIZE log rows with ``id > after`` as column arrays.
+
+        Read through the DB-API cursor: building SQLAlchemy rows would cost
+        more than the analysis itself.
+        """
+        from app import db
+        from app.models import ReviewLog
+
+        statement = (
+            select(*(getattr(ReviewLog, name) for name in list(COLUMNS)[:-1]),
+                   func.coalesce(ReviewLog.elapsed_days, -1.0))
+            .where(ReviewLog.id > after)
+            .order_by(ReviewLog.id)
+            .limit(LOAD_BATCH_SIZE)
+        )
+        connection = db.session.connection()
+        compiled = statement.compile(dialect=connection.dialect)
+        params = compiled.construct_params()
+        if compiled.positiontup:
+            params = tuple(params[name] for name in compiled.positiontup)
+        cursor = connection.connection.driver_connection.cursor()
+        try:
+            cursor.execute(str(compiled), params)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        columns = {
+            name: np.fromiter((row[n] for row in rows), dtype=dtype, count=len(rows))
+            for n, (name, dtype) in enumerate(COLUMNS.items())
+        }
+        columns['elapsed_days'][columns['elapsed_days'] < 0] = np.nan
+        return columns
+
+    def load(self) -> Dict[str, np.ndarray]:
+        """The whole log as column arrays, refreshed with rows appended since the last call."""
+        from app import db
+
+        with self._lock:
+            if self._url != str(db.engine.url):
+                # A different database (tests, CLI against another URL)
+                self._buffer, self._size = self._empty(0), 0
+                self._last_id, self._url = 0, str(db.engine.url)
+
+            overlap = ID_OVERLAP if db.engine.dialect.name == 'postgresql' else 0
+            after = max(self._last_id - overlap, 0)
+            while True:
+                new = self._fetch(after)
+                fetched = len(new['id'])
+                if not fetched:
+                    break
+                after = int(new['id'][-1])
+                if overlap:
+                    ids = self._buffer['id'][:self._size]
+                    keep = ~np.isin(new['id'], ids[ids > self._last_id - overlap])
+                    new = {name: values[keep] for name, values in new.items()}
+                self._append(new)
+                if fetched < LOAD_BATCH_SIZE:
+                    break
+            return {name: values[:self._size] for name, values in self._buffer.items()}
+
+    def _append(self, rows: Dict[str, np.ndarray]) -> None:
+        count = len(rows['id'])
+        if not count:
+            return
+        needed = self._size + count
+        if needed > len(self._buffer['id']):
+            grown = self._empty(max(needed, 2 * len(self._buffer['id'])))
+            for name, values in grown.items():
+                values[:self._size] = self._buffer[name][:self._size]
+            self._buffer = grown
+        for name, values in self._buffer.items():
+            values[self._size:needed] = rows[name]
+        self._size = needed
+        self._last_id = max(self._last_id, int(rows['id'].max()))
+
+    def report(self, subject_id: Optional[int] = None, set_id: Optional[int] = None, days: int = 30) -> Dict:
+        """Retention curve, per-set forgetting rates and a workload forecast."""
+        from app import db
+        from app.models import FlashcardSet
+
+        log = self.load()
+        mask = None
+        if set_id:
+            mask = log['flashcard_set_id'] == set_id
+        elif subject_id:
+            set_ids = db.session.execute(
+                select(FlashcardSet.id).where(FlashcardSet.subject_id == subject_id)
+            ).scalars().all()
+            mask = np.isin(log['flashcard_set_id'], set_ids)
+        if mask is not None:
+            log = {name: values[mask] for name, values in log.items()}
+
+        grade = log['grade']
+        elapsed = log['elapsed_days']
+        sets = log['flashcard_set_id']
+        # First reviews say nothing about forgetting
+        repeat = ~np.isnan(elapsed)
+        recalled = grade > 1
+        retention = float(recalled[repeat].mean()) if repeat.any() else None
+
+        return {
+            'reviews': len(grade),
+            'repeat_reviews': int(repeat.sum()),
+            'retention': round(retention, 4) if retention is not None else None,
+            'retention_curve': self._retention_curve(elapsed[repeat], recalled[repeat]),
+            'sets': self._set_forgetting(sets, elapsed, recalled, repeat),
+            'forecast': self._forecast(subject_id, set_id, days, 1 - retention if retention is not None else 0.0),
+        }
+
+    @staticmethod
+    def _retention_curve(elapsed: np.ndarray, recalled: np.ndarray) -> List[Dict]:
+        bucket = _BUCKET_OF_DAY[np.clip(elapsed, 0, 365).astype(np.int64)]
+        reviews = np.bincount(bucket, minlength=len(RETENTION_BUCKETS))
+        hits = np.bincount(bucket, weights=recalled, minlength=len(RETENTION_BUCKETS))
+        mean_days = np.bincount(bucket, weights=elapsed, minlength=len(RETENTION_BUCKETS))
+        upper = [*RETENTION_BUCKETS[1:].tolist(), None]
+        return [
+            {'min_days': low, 'max_days': high, 'reviews': int(n), 'mean_days': mean, 'retention': rate}
+            for low, high, n, mean, rate in zip(RETENTION_BUCKETS.tolist(), upper, reviews,
+                                                _rate(mean_days, reviews), _rate(hits, reviews))
+            if n
+        ]
+
+    @staticmethod
+    def _set_forgetting(sets: np.ndarray, elapsed: np.ndarray, recalled: np.ndarray,
+                        repeat: np.ndarray) -> List[Dict]:
+        """Lapses per day of exposure, the constant-hazard estimate of the forgetting rate."""
+        from app import db
+        from app.models import FlashcardSet
+
+        if not len(sets):
+            return []
+        # Set ids are small integers: bincount over them directly instead of np.unique's sort
+        index = sets.astype(np.int64)
+        reviews = np.bincount(index)
+        set_ids = np.flatnonzero(reviews)
+        reviews = reviews[set_ids]
+        repeats = np.bincount(index, weights=repeat)[set_ids]
+        lapses = np.bincount(index, weights=repeat & ~recalled)[set_ids]
+        exposure = np.bincount(index, weights=np.where(repeat, elapsed, 0.0))[set_ids]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rate = lapses / exposure
+        order = np.argsort(-np.nan_to_num(rate, nan=-1.0), kind='stable')[:MAX_SETS]
+
+        titles = dict(db.session.execute(
+            select(FlashcardSet.id, FlashcardSet.title).where(FlashcardSet.id.in_(set_ids[order].astype(int).tolist()))
+        ).all())
+        retention = _rate(repeats - lapses, repeats)
+        return [
+            {
+                'flashcard_set_id': int(set_ids[i]),
+                'title': titles.get(int(set_ids[i])),
+                'reviews': int(reviews[i]),
+                'retention': retention[i],
+                'forgetting_rate': round(float(rate[i]), 5) if np.isfinite(rate[i]) else None,
+                'half_life_days': round(float(np.log(2) / rate[i]), 1) if np.isfinite(rate[i]) and rate[i] > 0 else None,
+            }
+            for i in order
+        ]
+
+    @staticmethod
+    def _forecast(subject_id: Optional[int], set_id: Optional[int], days: int, lapse_rate: float) -> List[Dict]:
+        """Cards falling due per day, plus the relearning their lapses add.
+
+        A lapsed card comes back the next day, so expected reviews are the
+        due counts convolved with ``lapse_rate ** k``. Overdue cards count
+        towards today.
+        """
+        from app import db
+        from app.models import Flashcard, SubjectDailyStats
+
+        today = datetime.utcnow().date()
+        end = today + timedelta(days=days)
+        if set_id:
+            day = func.date(Flashcard.next_review)
+            rows = db.session.execute(
+                select(day, func.count())
+                .where(Flashcard.flashcard_set_id == set_id, Flashcard.next_review < end)
+                .group_by(day)
+            ).all()
+        else:
+            # Per-subject due buckets are already maintained for the dashboard
+            query = select(SubjectDailyStats.day, func.sum(SubjectDailyStats.cards_due)).where(
+                SubjectDailyStats.day < end, SubjectDailyStats.cards_due != 0
+            ).group_by(SubjectDailyStats.day)
+            if subject_id:
+                query = query.where(SubjectDailyStats.subject_id == subject_id)
+            rows = db.session.execute(query).all()
+
+        due = np.zeros(days)
+        if rows:
+            offsets = np.array([(date.fromisoformat(str(d)[:10]) - today).days for d, _ in rows])
+            counts = np.array([n for _, n in rows], dtype=float)
+            np.add.at(due, np.clip(offsets, 0, days - 1), counts)
+        expected = np.convolve(due, lapse_rate ** np.arange(days))[:days]
+        return [
+            {'date': (today + timedelta(days=n)).isoformat(), 'due': int(d), 'expected_reviews': round(float(e), 1)}
+            for n, (d, e) in enumerate(zip(due, expected))
+        ]
+
+
+# Singleton instance
+analytics_service = AnalyticsService()
@@ -0,0 +1,238 @@
+"""
+Archive Service - Streaming export and bulk import of a whole subject
+"""
+from sqlalchemy import Date, DateTime, select
+from datetime import date, datetime
+from typing import IO, Dict, Iterator, List, Optional
+import gzip
+import zlib
+
+from app.utils.serialization import decode, encode
+
+
+ARCHIVE_FORMAT = 'study-companion-subject'
+ARCHIVE_VERSION = 1
+EXPORT_BATCH_SIZE = 1000
+IMPORT_BATCH_SIZE = 1000
+COMPRESS_LEVEL = 6
+
+# Record types in archive order (parents first), the foreign keys each one
+# carries and the record type those keys point to
+RECORDS = {
+    'lecture': {'subject_id': 'subject'},
+    'note': {'subject_id': 'subject', 'lecture_id': 'lecture'},
+    'flashcard_set': {'subject_id': 'subject'},
+    'flashcard': {'flashcard_set_id': 'flashcard_set'},
+    'quiz': {'subject_id': 'subject'},
+    'question': {'quiz_id': 'quiz'},
+    'attempt': {'quiz_id': 'quiz'},
+    'attempt_answer': {'attempt_id': 'attempt', 'question_id': 'question'},
+}
+# A missing parent drops the row, except for these optional links
+OPTIONAL_REFERENCES = {('note', 'lecture_id')}
+
+
+def _models() -> Dict:
+    from app.models import (Subject, Lecture, Note, FlashcardSet, Flashcard,
+                            Quiz, QuizQuestion, QuizAttempt, QuizAttemptAnswer)
+    return {
+        'subject': Subject, 'lecture': Lecture, 'note': Note, 'flashcard_set': FlashcardSet,
+        'flashcard': Flashcard, 'quiz': Quiz, 'question': QuizQuestion, 'attempt': QuizAttempt,
+        'attempt_answer': QuizAttemptAnswer,
+    }
+
+
+def _queries(subject_id: int) -> Dict:
+    """Core SELECTs of every table row belonging to a subject, by record type."""
+    models = _models()
+    set_ids = select(models['flashcard_set'].id).where(models['flashcard_set'].subject_id == subject_id)
+    quiz_ids = select(models['quiz'].id).where(models['quiz'].subject_id == subject_id)
+    attempt_ids = select(models['attempt'].id).where(models['attempt'].quiz_id.in_(quiz_ids))
+
+    def rows(kind: str, condition):
+        table = models[kind].__table__
+        return select(table).where(condition).order_by(table.c.id)
+
+    return {
+        'subject': rows('subject', models['subject'].id == subject_id),
+        'lecture': rows('lecture', models['lecture'].subject_id == subject_id),
+        'note': rows('note', models['note'].subject_id == subject_id),
+        'flashcard_set': rows('flashcard_set', models['flashcard_set'].subject_id == subject_id),
+        'flashcard': rows('flashcard', models['flashcard'].flashcard_set_id.in_(set_ids)),
+        'quiz': rows('quiz', models['quiz'].subject_id == subject_id),
+        'question': rows('question', models['question'].quiz_id.in_(quiz_ids)),
+        'attempt': rows('attempt', models['attempt'].quiz_id.in_(quiz_ids)),
+        'attempt_answer': rows('attempt_answer', models['attempt_answer'].attempt_id.in_(attempt_ids)),
+    }
+
+
+class ArchiveService:
+    """Moves a subject in and out as gzip-compressed NDJSON.
+
+    An archive is a header line, one ``{"type": ..., "data": {...}}``
+    line per row (every column, parents before children) and an ``end``
+    line with the row counts. Export reads each table through a
+    server-side cursor and compresses batch by batch; import reads the
+    stream line by line and writes batched INSERTs, so neither holds
+    more than a batch of rows (plus the old-to-new id maps) in memory.
+    """
+
+    # -- export ------------------------------------------------------------------
+
+    def export_subject(self, subject_id: int) -> Iterator[bytes]:
+        """Gzip-compressed NDJSON chunks of the subject and everything under it."""
+        from app import db
+
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        counts = {}
+        header = {'type': 'header', 'format': ARCHIVE_FORMAT, 'version': ARCHIVE_VERSION,
+                  'exported_at': datetime.utcnow()}
+        yield compressor.compress(encode(header) + b'\n')
+
+        for kind, query in _queries(subject_id).items():
+            result = db.session.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+            counts[kind] = 0
+            for batch in result.mappings().partitions():
+                lines = [encode({'type': kind, 'data': dict(row)}) for row in batch]
+                counts[kind] += len(lines)
+                chunk = compressor.compress(b'\n'.join(lines) + b'\n')
+                if chunk:
+                    yield chunk
+
+        yield compressor.compress(encode({'type': 'end', 'counts': counts}) + b'\n')
+        yield compressor.flush()
+
+    # -- import ------------------------------------------------------------------
+
+    def import_subject(self, stream: IO[bytes], name: Optional[str] = None) -> Dict:
+        """Recreate an archived subject under new ids (the caller commits).
+
+        Raises ValueError for anything that is not a complete archive.
+        """
+        from app import db
+        from app.services.bulk_service import bulk_service
+        from app.services.dashboard_service import dashboard_service
+        from app.services.question_stats_service import question_stats_service
+
+        models = _models()
+        converters = {kind: self._converters(model) for kind, model in models.items()}
+        id_maps: Dict[str, Dict[int, int]] = {kind: {} for kind in models}
+        counts = {kind: 0 for kind in RECORDS}
+        subject = None
+        pending: List[Dict] = []
+        pending_kind: Optional[str] = None
+        seen_header = seen_end = False
+
+        def flush() -> None:
+            if not pending:
+                return
+            old_ids = [row.pop('id') for row in pending]
+            bulk_service.insert_rows(models[pending_kind], pending, subject.id)
+            id_maps[pending_kind].update(zip(old_ids, (row['id'] for row in pending)))
+            counts[pending_kind] += len(pending)
+            pending.clear()
+
+        try:
+            lines = gzip.GzipFile(fileobj=stream, mode='rb')
+            for number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = decode(line)
+                    kind = record['type']
+                except (ValueError, KeyError, TypeError):
+                    raise ValueError(f'Line {number} is not an archive record')
+
+                if not seen_header:
+                    if kind != 'header' or record.get('format') != ARCHIVE_FORMAT:
+                        raise ValueError('Not a subject archive')
+                    if record.get('version') != ARCHIVE_VERSION:
+                        raise ValueError(f"Unsupported archive version {record.get('version')}")
+                    seen_header = True
+                    continue
+                if kind == 'end':
+                    seen_end = True
+                    break
+
+                data = self._row(record, converters, kind)
+                if kind == 'subject':
+                    if subject is not None:
+                        raise ValueError('Archive holds more than one subject')
+                    data.pop('id', None)
+                    if name:
+                        data['name'] = name
+                    # Through the ORM so every flush hook sees the new subject
+                    subject = models['subject'](**data)
+                    db.session.add(subject)
+                    db.session.flush()
+                    continue
+                if kind not in RECORDS:
+                    raise ValueError(f'Line {number}: unknown record type {kind!r}')
+                if subject is None:
+                    raise ValueError(f'Line {number}: {kind} before the subject')
+
+                if kind != pending_kind:
+                    flush()
+                    pending_kind = kind
+                if self._remap(kind, data, id_maps, subject.id):
+                    pending.append(data)
+                if len(pending) >= IMPORT_BATCH_SIZE:
+                    flush()
+            flush()
+        except (OSError, EOFError, zlib.error):
+            raise ValueError('Archive is not valid gzip data')
+
+        if not seen_end or subject is None:
+            raise ValueError('Archive is truncated')
+        # Review totals live on the cards and are not carried by insert signals,
+        # and per-question times need each attempt's complete set of answers
+        dashboard_service.rebuild(db.session.connection(), [subject.id])
+        question_stats_service.rebuild(db.session.connection(), [subject.id])
+        return {'subject': subject, 'counts': counts}
+
+    @staticmethod
+    def _converters(model) -> Dict[str, type]:
+        """Columns whose JSON strings must become date/datetime objects again."""
+        converters = {}
+        for column in model.__table__.columns:
+            if isinstance(column.type, DateTime):
+                converters[column.key] = datetime
+            elif isinstance(column.type, Date):
+                converters[column.key] = date
+        return converters
+
+    @staticmethod
+    def _row(record: Dict, converters: Dict, kind: str) -> Dict:
+        data = record.get('data')
+        if not isinstance(data, dict):
+            raise ValueError(f'{kind} record without data')
+        columns = _models()[kind].__table__.columns
+        # Unknown keys (from a newer schema) are dropped; missing ones take defaults
+        row = {key: value for key, value in data.items() if key in columns}
+        for key, parse in converters[kind].items():
+            value = row.get(key)
+            if isinstance(value, str):
+                try:
+                    row[key] = parse.fromisoformat(value)
+                except ValueError:
+                    raise ValueError(f'{kind} {key} is not an ISO date: {value!r}')
+        return row
+
+    @staticmethod
+    def _remap(kind: str, data: Dict, id_maps: Dict[str, Dict[int, int]], subject_id: int) -> bool:
+        """Point foreign keys at the new ids; False if a required parent is missing."""
+        if not isinstance(data.get('id'), int):
+            raise ValueError(f'{kind} record without an integer id')
+        for field, parent in RECORDS[kind].items():
+            if parent == 'subject':
+                data[field] = subject_id
+                continue
+            new_id = id_maps[parent].get(data.get(field))
+            if new_id is None and (kind, field) not in OPTIONAL_REFERENCES:
+                return False
+            data[field] = new_id
+        return True
+
+
+# Singleton instance
+archive_service = ArchiveService()
@@ -0,0 +1,98 @@
+"""
+Bulk Service - Set-based inserts for flashcards and quiz questions
+"""
+from sqlalchemy import insert
+from datetime import datetime
+from typing import Dict, List
+from app import db
+from app.models import Flashcard, FlashcardSet, Quiz, QuizQuestion, NEW_CARD_DUE
+from app.signals import rows_inserted
+
+
+MAX_BULK_ROWS = 5000
+
+
+class BulkService:
+    """Insert many rows with one executemany/multi-VALUES INSERT ... RETURNING."""
+    
+    @staticmethod
+    def insert_rows(model, rows: List[Dict], subject_id: int) -> List[Dict]:
+        """Insert rows, fill in their generated ids and announce them."""
+        if not rows:
+            return []
+        ids = db.session.execute(
+            insert(model).returning(model.id, sort_by_parameter_order=True),
+            rows
+        ).scalars().all()
+        for row, row_id in zip(rows, ids):
+            row['id'] = row_id
+        rows_inserted.send(model, rows=rows, subject_id=subject_id)
+        return rows
+    
+    def insert_flashcards(self, flashcard_set: FlashcardSet, cards: List[Dict]) -> List[Dict]:
+        """Insert cards into a set; returns their ``to_dict()`` without re-querying."""
+        now = datetime.utcnow()
+        rows = [
+            {
+                'front': card['front'],
+                'back': card['back'],
+                'difficulty': 0,
+                'times_reviewed': 0,
+                'times_correct': 0,
+                'next_review': NEW_CARD_DUE,
+                'flashcard_set_id': flashcard_set.id,
+                'created_at': now
+            }
+            for card in cards
+        ]
+        rows = self.insert_rows(Flashcard, rows, flashcard_set.subject_id)
+        return [Flashcard(**row).to_dict() for row in rows]
+    
+    def insert_questions(self, quiz: Quiz, questions: List[Dict]) -> List[Dict]:
+        """Insert questions into a quiz; returns their ``to_dict()`` without re-querying."""
+        rows = [
+            {
+                'question': q['question'],
+                'question_type': q.get('question_type', 'short_answer'),
+                'options': q.get('options') or None,
+                'correct_answer': q['correct_answer'],
+                'explanation': q.get('explanation'),
+                'points': q.get('points', 1),
+                'quiz_id': quiz.id
+            }
+            for q in questions
+        ]
+        rows = self.insert_rows(QuizQuestion, rows, quiz.subject_id)
+        return [QuizQuestion(**row).to_dict() for row in rows]
+    
+    @staticmethod
+    def validate_cards(cards) -> List[Dict]:
+        """Keep well-formed cards; raise ValueError for an unusable payload."""
+        if not isinstance(cards, list) or not cards:
+            raise ValueError('cards must be a non-empty array')
+        if len(cards) > MAX_BULK_ROWS:
+            raise ValueError(f'At most {MAX_BULK_ROWS} cards per request')
+        valid = [
+            c for c in cards
+            if isinstance(c, dict) and isinstance(c.get('front'), str) and isinstance(c.get('back'), str)
+            and c['front'].strip() and c['back'].strip()
+        ]
+        if len(valid) != len(cards):
+            raise ValueError('Every card needs a non-empty front and back')
+        return valid
+    
+    @staticmethod
+    def validate_questions(questions) -> List[Dict]:
+        """Keep well-formed questions; raise ValueError for an unusable payload."""
+        if not isinstance(questions, list) or not questions:
+            raise ValueError('questions must be a non-empty array')
+        if len(questions) > MAX_BULK_ROWS:
+            raise ValueError(f'At most {MAX_BULK_ROWS} questions per request')
+        for q in questions:
+            if not isinstance(q, dict) or not q.get('question') or not q.get('correct_answer'):
+                raise ValueError('Every question needs question text and a correct answer')
+        return questions
+
+
+# Singleton instance
+bulk_service = BulkService()
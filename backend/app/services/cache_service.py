@@ -0,0 +1,202 @@
+"""
+Cache Service - Versioned result cache for read-heavy list endpoints
+"""
+from flask import request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, inspect, select
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+import threading
+
+from app.signals import rows_inserted
+from app.utils.database import primary
+from app.utils.serialization import decode, encode
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - only needed for a shared cache
+    redis = None
+
+
+# Version scope of results that span every subject
+ALL_SUBJECTS = 'all'
+
+
+class MemoryCacheBackend:
+    """Per-process LRU of results plus per-scope version counters."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def versions(self, scopes: List[str]) -> List[int]:
+        return [self._versions.get(scope, 0) for scope in scopes]
+
+    def bump(self, scopes: Iterable[str]) -> None:
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] = self._versions.get(scope, 0) + 1
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            # Entries under old versions are never read again and age out here
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class RedisCacheBackend:
+    """Results and version counters shared by every worker through Redis.
+
+    Entries expire after ``ttl`` seconds; configure Redis with an LRU
+    ``maxmemory-policy`` to bound memory.
+    """
+
+    PREFIX = 'study-cache:'
+
+    def __init__(self, url: str, ttl: int = 3600):
+        if redis is None:
+            raise RuntimeError('RESULT_CACHE_URL requires the redis package')
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def versions(self, scopes: List[str]) -> List[int]:
+        values = self.client.mget([f'{self.PREFIX}v:{scope}' for scope in scopes])
+        return [int(value or 0) for value in values]
+
+    def bump(self, scopes: Iterable[str]) -> None:
+        pipeline = self.client.pipeline()
+        for scope in scopes:
+            pipeline.incr(f'{self.PREFIX}v:{scope}')
+        pipeline.execute()
+
+    def get(self, key: str) -> Any:
+        value = self.client.get(f'{self.PREFIX}r:{key}')
+        return decode(value) if value is not None else None
+
+    def set(self, key: str, value: Any) -> None:
+        self.client.set(f'{self.PREFIX}r:{key}', encode(value), ex=self.ttl)
+
+
+class CacheService:
+    """Caches endpoint results under the version of the subject they read.
+
+    Any commit that touches a subject's rows bumps that subject's version
+    (and the all-subjects version), so results cached under the old
+    version can no longer be looked up. Invalidation is driven by session
+    events, so routes only need to say which subject a result depends on.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self._listening = False
+
+    def init_app(self, app) -> None:
+        """Pick the backend from ``RESULT_CACHE_URL`` / ``RESULT_CACHE_SIZE``."""
+        url = app.config.get('RESULT_CACHE_URL')
+        size = int(app.config.get('RESULT_CACHE_SIZE', 1024))
+        if url:
+            self.backend = RedisCacheBackend(url, ttl=int(app.config.get('RESULT_CACHE_TTL', 3600)))
+        elif size > 0:
+            self.backend = MemoryCacheBackend(size)
+        else:
+            self.backend = None
+
+        if not self._listening:
+            event.listen(Session, 'after_flush', self._after_flush)
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_rollback', self._after_rollback)
+            rows_inserted.connect(self._on_rows_inserted)
+            self._listening = True
+
+    def cached(self, subject_id: Optional[int], compute: Callable[[], Any]) -> Any:
+        """Return the cached result for this request, computing it on a miss.
+
+        The key is the endpoint, its query parameters and the current
+        version of ``subject_id`` (or of all subjects when None). Misses
+        are computed on the primary: a lagging replica could return rows
+        older than the version the result is stored under.
+        """
+        if self.backend is None:
+            return compute()
+
+        scope = str(subject_id) if subject_id else ALL_SUBJECTS
+        version, = self.backend.versions([scope])
+        params = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+        key = f'{request.endpoint}?{params}#{scope}:{version}'
+
+        value = self.backend.get(key)
+        if value is None:
+            with primary():
+                value = compute()
+            self.backend.set(key, value)
+        return value
+
+    def bump(self, subject_ids: Iterable[int]) -> None:
+        """Retire cached results of these subjects, for writes that bypass the session hooks."""
+        if self.backend is not None:
+            self.backend.bump([ALL_SUBJECTS, *(str(s) for s in subject_ids)])
+
+    def _after_flush(self, session, flush_context) -> None:
+        subjects = session.info.setdefault('cache_subjects', set())
+        subjects.update(self._subjects_for(session, [*session.new, *session.dirty, *session.deleted]))
+
+    def _on_rows_inserted(self, model, rows, subject_id: int) -> None:
+        from app import db
+        db.session().info.setdefault('cache_subjects', set()).add(subject_id)
+
+    def _after_commit(self, session) -> None:
+        subjects = session.info.pop('cache_subjects', None)
+        if subjects:
+            self.bump(subjects)
+
+    def _after_rollback(self, session) -> None:
+        session.info.pop('cache_subjects', None)
+
+    @staticmethod
+    def _subjects_for(session, objects: List) -> Set[int]:
+        """Subjects whose rows these objects are (or were) part of."""
+        from app.models import Subject, Flashcard, FlashcardSet, Quiz, QuizQuestion, QuizAttempt
+
+        subjects, set_ids, quiz_ids = set(), set(), set()
+        for obj in objects:
+            if isinstance(obj, Subject):
+                subjects.add(obj.id)
+                continue
+            name = {'Flashcard': 'flashcard_set_id', 'QuizQuestion': 'quiz_id',
+                    'QuizAttempt': 'quiz_id'}.get(type(obj).__name__, 'subject_id')
+            if name not in inspect(obj).mapper.attrs:
+                continue
+            history = inspect(obj).attrs[name].history
+            ids = {i for i in (*history.added, *history.deleted, *history.unchanged) if i is not None}
+            if isinstance(obj, Flashcard):
+                set_ids |= ids
+            elif isinstance(obj, (QuizQuestion, QuizAttempt)):
+                quiz_ids |= ids
+            else:
+                subjects |= ids
+
+        connection = session.connection()
+        if set_ids:
+            subjects.update(connection.execute(
+                select(FlashcardSet.subject_id).where(FlashcardSet.id.in_(set_ids))
+            ).scalars())
+        if quiz_ids:
+            subjects.update(connection.execute(
+                select(Quiz.subject_id).where(Quiz.id.in_(quiz_ids))
+            ).scalars())
+        return subjects
+
+
+# Singleton instance
+cache_service = CacheService()
@@ -0,0 +1,411 @@
+"""
+Dashboard Service - Per-subject study statistics maintained on write
+"""
+from flask_sqlalchemy.session import Session
+from sqlalchemy import case, event, func, inspect, select, update
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.signals import rows_inserted
+from app.utils.database import upsert
+
+
+# Days of history in recent_activity, and the window for recent accuracy
+RECENT_DAYS = 14
+ACCURACY_DAYS = 7
+UPCOMING_DAYS = 7
+
+# Model -> SubjectStats counter
+COUNTERS = {
+    'Lecture': 'lecture_count',
+    'Note': 'note_count',
+    'FlashcardSet': 'flashcard_set_count',
+    'Flashcard': 'flashcard_count',
+    'Quiz': 'quiz_count',
+    'QuizQuestion': 'question_count',
+    'QuizAttempt': 'attempt_count',
+}
+
+# Models that count as study material created that day
+CREATED_ITEMS = ('Lecture', 'Note', 'Flashcard')
+
+# Rows that reach their subject through a set or quiz
+VIA_PARENT = {
+    'Flashcard': ('flashcard_set_id', 'FlashcardSet'),
+    'QuizQuestion': ('quiz_id', 'Quiz'),
+    'QuizAttempt': ('quiz_id', 'Quiz'),
+}
+
+
+def _today() -> date:
+    return datetime.utcnow().date()
+
+
+def _day(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        # SQLite's date() returns text
+        return date.fromisoformat(value[:10])
+    return value or _today()
+
+
+def _percentage(score: int, total_points: int) -> float:
+    return score * 100.0 / total_points if total_points else 0.0
+
+
+def _change(state, name: str) -> Optional[Tuple]:
+    """(old, new) for a modified scalar attribute, else None."""
+    history = state.attrs[name].history
+    if not history.added:
+        return None
+    return (history.deleted[0] if history.deleted else None), history.added[0]
+
+
+class StatsDeltas:
+    """Counter changes collected from one flush or bulk write."""
+
+    def __init__(self):
+        self.stats: Dict[int, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self.daily: Dict[Tuple[int, date], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    def add(self, subject_id: int, column: str, amount: float = 1) -> None:
+        self.stats[subject_id][column] += amount
+
+    def add_daily(self, subject_id: int, day: date, column: str, amount: float = 1) -> None:
+        self.daily[(subject_id, day)][column] += amount
+
+    def apply(self, connection, skip: Iterable[int] = ()) -> None:
+        from app.models import SubjectStats, SubjectDailyStats
+
+        skip = set(skip)
+        upsert(connection, SubjectStats.__table__, ['subject_id'], [
+            {'subject_id': subject_id, **columns}
+            for subject_id, columns in self.stats.items() if subject_id not in skip
+        ])
+        upsert(connection, SubjectDailyStats.__table__, ['subject_id', 'day'], [
+            {'subject_id': subject_id, 'day': day, **columns}
+            for (subject_id, day), columns in self.daily.items() if subject_id not in skip
+        ])
+
+
+class DashboardService:
+    """Keeps ``subject_stats`` / ``subject_daily_stats`` current and reads them.
+
+    Creating material, reviewing cards and submitting attempts adjust the
+    counters by the change in the same transaction, so reading a
+    dashboard never scans cards or attempts. Deletes and moves between
+    subjects are rare and recount the affected subjects instead.
+    """
+
+    def __init__(self):
+        self._listening = False
+
+    def init_app(self, app) -> None:
+        """Hook session writes; backfill the tables the first time they exist."""
+        from app import db
+        from app.models import Subject, SubjectStats
+
+        @app.cli.command('dashboard-rebuild')
+        def rebuild_command():
+            """Recount every subject's dashboard statistics."""
+            with db.engine.begin() as connection:
+                subject_ids = connection.execute(select(Subject.id)).scalars().all()
+                self.rebuild(connection, subject_ids)
+            print(f"Rebuilt statistics for {len(subject_ids)} subjects")
+
+        with app.app_context():
+            with db.engine.begin() as connection:
+                if connection.execute(select(SubjectStats.subject_id).limit(1)).first() is None:
+                    self.rebuild(connection, connection.execute(select(Subject.id)).scalars().all())
+
+        if not self._listening:
+            event.listen(Session, 'after_flush', self._after_flush)
+            rows_inserted.connect(self._on_rows_inserted)
+            self._listening = True
+
+    # -- reads ---------------------------------------------------------------
+
+    def dashboards(self, subject_id: Optional[int] = None) -> List[Dict]:
+        """Dashboards for one subject or all of them (two queries)."""
+        from app import db
+        from app.models import Subject, SubjectStats, SubjectDailyStats
+
+        query = (
+            select(Subject.id, Subject.name, Subject.color, SubjectStats)
+            .outerjoin(SubjectStats, SubjectStats.subject_id == Subject.id)
+            .order_by(Subject.name)
+        )
+        if subject_id is not None:
+            query = query.where(Subject.id == subject_id)
+        rows = db.session.execute(query).all()
+        if not rows:
+            return []
+
+        today = _today()
+        start = today - timedelta(days=RECENT_DAYS - 1)
+        end = today + timedelta(days=UPCOMING_DAYS)
+        # The recent window, the coming week, and older days still holding overdue cards
+        daily_query = select(SubjectDailyStats).where(
+            SubjectDailyStats.day.between(start, end) |
+            ((SubjectDailyStats.day < start) & (SubjectDailyStats.cards_due != 0))
+        )
+        if subject_id is not None:
+            daily_query = daily_query.where(SubjectDailyStats.subject_id == subject_id)
+        days = defaultdict(dict)
+        for day in db.session.execute(daily_query).scalars():
+            days[day.subject_id][day.day] = day
+
+        return [
+            self._dashboard(sid, name, color, stats, days.get(sid, {}), today)
+            for sid, name, color, stats in rows
+        ]
+
+    @staticmethod
+    def _dashboard(subject_id: int, name: str, color: str, stats, days: Dict, today: date) -> Dict:
+        def total(column: str):
+            return getattr(stats, column) if stats is not None else 0
+
+        recent = [today - timedelta(days=n) for n in range(RECENT_DAYS - 1, -1, -1)]
+        accuracy_window = recent[-ACCURACY_DAYS:]
+        recent_reviews = sum(days[d].reviews for d in accuracy_window if d in days)
+        recent_correct = sum(days[d].correct for d in accuracy_window if d in days)
+        attempts = total('attempt_count')
+        reviews = total('review_count')
+
+        return {
+            'subject_id': subject_id,
+            'name': name,
+            'color': color,
+            'counts': {
+                'lectures': total('lecture_count'),
+                'notes': total('note_count'),
+                'flashcard_sets': total('flashcard_set_count'),
+                'flashcards': total('flashcard_count'),
+                'quizzes': total('quiz_count'),
+                'questions': total('question_count'),
+            },
+            'due': {
+                'today': sum(d.cards_due for day, d in days.items() if day <= today),
+                'upcoming': [
+                    {'date': day.isoformat(), 'cards': days[day].cards_due if day in days else 0}
+                    for day in (today + timedelta(days=n) for n in range(1, UPCOMING_DAYS + 1))
+                ],
+            },
+            'quizzes': {
+                'attempts': attempts,
+                'average_score': round(total('attempt_percentage_sum') / attempts, 1) if attempts else None,
+            },
+            'reviews': {
+                'total': reviews,
+                'accuracy': round(total('correct_count') / reviews * 100, 1) if reviews else None,
+                'recent_accuracy': round(recent_correct / recent_reviews * 100, 1) if recent_reviews else None,
+            },
+            'recent_activity': [
+                {
+                    'date': day.isoformat(),
+                    'reviews': days[day].reviews if day in days else 0,
+                    'correct': days[day].correct if day in days else 0,
+                    'quiz_attempts': days[day].attempts if day in days else 0,
+                    'items_created': days[day].items_created if day in days else 0,
+                }
+                for day in recent
+            ],
+        }
+
+    # -- maintenance -----------------------------------------------------------
+
+    def rebuild(self, connection, subject_ids: Iterable[int]) -> None:
+        """Recount the statistics that can be derived from current rows.
+
+        Daily review and creation history is kept; counts, totals, due
+        buckets and attempt history are recomputed.
+        """
+        from app.models import (Lecture, Note, FlashcardSet, Flashcard, Quiz, QuizQuestion,
+                                QuizAttempt, SubjectStats, SubjectDailyStats)
+
+        def count(model, condition):
+            return select(func.count()).select_from(model).where(condition).scalar_subquery()
+
+        percentage = case(
+            (QuizAttempt.total_points > 0, QuizAttempt.score * 100.0 / QuizAttempt.total_points),
+            else_=0.0
+        )
+        for subject_id in subject_ids:
+            set_ids = select(FlashcardSet.id).where(FlashcardSet.subject_id == subject_id)
+            quiz_ids = select(Quiz.id).where(Quiz.subject_id == subject_id)
+            in_sets = Flashcard.flashcard_set_id.in_(set_ids)
+            in_quizzes = QuizAttempt.quiz_id.in_(quiz_ids)
+
+            counts = connection.execute(select(
+                count(Lecture, Lecture.subject_id == subject_id),
+                count(Note, Note.subject_id == subject_id),
+                count(FlashcardSet, FlashcardSet.subject_id == subject_id),
+                count(Quiz, Quiz.subject_id == subject_id),
+                count(QuizQuestion, QuizQuestion.quiz_id.in_(quiz_ids)),
+            )).one()
+            cards = connection.execute(select(
+                func.count(Flashcard.id),
+                func.coalesce(func.sum(Flashcard.times_reviewed), 0),
+                func.coalesce(func.sum(Flashcard.times_correct), 0),
+            ).where(in_sets)).one()
+            attempts = connection.execute(select(
+                func.count(QuizAttempt.id), func.coalesce(func.sum(percentage), 0.0)
+            ).where(in_quizzes)).one()
+
+            upsert(connection, SubjectStats.__table__, ['subject_id'], [{
+                'subject_id': subject_id,
+                'lecture_count': counts[0],
+                'note_count': counts[1],
+                'flashcard_set_count': counts[2],
+                'quiz_count': counts[3],
+                'question_count': counts[4],
+                'flashcard_count': cards[0],
+                'review_count': cards[1],
+                'correct_count': cards[2],
+                'attempt_count': attempts[0],
+                'attempt_percentage_sum': attempts[1],
+            }], replace=True)
+
+            connection.execute(
+                update(SubjectDailyStats.__table__)
+                .where(SubjectDailyStats.subject_id == subject_id)
+                .values(cards_due=0, attempts=0, attempt_percentage_sum=0)
+            )
+            daily = defaultdict(lambda: {'cards_due': 0, 'attempts': 0, 'attempt_percentage_sum': 0.0})
+            due_day = func.date(func.coalesce(Flashcard.next_review, Flashcard.created_at))
+            for day, n in connection.execute(
+                select(due_day, func.count()).where(in_sets).group_by(due_day)
+            ):
+                daily[_day(day)]['cards_due'] = n
+            attempt_day = func.date(QuizAttempt.completed_at)
+            for day, n, total in connection.execute(
+                select(attempt_day, func.count(), func.sum(percentage)).where(in_quizzes).group_by(attempt_day)
+            ):
+                daily[_day(day)].update(attempts=n, attempt_percentage_sum=total or 0.0)
+            upsert(connection, SubjectDailyStats.__table__, ['subject_id', 'day'], [
+                {'subject_id': subject_id, 'day': day, **columns} for day, columns in daily.items()
+            ], replace=True)
+
+    def _after_flush(self, session, flush_context) -> None:
+        from app.models import Subject
+
+        new = [o for o in session.new if type(o).__name__ in COUNTERS]
+        dirty = [o for o in session.dirty if type(o).__name__ in COUNTERS]
+        deleted = [o for o in session.deleted if type(o).__name__ in COUNTERS]
+        if not (new or dirty or deleted):
+            return
+
+        connection = session.connection()
+        subject_for = self._subject_resolver(connection, new + dirty + deleted)
+        deltas = StatsDeltas()
+        recount = set()
+        today = _today()
+
+        for obj in new:
+            name = type(obj).__name__
+            subject_id = subject_for(obj)
+            if subject_id is None:
+                continue
+            deltas.add(subject_id, COUNTERS[name])
+            if name in CREATED_ITEMS:
+                deltas.add_daily(subject_id, today, 'items_created')
+            if name == 'Flashcard':
+                deltas.add_daily(subject_id, _day(obj.next_review or obj.created_at), 'cards_due')
+            elif name == 'QuizAttempt':
+                percentage = _percentage(obj.score, obj.total_points)
+                deltas.add(subject_id, 'attempt_percentage_sum', percentage)
+                deltas.add_daily(subject_id, _day(obj.completed_at), 'attempts')
+                deltas.add_daily(subject_id, _day(obj.completed_at), 'attempt_percentage_sum', percentage)
+
+        for obj in dirty:
+            name = type(obj).__name__
+            state = inspect(obj)
+            parent_key = VIA_PARENT[name][0] if name in VIA_PARENT else 'subject_id'
+            moved = _change(state, parent_key)
+            if moved:
+                recount.update(subject_for(obj, parent_id) for parent_id in moved)
+                continue
+            if name != 'Flashcard':
+                continue
+            subject_id = subject_for(obj)
+            reviewed = _change(state, 'times_reviewed')
+            if reviewed:
+                day = _day(obj.last_reviewed)
+                amount = (reviewed[1] or 0) - (reviewed[0] or 0)
+                deltas.add(subject_id, 'review_count', amount)
+                deltas.add_daily(subject_id, day, 'reviews', amount)
+                correct = _change(state, 'times_correct')
+                if correct:
+                    amount = (correct[1] or 0) - (correct[0] or 0)
+                    deltas.add(subject_id, 'correct_count', amount)
+                    deltas.add_daily(subject_id, day, 'correct', amount)
+            rescheduled = _change(state, 'next_review')
+            if rescheduled:
+                old, new_value = rescheduled
+                deltas.add_daily(subject_id, _day(old or obj.created_at), 'cards_due', -1)
+                deltas.add_daily(subject_id, _day(new_value or obj.created_at), 'cards_due')
+
+        recount.update(subject_for(obj) for obj in deleted)
+        # Their statistics rows go with them (ON DELETE CASCADE)
+        gone = {o.id for o in session.deleted if isinstance(o, Subject)}
+        deltas.apply(connection, skip=gone)
+        self.rebuild(connection, recount - gone - {None})
+
+    def _on_rows_inserted(self, model, rows: List[Dict], subject_id: int) -> None:
+        from app import db
+
+        name = model.__name__
+        if name not in COUNTERS:
+            return
+        today = _today()
+        deltas = StatsDeltas()
+        deltas.add(subject_id, COUNTERS[name], len(rows))
+        if name in CREATED_ITEMS:
+            deltas.add_daily(subject_id, today, 'items_created', len(rows))
+        if name == 'Flashcard':
+            for row in rows:
+                deltas.add_daily(subject_id, _day(row.get('next_review') or row.get('created_at')), 'cards_due')
+        elif name == 'QuizAttempt':
+            for row in rows:
+                percentage = _percentage(row['score'], row['total_points'])
+                day = _day(row.get('completed_at'))
+                deltas.add(subject_id, 'attempt_percentage_sum', percentage)
+                deltas.add_daily(subject_id, day, 'attempts')
+                deltas.add_daily(subject_id, day, 'attempt_percentage_sum', percentage)
+        deltas.apply(db.session.connection())
+
+    @staticmethod
+    def _subject_resolver(connection, objects: List):
+        """Map objects (or a set/quiz id of theirs) to subject ids with one query per parent type."""
+        from app import models
+
+        parent_ids = defaultdict(set)
+        for obj in objects:
+            name = type(obj).__name__
+            if name in VIA_PARENT:
+                key, parent = VIA_PARENT[name]
+                history = inspect(obj).attrs[key].history
+                parent_ids[parent].update(i for i in history.sum() if i is not None)
+
+        subjects = {}
+        for parent, ids in parent_ids.items():
+            model = getattr(models, parent)
+            subjects[parent] = dict(connection.execute(
+                select(model.id, model.subject_id).where(model.id.in_(ids))
+            ).all())
+
+        def subject_for(obj, key_value=None):
+            name = type(obj).__name__
+            if name in VIA_PARENT:
+                key, parent = VIA_PARENT[name]
+                parent_id = key_value if key_value is not None else getattr(obj, key)
+                return subjects[parent].get(parent_id)
+            return key_value if key_value is not None else obj.subject_id
+
+        return subject_for
+
+
+# Singleton instance
+dashboard_service = DashboardService()
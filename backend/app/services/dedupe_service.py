@@ -0,0 +1,474 @@
+"""
+Dedupe Service - MinHash/LSH index for near-duplicate flashcards and quiz questions
+"""
+from flask_sqlalchemy.session import Session
+from sqlalchemy import bindparam, delete, event, func, insert, inspect, select, update
+from typing import Dict, Iterable, List, Optional, Tuple
+import re
+import numpy as np
+
+from app.signals import rows_inserted
+
+
+NUM_PERM = 64
+# 16 bands of 4 rows: pairs at Jaccard 0.8 share a bucket with probability
+# 1 - (1 - 0.8 ** 4) ** 16 > 0.999, pairs at 0.3 with about 0.12
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 4
+DUPLICATE_THRESHOLD = 0.8
+# Larger buckets in the dedupe pass are compared against their first member only
+MAX_BUCKET_PAIRS = 256
+CHUNK_SIZE = 500
+# Texts whose shingles are hashed together (bounds the temporary hash matrix)
+SIGNATURE_CHUNK = 256
+
+# Indexed models, the kind stored for them and the attributes behind their text
+KINDS = {'Flashcard': 'flashcard', 'QuizQuestion': 'question'}
+INDEXED_ATTRIBUTES = {
+    'Flashcard': ('front', 'back', 'flashcard_set_id'),
+    'QuizQuestion': ('question', 'quiz_id'),
+}
+# Parents whose children the database deletes with ON DELETE CASCADE
+PARENTS = {'FlashcardSet': 'flashcard', 'Quiz': 'question'}
+
+# Multiply-shift hash family: h(x) = (a * x + b) mod 2**64 >> 32, with odd a
+_PARAMS = np.random.default_rng(0x6D696E68).integers(1, 2 ** 63, size=(2, NUM_PERM), dtype=np.uint64)
+_A = _PARAMS[0] | np.uint64(1)
+_B = _PARAMS[1]
+_BAND_SALT = np.arange(1, BANDS + 1, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+_FNV_PRIME = np.uint64(0x100000001B3)
+
+
+def normalize(text: Optional[str]) -> str:
+    """Lowercase words separated by single spaces; punctuation is dropped."""
+    return ' '.join(re.findall(r'\w+', (text or '').lower()))
+
+
+def item_text(kind: str, values: Dict) -> str:
+    """The text compared for a card (both sides) or a question."""
+    if kind == 'flashcard':
+        return f"{values.get('front') or ''} {values.get('back') or ''}"
+    return values.get('question') or ''
+
+
+def signatures(texts: Iterable[Optional[str]]) -> np.ndarray:
+    """MinHash signatures (``(n, NUM_PERM)`` uint32) of the texts' 4-byte shingles.
+
+    A shingle of the normalized UTF-8 text is its own 32-bit integer, so a
+    whole chunk of texts is shingled, hashed and reduced per text with
+    NumPy alone.
+    """
+    encoded = [normalize(text).encode().ljust(SHINGLE_SIZE, b'\0') for text in texts]
+    result = np.empty((len(encoded), NUM_PERM), dtype=np.uint32)
+    for start in range(0, len(encoded), SIGNATURE_CHUNK):
+        chunk = encoded[start:start + SIGNATURE_CHUNK]
+        data = np.frombuffer(b''.join(chunk), dtype=np.uint8).astype(np.uint64)
+        grams = sum(data[k:len(data) - SHINGLE_SIZE + 1 + k] << np.uint64(8 * k) for k in range(SHINGLE_SIZE))
+        # Keep the shingles that start and end inside one text
+        lengths = np.fromiter(map(len, chunk), dtype=np.int64, count=len(chunk))
+        counts = lengths - (SHINGLE_SIZE - 1)
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        begins = np.cumsum(lengths) - lengths
+        grams = grams[np.repeat(begins - offsets, counts) + np.arange(counts.sum())]
+        hashed = (_A[:, None] * grams[None, :] + _B[:, None]) >> np.uint64(32)
+        result[start:start + len(chunk)] = np.minimum.reduceat(hashed, offsets, axis=1).T
+    return result
+
+
+def band_buckets(sigs: np.ndarray) -> np.ndarray:
+    """One signed 64-bit bucket per band and signature (shape ``(n, BANDS)``).
+
+    The band number is mixed into the key, so one bucket column serves
+    every band.
+    """
+    rows = sigs.reshape(len(sigs), BANDS, ROWS).astype(np.uint64)
+    keys = np.broadcast_to(_BAND_SALT, (len(sigs), BANDS)).copy()
+    for r in range(ROWS):
+        keys = (keys ^ rows[:, :, r]) * _FNV_PRIME
+    return keys.view(np.int64)
+
+
+def _insert_many(connection, table, columns: Tuple[str, ...], rows: List[Tuple]) -> None:
+    """executemany straight on the DB-API cursor.
+
+    An index write is 16 band rows per item; building SQLAlchemy
+    parameter dicts for each would cost more than the INSERT itself.
+    """
+    if not rows:
+        return
+    compiled = insert(table).values({name: bindparam(name) for name in columns}).compile(dialect=connection.dialect)
+    if compiled.positional:
+        order = [columns.index(name) for name in compiled.positiontup]
+        rows = [tuple(row[i] for i in order) for row in rows]
+    else:
+        rows = [dict(zip(columns, row)) for row in rows]
+    connection.exec_driver_sql(str(compiled), rows)
+
+
+def _chunks(values: List, size: int = CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class DedupeService:
+    """Finds near-duplicate cards and questions within a subject.
+
+    Each item's text is shingled into character 4-grams and reduced to a
+    64-value MinHash signature; the signature is split into 16 LSH bands
+    whose hashes are stored in ``minhash_bands``. A lookup probes 16
+    buckets through the ``(subject_id, kind, bucket)`` index and compares
+    signatures only with the items found there, so its cost depends on
+    the number of near matches, not on the size of the subject.
+    """
+
+    def __init__(self):
+        self._listening = False
+
+    def init_app(self, app) -> None:
+        """Backfill an empty index and hook session writes."""
+        from app import db
+        from app.models import Flashcard, MinHashSignature, QuizQuestion
+
+        @app.cli.command('dedupe-index')
+        def reindex_command():
+            """Rebuild the near-duplicate index from scratch."""
+            print(f"Indexed {self.reindex()} items")
+
+        with app.app_context():
+            with db.engine.connect() as connection:
+                empty = connection.execute(select(
+                    ~select(MinHashSignature.item_id).exists() &
+                    (select(Flashcard.id).exists() | select(QuizQuestion.id).exists())
+                )).scalar()
+            if empty:
+                self.reindex()
+
+        if not self._listening:
+            event.listen(Session, 'after_flush', self._after_flush)
+            rows_inserted.connect(self._on_rows_inserted)
+            self._listening = True
+
+    # -- lookups ---------------------------------------------------------------
+
+    def find_duplicates(self, kind: str, subject_id: int, texts: List[str]) -> List[Optional[Dict]]:
+        """For each text, the closest existing item or earlier text it duplicates, or None.
+
+        A match is ``{'duplicate_of': item_id, 'similarity': ...}`` for an
+        indexed item and ``{'duplicate_of_index': i, 'similarity': ...}``
+        for an earlier entry of ``texts``.
+        """
+        from app import db
+        from app.models import MinHashBand
+
+        if not texts:
+            return []
+        sigs = signatures(texts)
+        keys = band_buckets(sigs)
+
+        members: Dict[int, List[int]] = {}
+        for chunk in _chunks(np.unique(keys).tolist()):
+            for bucket, item_id in db.session.execute(
+                select(MinHashBand.bucket, MinHashBand.item_id).where(
+                    MinHashBand.subject_id == subject_id, MinHashBand.kind == kind, MinHashBand.bucket.in_(chunk)
+                )
+            ):
+                members.setdefault(bucket, []).append(item_id)
+        candidates = self._load_signatures(kind, sorted({i for ids in members.values() for i in ids}))
+
+        matches, seen = [], {}
+        for n, (sig, row) in enumerate(zip(sigs, keys.tolist())):
+            match = None
+            ids = sorted({i for bucket in row for i in members.get(bucket, ()) if i in candidates})
+            if ids:
+                scores = (np.stack([candidates[i] for i in ids]) == sig).mean(axis=1)
+                best = int(np.argmax(scores))
+                if scores[best] >= DUPLICATE_THRESHOLD:
+                    match = {'duplicate_of': ids[best], 'similarity': round(float(scores[best]), 3)}
+            if match is None:
+                earlier = sorted({j for bucket in row for j in seen.get(bucket, ())})
+                if earlier:
+                    scores = (sigs[earlier] == sig).mean(axis=1)
+                    best = int(np.argmax(scores))
+                    if scores[best] >= DUPLICATE_THRESHOLD:
+                        match = {'duplicate_of_index': earlier[best], 'similarity': round(float(scores[best]), 3)}
+            if match is None:
+                # Only kept entries can be matched by later ones
+                for bucket in row:
+                    seen.setdefault(bucket, []).append(n)
+            matches.append(match)
+        return matches
+
+    def filter_new(self, kind: str, subject_id: int, items: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """Split new items into those to insert and the near-duplicates skipped.
+
+        Each skipped entry carries its ``index`` in ``items`` and the match.
+        """
+        matches = self.find_duplicates(kind, subject_id, [item_text(kind, item) for item in items])
+        kept = [item for item, match in zip(items, matches) if match is None]
+        skipped = [{'index': n, **match} for n, match in enumerate(matches) if match is not None]
+        return kept, skipped
+
+    @staticmethod
+    def _load_signatures(kind: str, item_ids: List[int]) -> Dict[int, np.ndarray]:
+        from app import db
+        from app.models import MinHashSignature
+
+        loaded = {}
+        for chunk in _chunks(item_ids):
+            for item_id, data in db.session.execute(
+                select(MinHashSignature.item_id, MinHashSignature.signature)
+                .where(MinHashSignature.kind == kind, MinHashSignature.item_id.in_(chunk))
+            ):
+                loaded[item_id] = np.frombuffer(data, dtype=np.uint32)
+        return loaded
+
+    # -- dedupe pass -------------------------------------------------------------
+
+    def dedupe(self, subject_id: int, kinds: Iterable[str] = ('flashcard',), dry_run: bool = True) -> Dict:
+        """Cluster the subject's near-duplicates and remove all but one of each.
+
+        The kept card is the most reviewed one (the oldest on a tie), so
+        review history survives. Questions keep the oldest copy, and a
+        question with recorded answers is never removed.
+        """
+        from app import db
+        from app.models import Flashcard, QuizAttemptAnswer, QuizQuestion
+
+        clusters, removed = [], 0
+        for kind in kinds:
+            groups = self._shared_buckets(subject_id, kind)
+            item_ids = sorted({i for ids in groups for i in ids})
+            sigs = self._load_signatures(kind, item_ids)
+            found = self._clusters(groups, sigs)
+            if not found:
+                continue
+
+            ids = [i for cluster in found for i in cluster]
+            reviews, protected = {}, set()
+            if kind == 'flashcard':
+                model = Flashcard
+                for chunk in _chunks(ids):
+                    reviews.update(db.session.execute(
+                        select(Flashcard.id, Flashcard.times_reviewed).where(Flashcard.id.in_(chunk))
+                    ).all())
+            else:
+                model = QuizQuestion
+                for chunk in _chunks(ids):
+                    protected.update(db.session.execute(
+                        select(QuizAttemptAnswer.question_id)
+                        .where(QuizAttemptAnswer.question_id.in_(chunk)).distinct()
+                    ).scalars().all())
+
+            doomed = []
+            for cluster in found:
+                keep, *rest = sorted(cluster, key=lambda i: (-(reviews.get(i) or 0), i))
+                remove = [i for i in rest if i not in protected]
+                if remove:
+                    clusters.append({'kind': kind, 'keep': keep, 'remove': sorted(remove)})
+                    doomed.extend(remove)
+            if not dry_run:
+                # Through the ORM so search, dashboards and the due queue follow
+                for chunk in _chunks(doomed):
+                    for obj in model.query.filter(model.id.in_(chunk)).all():
+                        db.session.delete(obj)
+                db.session.flush()
+            removed += len(doomed)
+
+        if not dry_run:
+            db.session.commit()
+        return {'subject_id': subject_id, 'dry_run': dry_run, 'clusters': clusters,
+                ('would_remove' if dry_run else 'removed'): removed}
+
+    @staticmethod
+    def _shared_buckets(subject_id: int, kind: str) -> List[List[int]]:
+        """Item ids of every bucket the subject's items share with another item."""
+        from app import db
+        from app.models import MinHashBand
+
+        shared = (
+            select(MinHashBand.bucket)
+            .where(MinHashBand.subject_id == subject_id, MinHashBand.kind == kind)
+            .group_by(MinHashBand.bucket)
+            .having(func.count() > 1)
+        )
+        groups: Dict[int, List[int]] = {}
+        for bucket, item_id in db.session.execute(
+            select(MinHashBand.bucket, MinHashBand.item_id).where(
+                MinHashBand.subject_id == subject_id, MinHashBand.kind == kind, MinHashBand.bucket.in_(shared)
+            )
+        ):
+            groups.setdefault(bucket, []).append(item_id)
+        return list(groups.values())
+
+    @staticmethod
+    def _clusters(groups: List[List[int]], sigs: Dict[int, np.ndarray]) -> List[List[int]]:
+        """Union-find over the bucket-mates whose signatures agree above the threshold."""
+        parent: Dict[int, int] = {}
+
+        def root(i: int) -> int:
+            parent.setdefault(i, i)
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for ids in groups:
+            ids = sorted(i for i in set(ids) if i in sigs)
+            matrix = np.stack([sigs[i] for i in ids])
+            if len(ids) <= MAX_BUCKET_PAIRS:
+                similar = (matrix[:, None, :] == matrix[None, :, :]).mean(axis=2) >= DUPLICATE_THRESHOLD
+                pairs = zip(*np.nonzero(np.triu(similar, 1)))
+            else:
+                pairs = ((0, j) for j in np.flatnonzero((matrix == matrix[0]).mean(axis=1) >= DUPLICATE_THRESHOLD))
+            for a, b in pairs:
+                ra, rb = root(ids[a]), root(ids[b])
+                if ra != rb:
+                    parent[max(ra, rb)] = min(ra, rb)
+
+        clusters: Dict[int, List[int]] = {}
+        for i in list(parent):
+            clusters.setdefault(root(i), []).append(i)
+        return [sorted(members) for members in clusters.values() if len(members) > 1]
+
+    # -- maintenance -------------------------------------------------------------
+
+    def reindex(self) -> int:
+        """Rebuild the whole index from the source tables."""
+        from app import db
+        from app.models import Flashcard, FlashcardSet, MinHashBand, MinHashSignature, Quiz, QuizQuestion
+
+        connection = db.session.connection()
+        connection.execute(delete(MinHashBand.__table__))
+        connection.execute(delete(MinHashSignature.__table__))
+        sources = [
+            ('flashcard', select(Flashcard.id, FlashcardSet.subject_id, Flashcard.flashcard_set_id,
+                                 Flashcard.front, Flashcard.back).join(FlashcardSet)),
+            ('question', select(QuizQuestion.id, Quiz.subject_id, QuizQuestion.quiz_id,
+                                QuizQuestion.question).join(Quiz)),
+        ]
+        total = 0
+        for kind, statement in sources:
+            batch = []
+            for row in db.session.execute(statement.execution_options(yield_per=2000)):
+                batch.append((row[0], row[1], row[2], ' '.join(v or '' for v in row[3:])))
+                if len(batch) >= 2000:
+                    total += self._write(connection, kind, batch, replace=False)
+                    batch = []
+            total += self._write(connection, kind, batch, replace=False)
+        db.session.commit()
+        return total
+
+    @staticmethod
+    def _write(connection, kind: str, items: List[Tuple[int, int, int, str]], replace: bool = True) -> int:
+        """Store signatures and bands of ``(item_id, subject_id, parent_id, text)`` items."""
+        from app.models import MinHashBand, MinHashSignature
+
+        items = [item for item in items if item[1] is not None]
+        if not items:
+            return 0
+        if replace:
+            DedupeService._remove(connection, kind, [item[0] for item in items])
+        sigs = signatures(item[3] for item in items)
+        keys = band_buckets(sigs)
+        _insert_many(connection, MinHashSignature.__table__,
+                     ('kind', 'item_id', 'subject_id', 'parent_id', 'signature'), [
+            (kind, item_id, subject_id, parent_id, sig.tobytes())
+            for (item_id, subject_id, parent_id, _), sig in zip(items, sigs)
+        ])
+        _insert_many(connection, MinHashBand.__table__, ('kind', 'item_id', 'band', 'subject_id', 'bucket'), [
+            (kind, item_id, band, subject_id, bucket)
+            for (item_id, subject_id, _, _), row in zip(items, keys.tolist())
+            for band, bucket in enumerate(row)
+        ])
+        return len(items)
+
+    @staticmethod
+    def _remove(connection, kind: str, item_ids: List[int]) -> None:
+        from app.models import MinHashBand, MinHashSignature
+
+        for table in (MinHashBand.__table__, MinHashSignature.__table__):
+            for chunk in _chunks(item_ids):
+                connection.execute(delete(table).where(table.c.kind == kind, table.c.item_id.in_(chunk)))
+
+    @staticmethod
+    def _indexed_change(obj) -> bool:
+        state = inspect(obj)
+        return any(state.attrs[name].history.has_changes() for name in INDEXED_ATTRIBUTES[type(obj).__name__])
+
+    def _after_flush(self, session, flush_context) -> None:
+        """Apply index changes inside the same transaction as the write."""
+        from app.models import Flashcard, FlashcardSet, MinHashBand, MinHashSignature, Quiz
+
+        changed = [o for o in session.new if type(o).__name__ in KINDS] + [
+            o for o in session.dirty if type(o).__name__ in KINDS and self._indexed_change(o)
+        ]
+        deleted = [o for o in session.deleted if type(o).__name__ in KINDS]
+        deleted_parents = [o for o in session.deleted if type(o).__name__ in PARENTS]
+        moved_parents = [
+            o for o in session.dirty
+            if type(o).__name__ in PARENTS and inspect(o).attrs.subject_id.history.has_changes()
+        ]
+        if not (changed or deleted or deleted_parents or moved_parents):
+            return
+
+        connection = session.connection()
+        # Bands are keyed by item; reach a parent's through its signatures
+        bands, sigs = MinHashBand.__table__, MinHashSignature.__table__
+        for kind in set(KINDS.values()):
+            parent_ids = [o.id for o in deleted_parents if PARENTS[type(o).__name__] == kind]
+            if parent_ids:
+                children = select(sigs.c.item_id).where(sigs.c.kind == kind, sigs.c.parent_id.in_(parent_ids))
+                connection.execute(delete(bands).where(bands.c.kind == kind, bands.c.item_id.in_(children)))
+                connection.execute(delete(sigs).where(sigs.c.kind == kind, sigs.c.parent_id.in_(parent_ids)))
+            self._remove(connection, kind, [o.id for o in deleted if KINDS[type(o).__name__] == kind])
+        for parent in moved_parents:
+            kind = PARENTS[type(parent).__name__]
+            children = select(sigs.c.item_id).where(sigs.c.kind == kind, sigs.c.parent_id == parent.id)
+            connection.execute(
+                update(bands).where(bands.c.kind == kind, bands.c.item_id.in_(children))
+                .values(subject_id=parent.subject_id)
+            )
+            connection.execute(
+                update(sigs).where(sigs.c.kind == kind, sigs.c.parent_id == parent.id)
+                .values(subject_id=parent.subject_id)
+            )
+        if not changed:
+            return
+
+        cards = [o for o in changed if isinstance(o, Flashcard)]
+        questions = [o for o in changed if not isinstance(o, Flashcard)]
+        with session.no_autoflush:
+            if cards:
+                subjects = dict(connection.execute(
+                    select(FlashcardSet.id, FlashcardSet.subject_id)
+                    .where(FlashcardSet.id.in_({o.flashcard_set_id for o in cards}))
+                ).all())
+                self._write(connection, 'flashcard', [
+                    (o.id, subjects.get(o.flashcard_set_id), o.flashcard_set_id, f'{o.front} {o.back}')
+                    for o in cards
+                ])
+            if questions:
+                subjects = dict(connection.execute(
+                    select(Quiz.id, Quiz.subject_id).where(Quiz.id.in_({o.quiz_id for o in questions}))
+                ).all())
+                self._write(connection, 'question', [
+                    (o.id, subjects.get(o.quiz_id), o.quiz_id, o.question)
+                    for o in questions
+                ])
+
+    def _on_rows_inserted(self, model, rows: List[Dict], subject_id: int) -> None:
+        """Index rows written by set-based inserts, which skip flush hooks."""
+        from app import db
+
+        kind = KINDS.get(model.__name__)
+        if kind is None:
+            return
+        parent = 'flashcard_set_id' if kind == 'flashcard' else 'quiz_id'
+        self._write(db.session.connection(), kind, [
+            (row['id'], subject_id, row[parent], item_text(kind, row)) for row in rows
+        ], replace=False)
+
+
+# Singleton instance
+dedupe_service = DedupeService()
@@ -0,0 +1,135 @@
+"""
+Deletion Service - Batched background deletion of large subjects
+"""
+from sqlalchemy import delete, select, update
+from datetime import datetime
+from typing import Dict, Optional
+import threading
+
+
+DELETE_BATCH_SIZE = 1000
+
+
+class DeletionService:
+    """Deletes a subject's materials in short transactions.
+
+    A plain ``DELETE FROM subjects`` cascades through every child row in
+    one statement, holding the write lock until it finishes. Deleting
+    leaf rows in batches first keeps each transaction short, so other
+    requests can write in between. Core DELETEs bypass the flush hooks,
+    so every batch also touches the validators of the subject's
+    remaining parents, recounts its dashboard and retires its cached
+    results.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running: Dict[int, threading.Thread] = {}
+
+    @staticmethod
+    def _batches(subject_id: int):
+        """(model, id-select) pairs in leaf-to-root order."""
+        from app.models import (Lecture, Note, FlashcardSet, Flashcard,
+                                Quiz, QuizQuestion, QuizAttempt, QuizAttemptAnswer)
+
+        set_ids = select(FlashcardSet.id).where(FlashcardSet.subject_id == subject_id)
+        quiz_ids = select(Quiz.id).where(Quiz.subject_id == subject_id)
+        return [
+            (QuizAttemptAnswer, select(QuizAttemptAnswer.id).where(QuizAttemptAnswer.attempt_id.in_(
+                select(QuizAttempt.id).where(QuizAttempt.quiz_id.in_(quiz_ids))
+            ))),
+            (Flashcard, select(Flashcard.id).where(Flashcard.flashcard_set_id.in_(set_ids))),
+            (QuizAttempt, select(QuizAttempt.id).where(QuizAttempt.quiz_id.in_(quiz_ids))),
+            (QuizQuestion, select(QuizQuestion.id).where(QuizQuestion.quiz_id.in_(quiz_ids))),
+            (Note, select(Note.id).where(Note.subject_id == subject_id)),
+            (Lecture, select(Lecture.id).where(Lecture.subject_id == subject_id)),
+            (FlashcardSet, set_ids),
+            (Quiz, quiz_ids),
+        ]
+
+    def delete_subject(self, subject_id: int, batch_size: int = DELETE_BATCH_SIZE) -> int:
+        """Delete a subject and everything under it, committing every batch.
+
+        Returns the number of child rows removed before the subject itself.
+        """
+        from app import db
+        from app.models import Subject
+        from app.services.cache_service import cache_service
+
+        removed = 0
+        for model, ids in self._batches(subject_id):
+            while True:
+                batch = db.session.execute(ids.limit(batch_size)).scalars().all()
+                if not batch:
+                    break
+                db.session.execute(
+                    delete(model).where(model.id.in_(batch)),
+                    execution_options={'synchronize_session': False}
+                )
+                self._invalidate(subject_id)
+                db.session.commit()
+                cache_service.bump([subject_id])
+                removed += len(batch)
+
+        # Through the ORM so flush hooks (search index) see the subject go
+        subject = db.session.get(Subject, subject_id)
+        if subject is not None:
+            db.session.delete(subject)
+            db.session.commit()
+        return removed
+
+    @staticmethod
+    def _invalidate(subject_id: int) -> None:
+        """Touch the ``etag_at`` of the subject, its lectures and sets, and recount its dashboard."""
+        from app import db
+        from app.models import Subject, Lecture, FlashcardSet
+        from app.services.dashboard_service import dashboard_service
+
+        now = datetime.utcnow()
+        for model, condition in ((Subject, Subject.id == subject_id),
+                                 (Lecture, Lecture.subject_id == subject_id),
+                                 (FlashcardSet, FlashcardSet.subject_id == subject_id)):
+            # updated_at is set to itself so its onupdate default does not fire
+            db.session.execute(
+                update(model).where(condition).values(etag_at=now, updated_at=model.updated_at),
+                execution_options={'synchronize_session': False}
+            )
+        dashboard_service.rebuild(db.session.connection(), [subject_id])
+
+    def delete_subject_async(self, app, subject_id: int) -> bool:
+        """Start deleting a subject in a background thread.
+
+        Returns False if a deletion of that subject is already running.
+        """
+        with self._lock:
+            if self.is_deleting(subject_id):
+                return False
+            thread = threading.Thread(
+                target=self._run, args=(app, subject_id),
+                name=f'delete-subject-{subject_id}', daemon=True
+            )
+            self._running[subject_id] = thread
+            thread.start()
+        return True
+
+    def is_deleting(self, subject_id: int) -> bool:
+        thread: Optional[threading.Thread] = self._running.get(subject_id)
+        return thread is not None and thread.is_alive()
+
+    def _run(self, app, subject_id: int) -> None:
+        from app import db
+
+        with app.app_context():
+            try:
+                removed = self.delete_subject(subject_id)
+                print(f"Deleted subject {subject_id} ({removed} rows)")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error deleting subject {subject_id}: {e}")
+            finally:
+                with self._lock:
+                    self._running.pop(subject_id, None)
+
+
+# Singleton instance
+deletion_service = DeletionService()
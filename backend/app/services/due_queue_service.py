@@ -0,0 +1,232 @@
+"""
+Due Queue Service - Index-backed lookups of the flashcards due for review
+"""
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Date, delete, event, exists, insert, inspect, literal, select, true, update
+from sqlalchemy.exc import IntegrityError
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+
+from app.signals import rows_inserted
+
+
+DEFAULT_DUE_LIMIT = 20
+MAX_DUE_LIMIT = 500
+
+
+def _horizon(day: date) -> datetime:
+    """End of ``day``: the queue holds every card due before it."""
+    return datetime.combine(day + timedelta(days=1), time())
+
+
+class DueQueueService:
+    """Finds due cards, optionally from a precomputed daily queue.
+
+    Without the queue, due cards come straight from ``flashcards`` through
+    the ``(flashcard_set_id, next_review)`` and ``(next_review)`` indexes;
+    a subject's are the merge of one limited range scan per set.
+    Never-reviewed cards carry ``NEW_CARD_DUE`` rather than NULL so they
+    stay inside those range scans. With ``DUE_QUEUE`` on, ``due_queue``
+    holds just the cards due by the end of the day, keyed by subject, and
+    is rebuilt once a day and kept current as cards are created, reviewed
+    and deleted.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._listening = False
+        self._built_day: Optional[date] = None
+
+    def init_app(self, app) -> None:
+        """Convert NULL due dates to the sentinel and hook session writes."""
+        from app import db
+        from app.models import Flashcard, FlashcardSet, NEW_CARD_DUE
+        from app.services.dashboard_service import dashboard_service
+
+        self.enabled = bool(app.config.get('DUE_QUEUE'))
+        self._built_day = None
+
+        @app.cli.command('due-queue-rebuild')
+        def rebuild_command():
+            """Rebuild today's precomputed due queue."""
+            print(f"Queued {self.rebuild()} due cards")
+
+        with app.app_context():
+            # Cards created before the sentinel existed
+            with db.engine.begin() as connection:
+                set_ids = connection.execute(
+                    select(Flashcard.flashcard_set_id).where(Flashcard.next_review.is_(None)).distinct()
+                ).scalars().all()
+                if set_ids:
+                    connection.execute(
+                        update(Flashcard.__table__)
+                        .where(Flashcard.__table__.c.next_review.is_(None))
+                        .values(next_review=NEW_CARD_DUE)
+                    )
+                    dashboard_service.rebuild(connection, connection.execute(
+                        select(FlashcardSet.subject_id).where(FlashcardSet.id.in_(set_ids)).distinct()
+                    ).scalars().all())
+
+        if not self._listening:
+            event.listen(Session, 'after_flush', self._after_flush)
+            rows_inserted.connect(self._on_rows_inserted)
+            self._listening = True
+
+    # -- reads ---------------------------------------------------------------
+
+    def due_cards(self, subject_id: Optional[int] = None, set_id: Optional[int] = None,
+                  limit: int = DEFAULT_DUE_LIMIT) -> List:
+        """The ``limit`` most overdue cards, oldest due first."""
+        from app import db
+        from app.models import Flashcard, FlashcardSet
+
+        now = datetime.utcnow()
+        if self.enabled:
+            self.ensure_current()
+            ids = self._queued_ids(subject_id, set_id, now, limit)
+            cards = {c.id: c for c in Flashcard.query.filter(Flashcard.id.in_(ids)).all()} if ids else {}
+            return [cards[i] for i in ids if i in cards]
+
+        query = Flashcard.query.filter(Flashcard.next_review <= now)
+        if set_id:
+            query = query.filter(Flashcard.flashcard_set_id == set_id)
+        if subject_id and not set_id and db.engine.dialect.name == 'postgresql':
+            # Postgres would sort every due card of the subject; take each
+            # set's first ``limit`` from its index range and merge those
+            sets = select(FlashcardSet.id).where(FlashcardSet.subject_id == subject_id).subquery()
+            per_set = (
+                select(Flashcard.id, Flashcard.next_review)
+                .where(Flashcard.flashcard_set_id == sets.c.id, Flashcard.next_review <= now)
+                .order_by(Flashcard.next_review, Flashcard.id)
+                .limit(limit)
+                .lateral()
+            )
+            query = query.filter(Flashcard.id.in_(
+                select(per_set.c.id).select_from(sets).join(per_set, true())
+                .order_by(per_set.c.next_review, per_set.c.id).limit(limit)
+            ))
+        elif subject_id:
+            # SQLite walks the (set, next_review) index once per set and stops
+            # each walk once ``limit`` earlier rows are held: already a merge
+            query = query.filter(Flashcard.flashcard_set_id.in_(
+                select(FlashcardSet.id).where(FlashcardSet.subject_id == subject_id)
+            ))
+        return query.order_by(Flashcard.next_review, Flashcard.id).limit(limit).all()
+
+    @staticmethod
+    def _queued_ids(subject_id: Optional[int], set_id: Optional[int], now: datetime, limit: int) -> List[int]:
+        from app import db
+        from app.models import DueQueueEntry
+
+        query = select(DueQueueEntry.flashcard_id).where(DueQueueEntry.due_at <= now)
+        if set_id:
+            query = query.where(DueQueueEntry.flashcard_set_id == set_id)
+        if subject_id:
+            query = query.where(DueQueueEntry.subject_id == subject_id)
+        return db.session.execute(
+            query.order_by(DueQueueEntry.due_at, DueQueueEntry.flashcard_id).limit(limit)
+        ).scalars().all()
+
+    # -- maintenance -----------------------------------------------------------
+
+    def ensure_current(self) -> None:
+        """Rebuild the queue on the first use of a new day (once per process)."""
+        from app import db
+        from app.models import DueQueueEntry
+
+        today = datetime.utcnow().date()
+        if self._built_day == today:
+            return
+        with db.engine.connect() as connection:
+            stale = connection.execute(select(
+                exists().where(DueQueueEntry.queue_day < today) |
+                ~exists().where(DueQueueEntry.queue_day == today)
+            )).scalar()
+        if stale:
+            self.rebuild(today)
+        self._built_day = today
+
+    def rebuild(self, day: Optional[date] = None) -> int:
+        """Refill the queue with every card due by the end of ``day``."""
+        from app import db
+        from app.models import DueQueueEntry, Flashcard, FlashcardSet
+
+        day = day or datetime.utcnow().date()
+        queue = DueQueueEntry.__table__
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(delete(queue))
+                result = connection.execute(insert(queue).from_select(
+                    ['flashcard_id', 'flashcard_set_id', 'subject_id', 'due_at', 'queue_day'],
+                    select(Flashcard.id, Flashcard.flashcard_set_id, FlashcardSet.subject_id,
+                           Flashcard.next_review, literal(day, Date))
+                    .join(FlashcardSet, FlashcardSet.id == Flashcard.flashcard_set_id)
+                    .where(Flashcard.next_review < _horizon(day))
+                ))
+        except IntegrityError:
+            # Another worker rebuilt it at the same moment
+            return 0
+        self._built_day = day
+        return result.rowcount
+
+    def _enqueue(self, connection, cards: List[Dict], subject_ids: Dict[int, int]) -> None:
+        """Replace the queue entries of these cards with their current due time."""
+        from app.models import DueQueueEntry
+
+        if not cards:
+            return
+        today = datetime.utcnow().date()
+        horizon = _horizon(today)
+        queue = DueQueueEntry.__table__
+        connection.execute(delete(queue).where(queue.c.flashcard_id.in_([c['id'] for c in cards])))
+        rows = [
+            {'flashcard_id': c['id'], 'flashcard_set_id': c['flashcard_set_id'],
+             'subject_id': subject_ids[c['flashcard_set_id']], 'due_at': c['next_review'], 'queue_day': today}
+            for c in cards
+            if c['next_review'] is not None and c['next_review'] < horizon and c['flashcard_set_id'] in subject_ids
+        ]
+        if rows:
+            connection.execute(insert(queue), rows)
+
+    def _after_flush(self, session, flush_context) -> None:
+        from app.models import DueQueueEntry, Flashcard, FlashcardSet
+
+        if not self.enabled:
+            return
+        changed, moved_sets = [o for o in session.new if isinstance(o, Flashcard)], []
+        for obj in session.dirty:
+            if isinstance(obj, Flashcard):
+                state = inspect(obj)
+                if state.attrs.next_review.history.has_changes() or state.attrs.flashcard_set_id.history.has_changes():
+                    changed.append(obj)
+            elif isinstance(obj, FlashcardSet) and inspect(obj).attrs.subject_id.history.has_changes():
+                moved_sets.append(obj)
+        if not (changed or moved_sets):
+            return
+
+        connection = session.connection()
+        queue = DueQueueEntry.__table__
+        for card_set in moved_sets:
+            connection.execute(
+                update(queue).where(queue.c.flashcard_set_id == card_set.id).values(subject_id=card_set.subject_id)
+            )
+        if not changed:
+            return
+        set_ids = {o.flashcard_set_id for o in changed}
+        subject_ids = dict(connection.execute(
+            select(FlashcardSet.id, FlashcardSet.subject_id).where(FlashcardSet.id.in_(set_ids))
+        ).all())
+        self._enqueue(connection, [
+            {'id': o.id, 'flashcard_set_id': o.flashcard_set_id, 'next_review': o.next_review} for o in changed
+        ], subject_ids)
+
+    def _on_rows_inserted(self, model, rows: List[Dict], subject_id: int) -> None:
+        from app import db
+
+        if not self.enabled or model.__name__ != 'Flashcard':
+            return
+        self._enqueue(db.session.connection(), rows, {row['flashcard_set_id']: subject_id for row in rows})
+
+
+# Singleton instance
+due_queue_service = DueQueueService()
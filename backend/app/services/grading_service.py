@@ -0,0 +1,432 @@
+"""
+Grading Service - Precompiled answer keys and batch grading for quizzes
+"""
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+import hashlib
+import re
+import threading
+import unicodedata
+
+
+MAX_CACHED_QUIZZES = 512
+MAX_SUBMISSIONS = 1000
+MAX_LEARNER_LENGTH = 100
+# Short answers are compared word by word. Words of TYPO_MIN_LENGTH letters
+# tolerate one typo (MAX_TYPOS from LONG_WORD letters), but never in their
+# first EXACT_PREFIX letters, so "hypotonic" is not taken for "hypertonic" or
+# "endothermic" for "exothermic"; words containing digits must match exactly
+TYPO_MIN_LENGTH = 5
+LONG_WORD = 12
+MAX_TYPOS = 2
+EXACT_PREFIX = 4
+# Short answers sent to the language model per call in semantic mode
+SEMANTIC_BATCH_SIZE = 50
+
+TRUE_WORDS = frozenset({'true', 't', 'yes', 'y', '1', 'correct', 'right'})
+FALSE_WORDS = frozenset({'false', 'f', 'no', 'n', '0', 'incorrect', 'wrong'})
+# Dropped from short answers so "the mitochondria" matches "mitochondria"
+STOPWORDS = frozenset({'a', 'an', 'the'})
+
+_NON_WORD = re.compile(r'[^\w]+')
+# "B", "b)", "(b)", "2." or "B: text" style references to an option
+_OPTION_REFERENCE = re.compile(r'^\(?([a-z]|\d{1,2})(?:[).:\]]\s+(.+)|[).:\]]?\s*)$', re.DOTALL)
+
+
+def normalize(text: str) -> str:
+    """Casefolded words without accents, punctuation or articles."""
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(word for word in _NON_WORD.sub(' ', text.casefold()).split() if word not in STOPWORDS)
+
+
+def _boolean(text: str) -> Optional[bool]:
+    word = normalize(text)
+    if word in TRUE_WORDS:
+        return True
+    if word in FALSE_WORDS:
+        return False
+    return None
+
+
+def _option_reference(text: str) -> Tuple[Optional[str], str]:
+    """Split ``"b) Paris"`` into ``('b', 'paris')``; ``(None, text)`` if there is no prefix."""
+    match = _OPTION_REFERENCE.match(text.strip().casefold())
+    if not match:
+        return None, normalize(text)
+    return match.group(1), normalize(match.group(2) or '')
+
+
+def within_distance(a: str, b: str, limit: int) -> bool:
+    """Whether the edit distance (adjacent swaps count as one edit) is at most ``limit``.
+
+    Only the diagonal band of width ``2 * limit + 1`` can stay within the
+    limit, so cells outside it are never computed, and the scan stops as
+    soon as a whole row exceeds the limit.
+    """
+    if a == b:
+        return True
+    if not limit or abs(len(a) - len(b)) > limit:
+        return False
+    over = limit + 1
+    before, previous = None, [j if j <= limit else over for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        current = [i if i <= limit else over] + [over] * len(b)
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cb = b[j - 1]
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if before is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+        if min(current) > limit:
+            return False
+        before, previous = previous, current
+    return previous[-1] <= limit
+
+
+def _typos_allowed(word: str) -> int:
+    if len(word) < TYPO_MIN_LENGTH or any(c.isdigit() for c in word):
+        return 0
+    return MAX_TYPOS if len(word) >= LONG_WORD else 1
+
+
+def _display(value: Any) -> Optional[str]:
+    """A submitted answer as stored text; None when it was left blank."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        value = 'true' if value else 'false'
+    value = str(value)
+    return value if value.strip() else None
+
+
+class AnswerKey:
+    """One question's correct answer, normalized once for fast matching."""
+
+    __slots__ = ('question_id', 'question', 'question_type', 'correct_answer', 'explanation', 'points',
+                 'accepted', 'boolean', 'text', 'words', 'free_text')
+
+    def __init__(self, question_id: int, question: str, question_type: str, options: Optional[List],
+                 correct_answer: str, explanation: Optional[str], points: Optional[int]):
+        self.question_id = question_id
+        self.question = question
+        self.question_type = question_type
+        self.correct_answer = correct_answer
+        self.explanation = explanation
+        self.points = points or 0
+        self.accepted: FrozenSet[str] = frozenset()
+        self.boolean = _boolean(correct_answer) if question_type == 'true_false' else None
+
+        if question_type == 'multiple_choice' and options:
+            self.accepted = self._option_aliases([str(o) for o in options], correct_answer)
+        self.text = normalize(correct_answer)
+        self.words = tuple((word, _typos_allowed(word)) for word in self.text.split())
+        # Only these may be handed to the language model in semantic mode
+        self.free_text = not self.accepted and self.boolean is None and question_type == 'short_answer'
+
+    @staticmethod
+    def _option_aliases(options: List[str], correct_answer: str) -> FrozenSet[str]:
+        """Letter, 1-based number and text of the correct option, minus any other option's text."""
+        # An option that is just "3" or "b" is its own text, not a reference
+        texts = [_option_reference(option)[1] or normalize(option) for option in options]
+        letter, text = _option_reference(correct_answer)
+        index = None
+        if normalize(correct_answer) in texts:
+            index = texts.index(normalize(correct_answer))
+        elif text and text in texts:
+            index = texts.index(text)
+        elif letter and not text:
+            position = ord(letter) - ord('a') if letter.isalpha() else int(letter) - 1
+            index = position if 0 <= position < len(options) else None
+        if index is None:
+            return frozenset()
+        aliases = {chr(ord('a') + index), str(index + 1), texts[index], normalize(options[index])}
+        others = {t for n, t in enumerate(texts) if n != index}
+        return frozenset(aliases - others)
+
+    def matches(self, answer: str) -> bool:
+        if self.accepted:
+            if normalize(answer) in self.accepted:
+                return True
+            letter, text = _option_reference(answer)
+            # "b) Paris" is judged by its text, a bare "b" by its letter
+            return (text or letter) in self.accepted
+        if self.boolean is not None:
+            return _boolean(answer) is self.boolean
+        answer = normalize(answer)
+        if answer == self.text:
+            return True
+        words = answer.split()
+        return len(words) == len(self.words) and all(
+            word == key or (typos and word[:EXACT_PREFIX] == key[:EXACT_PREFIX] and within_distance(word, key, typos))
+            for word, (key, typos) in zip(words, self.words)
+        )
+
+
+class GradingService:
+    """Grades quiz submissions against cached, precompiled answer keys.
+
+    A quiz's keys are compiled on first use and kept (LRU) under the
+    sequence number of its latest change-log entry, which every question
+    insert, edit and delete advances. Reading that one indexed row per
+    grading call keeps the cache correct across workers. Semantic mode
+    adds one language-model pass over the short answers still marked
+    wrong (see ``grade_semantically``).
+    """
+
+    def __init__(self):
+        self._keys: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def semantic_enabled(requested: Any = None) -> bool:
+        """The SEMANTIC_GRADING setting, unless a request's ``"semantic": false`` turns it off.
+
+        A request can never turn on paid language-model calls by itself.
+        """
+        from flask import current_app
+
+        return bool(current_app.config.get('SEMANTIC_GRADING')) and requested is not False
+
+    def answer_keys(self, quiz_id: int) -> List[AnswerKey]:
+        """The quiz's answer keys in question order, compiled at most once per version."""
+        from app.services.sync_service import sync_service
+
+        version = sync_service.version('quiz', quiz_id)
+        with self._lock:
+            cached = self._keys.get(quiz_id)
+            if cached is not None and version is not None and cached[0] == version:
+                self._keys.move_to_end(quiz_id)
+                return cached[1]
+
+        keys = self._compile(quiz_id)
+        if version is not None:
+            with self._lock:
+                self._keys[quiz_id] = (version, keys)
+                self._keys.move_to_end(quiz_id)
+                while len(self._keys) > MAX_CACHED_QUIZZES:
+                    self._keys.popitem(last=False)
+        return keys
+
+    @staticmethod
+    def _compile(quiz_id: int) -> List[AnswerKey]:
+        from app import db
+        from app.models import QuizQuestion
+
+        rows = db.session.execute(
+            select(QuizQuestion.id, QuizQuestion.question, QuizQuestion.question_type, QuizQuestion.options,
+                   QuizQuestion.correct_answer, QuizQuestion.explanation, QuizQuestion.points)
+            .where(QuizQuestion.quiz_id == quiz_id)
+            .order_by(QuizQuestion.id)
+        ).all()
+        return [AnswerKey(*row) for row in rows]
+
+    def grade(self, quiz_id: int, answers: Dict, keys: Optional[List[AnswerKey]] = None,
+              semantic: bool = False) -> Dict:
+        """Score one submission, ``answers`` being ``{question_id: answer}``.
+
+        Returns ``score``, ``total_points`` and per-question ``results``
+        (key, stored answer text, correctness and points); with ``semantic``
+        also a ``semantic`` summary of the language-model pass.
+        """
+        keys = self.answer_keys(quiz_id) if keys is None else keys
+        score = total_points = 0
+        results = []
+        for key in keys:
+            answer = _display(answers.get(str(key.question_id)))
+            is_correct = answer is not None and key.matches(answer)
+            points = key.points if is_correct else 0
+            score += points
+            total_points += key.points
+            results.append((key, answer, is_correct, points))
+        graded = {'score': score, 'total_points': total_points, 'results': results}
+        if semantic:
+            graded['semantic'] = self.grade_semantically([graded])
+        return graded
+
+    def grade_many(self, quiz, submissions: List[Dict], record: bool = True, semantic: bool = False) -> Dict:
+        """Grade many submissions against one compiled key, optionally saving each as an attempt.
+
+        Attempts and their per-question answers are written with two
+        set-based INSERTs; the caller commits. Returns the graded
+        ``submissions`` and the ``semantic`` summary (None unless asked for).
+        """
+        from app.models import QuizAttempt, QuizAttemptAnswer
+        from app.services.bulk_service import bulk_service
+
+        keys = self.answer_keys(quiz.id)
+        graded = [self.grade(quiz.id, submission['answers'], keys) for submission in submissions]
+        # One pass for the whole batch, so answers repeated across students go upstream once
+        summary = self.grade_semantically(graded) if semantic else None
+        attempt_ids = [None] * len(graded)
+
+        if record and keys:
+            now = datetime.utcnow()
+            attempts = bulk_service.insert_rows(QuizAttempt, [
+                {'quiz_id': quiz.id, 'score': g['score'], 'total_points': g['total_points'],
+                 'time_taken_seconds': s.get('time_taken_seconds'), 'answers': s['answers'],
+                 'learner': self.learner(s), 'completed_at': now}
+                for g, s in zip(graded, submissions)
+            ], quiz.subject_id)
+            attempt_ids = [row['id'] for row in attempts]
+            times = [self.question_times(s) for s in submissions]
+            bulk_service.insert_rows(QuizAttemptAnswer, [
+                {'attempt_id': attempt_id, 'question_id': key.question_id, 'answer': answer,
+                 'is_correct': is_correct, 'points_awarded': points,
+                 'time_seconds': submission_times.get(str(key.question_id))}
+                for attempt_id, g, submission_times in zip(attempt_ids, graded, times)
+                for key, answer, is_correct, points in g['results']
+            ], quiz.subject_id)
+
+        return {'submissions': [
+            {
+                'attempt_id': attempt_id,
+                'score': g['score'],
+                'total_points': g['total_points'],
+                'percentage': round(g['score'] / g['total_points'] * 100, 1) if g['total_points'] > 0 else 0,
+                'results': [
+                    {'question_id': key.question_id, 'user_answer': answer, 'is_correct': is_correct,
+                     'points': points}
+                    for key, answer, is_correct, points in g['results']
+                ],
+            }
+            for attempt_id, g in zip(attempt_ids, graded)
+        ], 'semantic': summary}
+
+    def grade_semantically(self, graded: List[Dict]) -> Dict:
+        """Let the language model judge short answers the local rules marked wrong.
+
+        Verdicts are kept in ``semantic_grades`` per question and
+        normalized answer, so an answer is only ever sent upstream once.
+        The rest go out per submission, SEMANTIC_BATCH_SIZE per call (one
+        call for a typical submission), so students never share a prompt.
+        Results in ``graded`` are updated in place. If the model is
+        unreachable or its reply does not grade every answer, nothing from
+        that call is kept: those answers stay wrong and the summary carries
+        the error.
+        """
+        from app import db
+        from app.models import SemanticGrade
+        from app.services.ai_service import ai_service
+
+        # (question id, digest) -> where the answer occurs, and one copy to send
+        occurrences: Dict[Tuple[int, str], List[Tuple[Dict, int]]] = {}
+        samples: Dict[Tuple[int, str], Tuple[AnswerKey, str]] = {}
+        for g in graded:
+            for n, (key, answer, is_correct, _) in enumerate(g['results']):
+                if is_correct or answer is None or not key.free_text:
+                    continue
+                digest = hashlib.sha1(f'{key.text}\0{normalize(answer)}'.encode()).hexdigest()
+                occurrences.setdefault((key.question_id, digest), []).append((g, n))
+                samples.setdefault((key.question_id, digest), (key, answer))
+
+        summary = {'answers': sum(len(o) for o in occurrences.values()), 'cached': 0, 'graded': 0,
+                   'accepted': 0, 'error': None}
+        if not occurrences:
+            return summary
+
+        verdicts = {
+            (question_id, digest): is_correct
+            for question_id, digest, is_correct in db.session.execute(
+                select(SemanticGrade.question_id, SemanticGrade.digest, SemanticGrade.is_correct).where(
+                    SemanticGrade.question_id.in_({q for q, _ in occurrences}),
+                    SemanticGrade.digest.in_({d for _, d in occurrences})
+                )
+            )
+            if (question_id, digest) in occurrences
+        }
+        summary['cached'] = len(verdicts)
+
+        # An answer repeated across the batch goes with the first submission that gave it
+        misses: Dict[int, List[Tuple[int, str]]] = {}
+        for item, places in occurrences.items():
+            if item not in verdicts:
+                misses.setdefault(id(places[0][0]), []).append(item)
+        chunks = [
+            items[start:start + SEMANTIC_BATCH_SIZE]
+            for items in misses.values() for start in range(0, len(items), SEMANTIC_BATCH_SIZE)
+        ]
+        fresh = {}
+        for chunk in chunks:
+            items = [
+                {'id': n, 'question': samples[item][0].question, 'reference': samples[item][0].correct_answer,
+                 'answer': samples[item][1]}
+                for n, item in enumerate(chunk)
+            ]
+            try:
+                grades = ai_service.grade_short_answers(items)
+            except Exception as e:
+                summary['error'] = str(e)
+                break
+            fresh.update((item, grades[n]) for n, item in enumerate(chunk))
+
+        if fresh:
+            connection = db.session.connection()
+            insert = postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert
+            now = datetime.utcnow()
+            # Another worker may have judged the same answer meanwhile
+            connection.execute(insert(SemanticGrade.__table__).on_conflict_do_nothing(), [
+                {'question_id': question_id, 'digest': digest, 'is_correct': is_correct, 'created_at': now}
+                for (question_id, digest), is_correct in fresh.items()
+            ])
+            verdicts.update(fresh)
+        summary['graded'] = len(fresh)
+
+        for item, is_correct in verdicts.items():
+            if not is_correct:
+                continue
+            for g, n in occurrences[item]:
+                key, answer, _, _ = g['results'][n]
+                g['results'][n] = (key, answer, True, key.points)
+                g['score'] += key.points
+                summary['accepted'] += 1
+        return summary
+
+    @staticmethod
+    def validate_submissions(submissions) -> List[Dict]:
+        """Check a batch payload; raise ValueError for an unusable one."""
+        if not isinstance(submissions, list) or not submissions:
+            raise ValueError('submissions must be a non-empty array')
+        if len(submissions) > MAX_SUBMISSIONS:
+            raise ValueError(f'At most {MAX_SUBMISSIONS} submissions per request')
+        for n, submission in enumerate(submissions):
+            if not isinstance(submission, dict) or not isinstance(submission.get('answers'), dict):
+                raise ValueError(f'Submission {n} needs an answers object')
+            time_taken = submission.get('time_taken_seconds')
+            if time_taken is not None and (not isinstance(time_taken, int) or isinstance(time_taken, bool)
+                                           or time_taken < 0):
+                raise ValueError(f'Submission {n}: time_taken_seconds must be a non-negative integer')
+            try:
+                GradingService.question_times(submission)
+                GradingService.learner(submission)
+            except ValueError as e:
+                raise ValueError(f'Submission {n}: {e}')
+        return submissions
+
+    @staticmethod
+    def question_times(submission: Dict) -> Dict[str, int]:
+        """Optional ``question_times`` (``{question_id: seconds}``) of a submission."""
+        times = submission.get('question_times') or {}
+        if not isinstance(times, dict) or not all(
+            isinstance(t, (int, float)) and not isinstance(t, bool) and t >= 0 for t in times.values()
+        ):
+            raise ValueError('question_times must map question ids to non-negative seconds')
+        return {str(question_id): round(t) for question_id, t in times.items()}
+
+    @staticmethod
+    def learner(submission: Dict) -> Optional[str]:
+        """Optional ``learner`` of a submission, the client's id for who answered."""
+        learner = submission.get('learner')
+        if learner is None:
+            return None
+        if not isinstance(learner, str) or not learner.strip() or len(learner.strip()) > MAX_LEARNER_LENGTH:
+            raise ValueError(f'learner must be a non-empty string of at most {MAX_LEARNER_LENGTH} characters')
+        return learner.strip()
+
+
+# Singleton instance
+grading_service = GradingService()
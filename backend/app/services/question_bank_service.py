@@ -0,0 +1,318 @@
+"""
+Question Bank Service - Adaptive practice quizzes assembled from a subject's existing questions
+"""
+from sqlalchemy import select
+from math import ceil, exp
+from typing import Any, Dict, List, Optional, Tuple
+import heapq
+import random
+
+
+DEFAULT_QUESTIONS = 10
+MAX_QUESTIONS = 50
+# Selection follows the learner's last RECENT_ATTEMPTS attempts in the subject
+RECENT_ATTEMPTS = 50
+# Up to this share of a quiz re-asks questions the learner last got wrong
+MISSED_SHARE = 0.4
+# Difficulty is the share of wrong answers to a question. Without an
+# explicit level the quiz aims at the learner's own recent error rate
+DIFFICULTY_TARGETS = {'easy': 0.15, 'medium': 0.35, 'hard': 0.6}
+DEFAULT_TARGET = 0.3
+MIN_TARGET = 0.1
+MAX_TARGET = 0.7
+DIFFICULTY_SPREAD = 0.15
+# Sampling weight of questions nobody has answered yet, and the factor
+# for ones the learner answered correctly in their recent attempts
+UNRATED_WEIGHT = 0.5
+RECENTLY_CORRECT_WEIGHT = 0.2
+# Generated top-ups are kept in one quiz per subject
+BANK_QUIZ_TITLE = 'Question bank'
+MAX_TOP_UP_CONTENT = 12000
+
+
+class QuestionBankService:
+    """Assembles practice quizzes from the questions a subject already has.
+
+    Candidates come from ``question_stats`` through its (subject, type,
+    difficulty) index, and the learner's recent answers from their last
+    attempts, so a quiz is a few indexed reads instead of a language-model
+    call. The language model is only asked for the questions the bank is
+    short of, and those join the bank for next time.
+    """
+
+    def assemble(self, subject, count: Any = DEFAULT_QUESTIONS, question_types: Any = None,
+                 difficulty: Any = None, learner: Optional[str] = None, exclude: Any = None,
+                 top_up: bool = True, source: Optional[Dict] = None) -> Dict:
+        """Pick ``count`` questions for a learner, topping the bank up if it runs short.
+
+        Recent misses come first (up to MISSED_SHARE of the quiz); the
+        rest are drawn at random, weighted towards questions whose
+        difficulty is near the target and away from ones the learner just
+        got right. ``source`` (``note_id``, ``lecture_id`` or ``content``)
+        is what top-up questions are generated from, by default the
+        subject's latest notes. The caller commits.
+        """
+        from app import db
+        from app.models import QuizQuestion, QuestionStats
+
+        count, question_types, exclude = self._validate(count, question_types, difficulty, exclude)
+
+        statement = select(QuestionStats.question_id, QuestionStats.difficulty).where(
+            QuestionStats.subject_id == subject.id
+        )
+        if question_types:
+            statement = statement.where(QuestionStats.question_type.in_(question_types))
+        bank = {question_id: rate for question_id, rate in db.session.execute(statement) if question_id not in exclude}
+
+        latest, error_rate = self._history(subject.id, learner)
+        if difficulty:
+            target = DIFFICULTY_TARGETS[difficulty]
+        elif error_rate is not None:
+            target = min(max(error_rate, MIN_TARGET), MAX_TARGET)
+        else:
+            target = DEFAULT_TARGET
+
+        # Newest misses first
+        missed = [q for q, correct in reversed(latest.items()) if not correct and q in bank]
+        chosen = {q: 'missed' for q in missed[:ceil(count * MISSED_SHARE)]}
+
+        def weight(question_id: int) -> float:
+            rate = bank[question_id]
+            w = UNRATED_WEIGHT if rate is None else exp(-((rate - target) / DIFFICULTY_SPREAD) ** 2 / 2)
+            if latest.get(question_id):
+                w *= RECENTLY_CORRECT_WEIGHT
+            return max(w, 1e-9)
+
+        # Weighted sampling without replacement (Efraimidis-Spirakis keys)
+        rest = [q for q in bank if q not in chosen]
+        for question_id in heapq.nlargest(count - len(chosen), rest,
+                                          key=lambda q: random.random() ** (1 / weight(q))):
+            chosen[question_id] = 'bank'
+
+        generated, top_up_error = [], None
+        if top_up and len(chosen) < count:
+            try:
+                generated = self._top_up(subject, count - len(chosen), question_types, source or {})
+            except ValueError:
+                raise
+            except Exception as e:
+                top_up_error = str(e)
+        if not chosen and not generated:
+            if top_up_error:
+                raise Exception(f'Failed to top up the question bank: {top_up_error}')
+            raise ValueError('The subject has no matching questions')
+
+        questions = [
+            {**question.to_dict(), 'reason': chosen[question.id]}
+            for question in QuizQuestion.query.filter(QuizQuestion.id.in_(list(chosen)))
+        ] + [{**question, 'reason': 'generated'} for question in generated]
+        random.shuffle(questions)
+
+        return {
+            'subject_id': subject.id,
+            'learner': learner,
+            'target_difficulty': round(target, 2),
+            'bank_size': len(bank),
+            'questions': questions,
+            'sources': {
+                'missed': sum(1 for reason in chosen.values() if reason == 'missed'),
+                'bank': sum(1 for reason in chosen.values() if reason == 'bank'),
+                'generated': len(generated),
+            },
+            'top_up_error': top_up_error,
+        }
+
+    @staticmethod
+    def _validate(count: Any, question_types: Any, difficulty: Any, exclude: Any) -> Tuple[int, List[str], set]:
+        if not isinstance(count, int) or isinstance(count, bool) or not 1 <= count <= MAX_QUESTIONS:
+            raise ValueError(f'num_questions must be an integer from 1 to {MAX_QUESTIONS}')
+        if question_types is not None and (
+            not isinstance(question_types, list) or not all(isinstance(t, str) and t for t in question_types)
+        ):
+            raise ValueError('question_types must be an array of question types')
+        if difficulty is not None and difficulty not in DIFFICULTY_TARGETS:
+            raise ValueError(f"difficulty must be one of: {', '.join(DIFFICULTY_TARGETS)}")
+        if exclude is not None and (
+            not isinstance(exclude, list) or not all(isinstance(q, int) and not isinstance(q, bool) for q in exclude)
+        ):
+            raise ValueError('exclude_question_ids must be an array of question ids')
+        return count, question_types or [], set(exclude or ())
+
+    @staticmethod
+    def _history(subject_id: int, learner: Optional[str]) -> Tuple[Dict[int, bool], Optional[float]]:
+        """Whether each recently answered question was last answered correctly, and the error rate.
+
+        Without a ``learner`` every recent attempt in the subject counts.
+        """
+        from app import db
+        from app.models import Quiz, QuizAttempt, QuizAttemptAnswer
+
+        recent = (
+            select(QuizAttempt.id, QuizAttempt.completed_at)
+            .join(Quiz, Quiz.id == QuizAttempt.quiz_id)
+            .where(Quiz.subject_id == subject_id)
+        )
+        if learner is not None:
+            recent = recent.where(QuizAttempt.learner == learner)
+        recent = (
+            recent.order_by(QuizAttempt.completed_at.desc(), QuizAttempt.id.desc())
+            .limit(RECENT_ATTEMPTS)
+            .subquery()
+        )
+
+        latest: Dict[int, bool] = {}
+        answers = wrong = 0
+        for question_id, is_correct in db.session.execute(
+            select(QuizAttemptAnswer.question_id, QuizAttemptAnswer.is_correct)
+            .join(recent, recent.c.id == QuizAttemptAnswer.attempt_id)
+            .order_by(recent.c.completed_at, recent.c.id)
+        ):
+            # Re-inserted so iteration order is by latest answer
+            latest.pop(question_id, None)
+            latest[question_id] = bool(is_correct)
+            answers += 1
+            wrong += not is_correct
+        return latest, (wrong / answers if answers else None)
+
+    @staticmethod
+    def _top_up(subject, count: int, question_types: List[str], source: Dict) -> List[Dict]:
+        """Generate ``count`` new questions into the subject's bank quiz; returns those kept."""
+        from app import db
+        from app.models import Lecture, Note, Quiz
+        from app.services.ai_service import ai_service
+        from app.services.bulk_service import bulk_service
+        from app.services.dedupe_service import dedupe_service
+
+        if source.get('note_id'):
+            note = Note.query.filter_by(id=source['note_id'], subject_id=subject.id).first()
+            if note is None:
+                raise ValueError('Note not found in this subject')
+            content = note.content
+        elif source.get('lecture_id'):
+            lecture = Lecture.query.filter_by(id=source['lecture_id'], subject_id=subject.id).first()
+            if lecture is None:
+                raise ValueError('Lecture not found in this subject')
+            content = lecture.transcription or lecture.summary
+        elif source.get('content'):
+            content = source['content']
+        else:
+            notes = db.session.execute(
+                select(Note.content).where(Note.subject_id == subject.id).order_by(Note.updated_at.desc()).limit(20)
+            ).scalars()
+            content = '\n\n'.join(n for n in notes if n)
+        content = (content or '')[:MAX_TOP_UP_CONTENT]
+        if not content.strip():
+            raise Exception('No content available to generate questions from')
+
+        generated = ai_service.generate_quiz_questions(content, count, question_types or None)
+        generated = [
+            q for q in generated
+            if isinstance(q, dict) and isinstance(q.get('question'), str) and q['question'].strip()
+            and isinstance(q.get('correct_answer'), str) and q['correct_answer'].strip()
+        ][:count]
+        generated, _ = dedupe_service.filter_new('question', subject.id, generated)
+        if not generated:
+            return []
+
+        quiz = Quiz.query.filter_by(subject_id=subject.id, title=BANK_QUIZ_TITLE).order_by(Quiz.id).first()
+        if quiz is None:
+            quiz = Quiz(title=BANK_QUIZ_TITLE, description='Questions generated to top up practice quizzes',
+                        subject_id=subject.id)
+            db.session.add(quiz)
+            db.session.flush()
+        return bulk_service.insert_questions(quiz, [{**q, 'points': 1} for q in generated])
+
+    def submit(self, data: Dict) -> Dict:
+        """Grade answers to an assembled quiz, saving one attempt per quiz the questions came from.
+
+        Each attempt covers only the questions asked from that quiz, with
+        ``time_taken_seconds`` split by question count. The caller commits.
+        """
+        from app import db
+        from app.models import QuizAttempt, QuizAttemptAnswer, QuizQuestion
+        from app.services.grading_service import grading_service
+
+        answers = data.get('answers')
+        if not isinstance(answers, dict) or not answers:
+            raise ValueError('Answers are required')
+        question_ids = data.get('question_ids', [int(q) for q in answers if str(q).isdigit()])
+        if not isinstance(question_ids, list) or not question_ids or not all(
+            isinstance(q, int) and not isinstance(q, bool) for q in question_ids
+        ):
+            raise ValueError('question_ids must be a non-empty array of question ids')
+        question_ids = list(dict.fromkeys(question_ids))
+        if len(question_ids) > MAX_QUESTIONS:
+            raise ValueError(f'At most {MAX_QUESTIONS} questions per practice quiz')
+        time_taken = data.get('time_taken_seconds')
+        if time_taken is not None and (not isinstance(time_taken, int) or isinstance(time_taken, bool)
+                                       or time_taken < 0):
+            raise ValueError('time_taken_seconds must be a non-negative integer')
+        question_times = grading_service.question_times(data)
+        learner = grading_service.learner(data)
+
+        quizzes: Dict[int, set] = {}
+        for question_id, quiz_id in db.session.execute(
+            select(QuizQuestion.id, QuizQuestion.quiz_id).where(QuizQuestion.id.in_(question_ids))
+        ):
+            quizzes.setdefault(quiz_id, set()).add(question_id)
+        found = set().union(*quizzes.values())
+        unknown = [q for q in question_ids if q not in found]
+        if unknown:
+            raise ValueError(f'Unknown question ids: {unknown}')
+
+        graded = {
+            quiz_id: grading_service.grade(quiz_id, answers, keys=[
+                key for key in grading_service.answer_keys(quiz_id) if key.question_id in asked
+            ])
+            for quiz_id, asked in quizzes.items()
+        }
+        semantic = grading_service.semantic_enabled(data.get('semantic'))
+        summary = grading_service.grade_semantically(list(graded.values())) if semantic else None
+
+        attempts = []
+        results = {}
+        for quiz_id, g in graded.items():
+            attempt = QuizAttempt(
+                quiz_id=quiz_id,
+                score=g['score'],
+                total_points=g['total_points'],
+                time_taken_seconds=(round(time_taken * len(quizzes[quiz_id]) / len(question_ids))
+                                    if time_taken is not None else None),
+                answers={str(q): answers[str(q)] for q in quizzes[quiz_id] if str(q) in answers},
+                learner=learner
+            )
+            attempt.question_answers = [
+                QuizAttemptAnswer(question_id=key.question_id, answer=answer, is_correct=is_correct,
+                                  points_awarded=points, time_seconds=question_times.get(str(key.question_id)))
+                for key, answer, is_correct, points in g['results']
+            ]
+            attempts.append(attempt)
+            for key, answer, is_correct, points in g['results']:
+                results[key.question_id] = {
+                    'question_id': key.question_id,
+                    'quiz_id': quiz_id,
+                    'question': key.question,
+                    'user_answer': answer,
+                    'correct_answer': key.correct_answer,
+                    'is_correct': is_correct,
+                    'explanation': key.explanation,
+                    'points': points
+                }
+        db.session.add_all(attempts)
+        db.session.flush()
+
+        score = sum(g['score'] for g in graded.values())
+        total_points = sum(g['total_points'] for g in graded.values())
+        return {
+            'score': score,
+            'total_points': total_points,
+            'percentage': round(score / total_points * 100, 1) if total_points > 0 else 0,
+            'learner': learner,
+            'attempts': [attempt.to_dict() for attempt in attempts],
+            'results': [results[q] for q in question_ids],
+            'semantic_grading': summary,
+        }
+
+
+# Singleton instance
+question_bank_service = QuestionBankService()
@@ -0,0 +1,329 @@
+"""
+Question Stats Service - Per-question difficulty and discrimination maintained on write
+"""
+from flask_sqlalchemy.session import Session
+from sqlalchemy import case, delete, event, func, insert, inspect, select, update
+from math import sqrt
+from typing import Dict, Iterable, List, Optional
+
+from app.signals import rows_inserted
+from app.utils.database import upsert
+
+
+# Discrimination is left out until this many answers (both right and wrong) exist
+MIN_DISCRIMINATION_ANSWERS = 5
+SORTS = ('correct_rate', 'discrimination')
+
+
+class QuestionStatsService:
+    """Keeps ``question_stats`` current and derives per-question metrics from it.
+
+    Every saved answer adds to its question's counters in the same
+    transaction (one grouped lookup of the attempts involved, one
+    upsert), so reading a quiz's or subject's statistics touches one row
+    per question instead of every attempt. A rebuild computes the same
+    sums with one grouped query over the stored answers.
+
+    Questions get their row (subject, type, no answers yet) when they are
+    created, which keeps the table usable as the question bank's index.
+    """
+
+    def __init__(self):
+        self._listening = False
+
+    def init_app(self, app) -> None:
+        """Hook question and answer writes; backfill questions the table does not cover yet."""
+        from app import db
+        from app.models import Subject, QuestionStats, QuizQuestion
+
+        @app.cli.command('question-stats-rebuild')
+        def rebuild_command():
+            """Recompute every question's statistics from the stored answers."""
+            with db.engine.begin() as connection:
+                subject_ids = connection.execute(select(Subject.id)).scalars().all()
+                self.rebuild(connection, subject_ids)
+            print(f"Rebuilt question statistics for {len(subject_ids)} subjects")
+
+        with app.app_context():
+            with db.engine.begin() as connection:
+                unindexed = connection.execute(
+                    select(QuizQuestion.id)
+                    .outerjoin(QuestionStats, QuestionStats.question_id == QuizQuestion.id)
+                    .where(QuestionStats.subject_id.is_(None))
+                    .limit(1)
+                ).first()
+                if unindexed is not None:
+                    self.rebuild(connection, connection.execute(select(Subject.id)).scalars().all())
+
+        if not self._listening:
+            event.listen(Session, 'after_flush', self._after_flush)
+            rows_inserted.connect(self._on_rows_inserted)
+            self._listening = True
+
+    # -- reads ---------------------------------------------------------------
+
+    def quiz_stats(self, quiz_id: int, sort: Optional[str] = None) -> List[Dict]:
+        from app.models import QuizQuestion
+
+        return self._read(QuizQuestion.quiz_id == quiz_id, sort)
+
+    def subject_stats(self, subject_id: int, sort: Optional[str] = None) -> List[Dict]:
+        from app.models import Quiz, QuizQuestion
+
+        return self._read(QuizQuestion.quiz_id.in_(select(Quiz.id).where(Quiz.subject_id == subject_id)), sort)
+
+    def _read(self, condition, sort: Optional[str]) -> List[Dict]:
+        """One row per question; ``sort`` puts the hardest or least discriminating first."""
+        from app import db
+        from app.models import QuestionStats, QuizQuestion
+
+        if sort is not None and sort not in SORTS:
+            raise ValueError(f"sort must be one of: {', '.join(SORTS)}")
+        rows = db.session.execute(
+            select(QuizQuestion.id, QuizQuestion.quiz_id, QuizQuestion.question, QuizQuestion.question_type,
+                   QuestionStats)
+            .outerjoin(QuestionStats, QuestionStats.question_id == QuizQuestion.id)
+            .where(condition)
+            .order_by(QuizQuestion.quiz_id, QuizQuestion.id)
+        ).all()
+        items = [self._metrics(*row) for row in rows]
+        if sort:
+            # Questions without the metric yet go last
+            items.sort(key=lambda item: (item[sort] is None, item[sort] or 0))
+        return items
+
+    @staticmethod
+    def _metrics(question_id: int, quiz_id: int, question: str, question_type: str, stats) -> Dict:
+        answers = stats.answers if stats is not None else 0
+        discrimination = None
+        if stats is not None and stats.rest_count >= MIN_DISCRIMINATION_ANSWERS \
+                and 0 < stats.rest_correct < stats.rest_count:
+            n = stats.rest_count
+            mean = stats.rest_sum / n
+            variance = stats.rest_sq_sum / n - mean * mean
+            if variance > 1e-12:
+                mean_right = stats.rest_correct_sum / stats.rest_correct
+                mean_wrong = (stats.rest_sum - stats.rest_correct_sum) / (n - stats.rest_correct)
+                p = stats.rest_correct / n
+                discrimination = round((mean_right - mean_wrong) / sqrt(variance) * sqrt(p * (1 - p)), 3)
+
+        return {
+            'question_id': question_id,
+            'quiz_id': quiz_id,
+            'question': question,
+            'question_type': question_type,
+            'answers': answers,
+            'correct_rate': round(stats.correct / answers, 3) if answers else None,
+            'skip_rate': round(stats.skipped / answers, 3) if answers else None,
+            'average_time_seconds': round(stats.time_sum / stats.timed, 1) if answers and stats.timed else None,
+            'discrimination': discrimination,
+        }
+
+    # -- maintenance -----------------------------------------------------------
+
+    @staticmethod
+    def rebuild(connection, subject_ids: Iterable[int]) -> None:
+        """Recompute the statistics of every question in these subjects with one grouped query."""
+        from app.models import Quiz, QuizQuestion, QuizAttempt, QuizAttemptAnswer, QuestionStats
+
+        subject_ids = list(subject_ids)
+        if not subject_ids:
+            return
+        answer = QuizAttemptAnswer.__table__.c
+        attempt = QuizAttempt.__table__.c
+        quiz_ids = select(Quiz.id).where(Quiz.subject_id.in_(subject_ids))
+        question_ids = select(QuizQuestion.id).where(QuizQuestion.quiz_id.in_(quiz_ids))
+        connection.execute(delete(QuestionStats.__table__).where(QuestionStats.question_id.in_(question_ids)))
+        # A zeroed row for every question, answered or not
+        connection.execute(insert(QuestionStats.__table__).from_select(
+            ['question_id', 'subject_id', 'question_type'],
+            select(QuizQuestion.id, Quiz.subject_id, QuizQuestion.question_type)
+            .join(Quiz, Quiz.id == QuizQuestion.quiz_id)
+            .where(Quiz.subject_id.in_(subject_ids))
+        ))
+
+        answer_counts = (
+            select(answer.attempt_id, func.count().label('answers'))
+            .join(QuizAttempt.__table__, attempt.id == answer.attempt_id)
+            .where(attempt.quiz_id.in_(quiz_ids))
+            .group_by(answer.attempt_id)
+            .subquery()
+        )
+        correct = case((answer.is_correct, 1), else_=0)
+        time = func.coalesce(answer.time_seconds, attempt.time_taken_seconds * 1.0 / answer_counts.c.answers)
+        rest_points = attempt.total_points - func.coalesce(QuizQuestion.points, 0)
+        # Same rest score as _accumulate; NULL (skipped by SUM/COUNT) when no other points exist
+        rest = case((rest_points > 0, (attempt.score - answer.points_awarded) * 1.0 / rest_points))
+        rest_if_correct = case((answer.is_correct, rest))
+
+        rows = connection.execute(
+            select(
+                answer.question_id,
+                func.count().label('answers'),
+                func.sum(correct).label('correct'),
+                func.sum(case((answer.answer.is_(None), 1), else_=0)).label('skipped'),
+                func.count(time).label('timed'),
+                func.coalesce(func.sum(time), 0.0).label('time_sum'),
+                func.count(rest).label('rest_count'),
+                func.count(rest_if_correct).label('rest_correct'),
+                func.coalesce(func.sum(rest), 0.0).label('rest_sum'),
+                func.coalesce(func.sum(rest * rest), 0.0).label('rest_sq_sum'),
+                func.coalesce(func.sum(rest_if_correct), 0.0).label('rest_correct_sum'),
+            )
+            .select_from(QuizAttemptAnswer.__table__)
+            .join(QuizAttempt.__table__, attempt.id == answer.attempt_id)
+            .join(answer_counts, answer_counts.c.attempt_id == answer.attempt_id)
+            .join(QuizQuestion, QuizQuestion.id == answer.question_id)
+            .where(attempt.quiz_id.in_(quiz_ids))
+            .group_by(answer.question_id)
+        ).mappings().all()
+        upsert(connection, QuestionStats.__table__, ['question_id'], [dict(row) for row in rows], replace=True)
+        QuestionStatsService._rate(connection, QuestionStats.question_id.in_(question_ids))
+
+    @staticmethod
+    def _rate(connection, condition) -> None:
+        """Refresh ``difficulty`` from the counters of the matching answered rows."""
+        from app.models import QuestionStats
+
+        connection.execute(
+            update(QuestionStats.__table__)
+            .where(condition, QuestionStats.answers > 0)
+            .values(difficulty=1.0 - QuestionStats.correct * 1.0 / QuestionStats.answers)
+        )
+
+    @staticmethod
+    def _index(connection, questions: List) -> None:
+        """Record the subject and type of questions (``id``, ``subject_id``, ``question_type``)."""
+        from app.models import QuestionStats
+
+        upsert(connection, QuestionStats.__table__, ['question_id'], [
+            {'question_id': question_id, 'subject_id': subject_id, 'question_type': question_type}
+            for question_id, subject_id, question_type in questions
+        ], replace=True)
+
+    @staticmethod
+    def _accumulate(connection, answers: List) -> None:
+        """Add answers (``attempt_id``, ``question_id``, ``skipped``, ``is_correct``,
+        ``points_awarded``, ``time_seconds``) to their questions' counters.
+
+        Without a per-question time the attempt's time is split evenly
+        over its answers.
+        """
+        from app.models import QuizAttempt, QuizAttemptAnswer, QuizQuestion, QuestionStats
+
+        if not answers:
+            return
+        attempt_ids = {a['attempt_id'] for a in answers}
+        answer_counts = (
+            select(QuizAttemptAnswer.attempt_id, func.count().label('answers'))
+            .where(QuizAttemptAnswer.attempt_id.in_(attempt_ids))
+            .group_by(QuizAttemptAnswer.attempt_id)
+            .subquery()
+        )
+        attempts = {
+            attempt_id: (score, total_points, time_taken, count)
+            for attempt_id, score, total_points, time_taken, count in connection.execute(
+                select(QuizAttempt.id, QuizAttempt.score, QuizAttempt.total_points,
+                       QuizAttempt.time_taken_seconds, answer_counts.c.answers)
+                .join(answer_counts, answer_counts.c.attempt_id == QuizAttempt.id)
+            )
+        }
+        points = dict(connection.execute(
+            select(QuizQuestion.id, QuizQuestion.points)
+            .where(QuizQuestion.id.in_({a['question_id'] for a in answers}))
+        ).all())
+
+        deltas: Dict[int, Dict] = {}
+        for a in answers:
+            attempt = attempts.get(a['attempt_id'])
+            if attempt is None or a['question_id'] not in points:
+                continue
+            score, total_points, time_taken, count = attempt
+            row = deltas.setdefault(a['question_id'], {
+                'answers': 0, 'correct': 0, 'skipped': 0, 'timed': 0, 'time_sum': 0.0, 'rest_count': 0,
+                'rest_correct': 0, 'rest_sum': 0.0, 'rest_sq_sum': 0.0, 'rest_correct_sum': 0.0,
+            })
+            correct = bool(a['is_correct'])
+            row['answers'] += 1
+            row['correct'] += correct
+            row['skipped'] += bool(a['skipped'])
+
+            time = a['time_seconds']
+            if time is None and time_taken is not None:
+                time = time_taken / count
+            if time is not None:
+                row['timed'] += 1
+                row['time_sum'] += time
+
+            # Score on the other questions, so the item does not correlate with itself
+            rest_points = total_points - (points[a['question_id']] or 0)
+            if rest_points > 0:
+                rest = (score - (a['points_awarded'] or 0)) / rest_points
+                row['rest_count'] += 1
+                row['rest_sum'] += rest
+                row['rest_sq_sum'] += rest * rest
+                if correct:
+                    row['rest_correct'] += 1
+                    row['rest_correct_sum'] += rest
+
+        upsert(connection, QuestionStats.__table__, ['question_id'], [
+            {'question_id': question_id, **row} for question_id, row in deltas.items()
+        ])
+        QuestionStatsService._rate(connection, QuestionStats.question_id.in_(list(deltas)))
+
+    def _after_flush(self, session, flush_context) -> None:
+        from app.models import Quiz, QuizQuestion, QuizAttemptAnswer, QuestionStats
+
+        questions = [o for o in session.new if isinstance(o, QuizQuestion)] + [
+            o for o in session.dirty if isinstance(o, QuizQuestion) and (
+                inspect(o).attrs.question_type.history.has_changes()
+                or inspect(o).attrs.quiz_id.history.has_changes()
+            )
+        ]
+        moved = [
+            o for o in session.dirty
+            if isinstance(o, Quiz) and inspect(o).attrs.subject_id.history.has_changes()
+        ]
+        if questions or moved:
+            connection = session.connection()
+            with session.no_autoflush:
+                if questions:
+                    subjects = dict(connection.execute(
+                        select(Quiz.id, Quiz.subject_id).where(Quiz.id.in_({o.quiz_id for o in questions}))
+                    ).all())
+                    self._index(connection, [(o.id, subjects.get(o.quiz_id), o.question_type) for o in questions])
+                for quiz in moved:
+                    connection.execute(
+                        update(QuestionStats.__table__)
+                        .where(QuestionStats.question_id.in_(
+                            select(QuizQuestion.id).where(QuizQuestion.quiz_id == quiz.id)
+                        ))
+                        .values(subject_id=quiz.subject_id)
+                    )
+
+        answers = [
+            {'attempt_id': o.attempt_id, 'question_id': o.question_id, 'skipped': o.answer is None,
+             'is_correct': o.is_correct, 'points_awarded': o.points_awarded, 'time_seconds': o.time_seconds}
+            for o in session.new if isinstance(o, QuizAttemptAnswer)
+        ]
+        if answers:
+            self._accumulate(session.connection(), answers)
+
+    def _on_rows_inserted(self, model, rows: List[Dict], subject_id: int) -> None:
+        from app import db
+
+        if model.__name__ == 'QuizQuestion':
+            self._index(db.session.connection(), [
+                (row['id'], subject_id, row.get('question_type')) for row in rows
+            ])
+        elif model.__name__ == 'QuizAttemptAnswer':
+            self._accumulate(db.session.connection(), [
+                {'attempt_id': row['attempt_id'], 'question_id': row['question_id'],
+                 'skipped': row.get('answer') is None, 'is_correct': row.get('is_correct'),
+                 'points_awarded': row.get('points_awarded'), 'time_seconds': row.get('time_seconds')}
+                for row in rows
+            ])
+
+
+# Singleton instance
+question_stats_service = QuestionStatsService()
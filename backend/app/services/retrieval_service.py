@@ -0,0 +1,336 @@
+"""
+Retrieval Service - Hashed TF-IDF passages of notes and lectures for the AI tutor
+"""
+from flask_sqlalchemy.session import Session
+from sqlalchemy import delete, event, func, inspect, select, update
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+import re
+import threading
+import zlib
+import numpy as np
+
+from app.signals import rows_inserted
+
+
+# Hashed vocabulary size; a subject's matrix takes DIMENSIONS * 4 bytes per chunk
+DIMENSIONS = 2048
+# Passages of CHUNK_WORDS words, each repeating the last CHUNK_OVERLAP of the one before
+CHUNK_WORDS = 150
+CHUNK_OVERLAP = 30
+TOP_K = 4
+MAX_K = 20
+# Cosine similarity below which a passage is not worth showing the tutor
+MIN_SCORE = 0.05
+MAX_CACHED_SUBJECTS = 16
+BATCH_SIZE = 200
+
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here hers
+him his how i if in into is it its itself just me more most my no nor not now of off on once only or other our
+ours out over own same she should so some such than that the their theirs them then there these they this those
+through to too under until up very was we were what when where which while who whom why will with would you
+your yours
+""".split())
+
+_WORD = re.compile(r'\w+')
+
+
+def chunk_text(text: Optional[str]) -> List[str]:
+    """Overlapping passages of about CHUNK_WORDS words."""
+    words = (text or '').split()
+    if not words:
+        return []
+    step = CHUNK_WORDS - CHUNK_OVERLAP
+    return [' '.join(words[start:start + CHUNK_WORDS]) for start in range(0, max(len(words) - CHUNK_OVERLAP, 1), step)]
+
+
+def _terms(text: str) -> Counter:
+    """Lowercase words without stopwords, plural ``s`` trimmed."""
+    counts = Counter()
+    for word in _WORD.findall(text.lower()):
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        counts[word] += 1
+    return counts
+
+
+def term_weights(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Sparse hashed term frequencies of a text: (buckets, weights).
+
+    Each word lands in bucket ``crc32 % DIMENSIONS`` with weight
+    ``1 + log(count)``, signed by another bit of the hash so that
+    colliding words cancel out on average instead of piling up.
+    """
+    counts = _terms(text)
+    if not counts:
+        return np.zeros(0, np.uint16), np.zeros(0, np.float32)
+    hashes = np.fromiter((zlib.crc32(word.encode()) for word in counts), np.uint32, len(counts))
+    weights = 1 + np.log(np.fromiter(counts.values(), np.float32, len(counts)))
+    weights = np.where(hashes & 0x80000000, -weights, weights).astype(np.float32)
+    buckets, inverse = np.unique((hashes % DIMENSIONS).astype(np.uint16), return_inverse=True)
+    summed = np.zeros(len(buckets), np.float32)
+    np.add.at(summed, inverse, weights)
+    keep = summed != 0
+    return buckets[keep], summed[keep]
+
+
+def encode_terms(buckets: np.ndarray, weights: np.ndarray) -> bytes:
+    return weights.astype('<f4').tobytes() + buckets.astype('<u2').tobytes()
+
+
+def decode_terms(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    count = len(data) // 6
+    return np.frombuffer(data, '<u2', count, offset=4 * count), np.frombuffer(data, '<f4', count)
+
+
+class _SubjectIndex:
+    """A subject's chunks as an L2-normalized TF-IDF float32 matrix (one row per chunk)."""
+    __slots__ = ('version', 'ids', 'note_ids', 'lecture_ids', 'vectors', 'idf')
+
+    def __init__(self, version: Tuple, rows: List):
+        self.version = version
+        self.ids = np.array([row[0] for row in rows], np.int64)
+        self.note_ids = np.array([row[1] or 0 for row in rows], np.int64)
+        self.lecture_ids = np.array([row[2] or 0 for row in rows], np.int64)
+
+        decoded = [decode_terms(row[3]) for row in rows]
+        lengths = [len(buckets) for buckets, _ in decoded]
+        buckets = np.concatenate([b for b, _ in decoded]) if decoded else np.zeros(0, np.uint16)
+        weights = np.concatenate([w for _, w in decoded]) if decoded else np.zeros(0, np.float32)
+        vectors = np.zeros((len(rows), DIMENSIONS), np.float32)
+        vectors[np.repeat(np.arange(len(rows)), lengths), buckets] = weights
+
+        document_frequency = np.bincount(buckets, minlength=DIMENSIONS)
+        self.idf = (np.log((1 + len(rows)) / (1 + document_frequency)) + 1).astype(np.float32)
+        vectors *= self.idf
+        norms = np.linalg.norm(vectors, axis=1)
+        norms[norms == 0] = 1
+        vectors /= norms[:, None]
+        self.vectors = vectors
+
+
+class RetrievalService:
+    """Finds the passages of a subject's notes and lecture transcriptions closest to a question.
+
+    Notes and transcriptions are split into overlapping passages as they
+    are written; each passage is stored in ``text_chunks`` with its
+    sparse hashed term frequencies (no model, no vocabulary to train).
+    On first use per subject those rows become one dense float32 matrix
+    with IDF weights, cached (LRU) under the subject's chunk count and
+    highest chunk id, so a lookup is one indexed version read, one
+    matrix-vector product over the query's buckets and one read of the
+    k winning passages.
+    """
+
+    def __init__(self):
+        self._indexes: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._listening = False
+
+    def init_app(self, app) -> None:
+        """Backfill an empty index and hook note and lecture writes."""
+        from app import db
+        from app.models import Lecture, Note, TextChunk
+
+        @app.cli.command('retrieval-index')
+        def reindex_command():
+            """Re-chunk every note and lecture transcription."""
+            print(f"Indexed {self.reindex()} passages")
+
+        with app.app_context():
+            with db.engine.connect() as connection:
+                empty = connection.execute(select(
+                    ~select(TextChunk.id).exists() &
+                    (select(Note.id).exists() | select(Lecture.id).where(Lecture.transcription.isnot(None)).exists())
+                )).scalar()
+            if empty:
+                self.reindex()
+
+        if not self._listening:
+            event.listen(Session, 'after_flush', self._after_flush)
+            rows_inserted.connect(self._on_rows_inserted)
+            self._listening = True
+
+    # -- lookups ---------------------------------------------------------------
+
+    def search(self, subject_id: int, query: str, k: int = TOP_K, note_id: Optional[int] = None,
+               lecture_id: Optional[int] = None) -> List[Dict]:
+        """The ``k`` passages most similar to ``query``, best first.
+
+        ``note_id`` or ``lecture_id`` restricts the search to one source
+        (a lecture's notes included).
+        """
+        from app import db
+        from app.models import Lecture, Note, TextChunk
+
+        buckets, weights = term_weights(query or '')
+        index = self._index(subject_id)
+        if not len(buckets) or not len(index.ids):
+            return []
+
+        vector = weights * index.idf[buckets]
+        vector /= np.linalg.norm(vector)
+        scores = index.vectors[:, buckets] @ vector
+        if note_id is not None:
+            scores = np.where(index.note_ids == note_id, scores, -1)
+        elif lecture_id is not None:
+            lecture_notes = db.session.execute(select(Note.id).where(Note.lecture_id == lecture_id)).scalars().all()
+            scores = np.where((index.lecture_ids == lecture_id) | np.isin(index.note_ids, lecture_notes), scores, -1)
+
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = [i for i in best[np.argsort(-scores[best])].tolist() if scores[i] >= MIN_SCORE]
+        if not best:
+            return []
+
+        rows = {
+            row.id: row for row in db.session.execute(
+                select(TextChunk.id, TextChunk.note_id, TextChunk.lecture_id, TextChunk.position, TextChunk.text,
+                       Note.title.label('note_title'), Lecture.title.label('lecture_title'))
+                .outerjoin(Note, Note.id == TextChunk.note_id)
+                .outerjoin(Lecture, Lecture.id == TextChunk.lecture_id)
+                .where(TextChunk.id.in_([int(index.ids[i]) for i in best]))
+            )
+        }
+        passages = []
+        for i in best:
+            row = rows.get(int(index.ids[i]))
+            if row is None:
+                continue
+            passages.append({
+                'chunk_id': row.id,
+                'note_id': row.note_id,
+                'lecture_id': row.lecture_id,
+                'title': row.note_title if row.note_id else row.lecture_title,
+                'position': row.position,
+                'text': row.text,
+                'score': round(float(scores[i]), 3),
+            })
+        return passages
+
+    def _index(self, subject_id: int) -> _SubjectIndex:
+        """The subject's cached matrix, rebuilt from ``text_chunks`` when its version moved."""
+        from app import db
+        from app.models import TextChunk
+
+        version = tuple(db.session.execute(
+            select(func.count(TextChunk.id), func.max(TextChunk.id)).where(TextChunk.subject_id == subject_id)
+        ).one())
+        with self._lock:
+            cached = self._indexes.get(subject_id)
+            if cached is not None and cached.version == version:
+                self._indexes.move_to_end(subject_id)
+                return cached
+
+        rows = db.session.execute(
+            select(TextChunk.id, TextChunk.note_id, TextChunk.lecture_id, TextChunk.terms)
+            .where(TextChunk.subject_id == subject_id)
+            .order_by(TextChunk.id)
+        ).all()
+        index = _SubjectIndex(version, rows)
+        with self._lock:
+            self._indexes[subject_id] = index
+            self._indexes.move_to_end(subject_id)
+            while len(self._indexes) > MAX_CACHED_SUBJECTS:
+                self._indexes.popitem(last=False)
+        return index
+
+    # -- maintenance -------------------------------------------------------------
+
+    def reindex(self) -> int:
+        """Rebuild every subject's passages from the notes and transcriptions."""
+        from app import db
+        from app.models import Lecture, Note, TextChunk
+
+        connection = db.session.connection()
+        connection.execute(delete(TextChunk.__table__))
+        sources = [
+            ('note', select(Note.id, Note.subject_id, Note.content)),
+            ('lecture', select(Lecture.id, Lecture.subject_id, Lecture.transcription)
+             .where(Lecture.transcription.isnot(None))),
+        ]
+        total = 0
+        for kind, statement in sources:
+            batch = []
+            for row in db.session.execute(statement.execution_options(yield_per=BATCH_SIZE)):
+                batch.append((kind, *row))
+                if len(batch) >= BATCH_SIZE:
+                    total += self._write(connection, batch, replace=False)
+                    batch = []
+            total += self._write(connection, batch, replace=False)
+        db.session.commit()
+        return total
+
+    @staticmethod
+    def _write(connection, items: Iterable[Tuple[str, int, int, Optional[str]]], replace: bool = True) -> int:
+        """Store the passages of ``(kind, item_id, subject_id, text)`` items, replacing their old ones."""
+        from app.models import TextChunk
+
+        items = [item for item in items if item[2] is not None]
+        table = TextChunk.__table__
+        if replace:
+            for kind in ('note', 'lecture'):
+                item_ids = [item_id for item_kind, item_id, _, _ in items if item_kind == kind]
+                if item_ids:
+                    connection.execute(delete(table).where(table.c[f'{kind}_id'].in_(item_ids)))
+        rows = [
+            {'subject_id': subject_id, 'note_id': item_id if kind == 'note' else None,
+             'lecture_id': item_id if kind == 'lecture' else None, 'position': position, 'text': passage,
+             'terms': encode_terms(*term_weights(passage))}
+            for kind, item_id, subject_id, text in items
+            for position, passage in enumerate(chunk_text(text))
+        ]
+        if rows:
+            connection.execute(table.insert(), rows)
+        return len(rows)
+
+    def _after_flush(self, session, flush_context) -> None:
+        """Re-chunk written notes and transcriptions in the same transaction."""
+        from app.models import Lecture, Note, TextChunk
+
+        text_attribute = {Note: 'content', Lecture: 'transcription'}
+        changed, moved = [], []
+        for obj in [*session.new, *session.dirty]:
+            name = text_attribute.get(type(obj))
+            if name is None:
+                continue
+            state = inspect(obj)
+            if obj in session.new or state.attrs[name].history.has_changes():
+                changed.append(obj)
+            elif state.attrs.subject_id.history.has_changes():
+                moved.append(obj)
+        if not (changed or moved):
+            return
+
+        connection = session.connection()
+        with session.no_autoflush:
+            self._write(connection, [
+                ('note' if isinstance(o, Note) else 'lecture', o.id, o.subject_id, getattr(o, text_attribute[type(o)]))
+                for o in changed
+            ])
+            table = TextChunk.__table__
+            for obj in moved:
+                column = table.c.note_id if isinstance(obj, Note) else table.c.lecture_id
+                connection.execute(update(table).where(column == obj.id).values(subject_id=obj.subject_id))
+
+    def _on_rows_inserted(self, model, rows: List[Dict], subject_id: int) -> None:
+        """Index notes and lectures written by set-based inserts, which skip flush hooks."""
+        from app import db
+
+        if model.__name__ == 'Note':
+            kind, name = 'note', 'content'
+        elif model.__name__ == 'Lecture':
+            kind, name = 'lecture', 'transcription'
+        else:
+            return
+        self._write(db.session.connection(), [
+            (kind, row['id'], row.get('subject_id', subject_id), row.get(name)) for row in rows
+        ], replace=False)
+
+
+# Singleton instance
+retrieval_service = RetrievalService()
@@ -0,0 +1,400 @@
+"""
+Scheduler Service - Spaced-repetition memory models and batch rescheduling
+"""
+from abc import ABC, abstractmethod
+from sqlalchemy import bindparam, insert, select, update
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+
+# Review grades
+AGAIN, HARD, GOOD, EASY = 1, 2, 3, 4
+
+MIN_DIFFICULTY, MAX_DIFFICULTY = 1.0, 10.0
+MAX_INTERVAL_DAYS = 36500
+RESCHEDULE_BATCH_SIZE = 50000
+MAX_BATCH_REVIEWS = 1000
+
+
+def grade_from_request(data: dict) -> int:
+    """Grade from a review payload: ``grade`` (1-4) or the older ``correct`` flag."""
+    if data.get('grade') is not None:
+        value = data['grade']
+        if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+            raise ValueError('grade must be a whole number from 1 to 4')
+        grade = int(value)
+        if grade not in (AGAIN, HARD, GOOD, EASY):
+            raise ValueError('grade must be 1 (again), 2 (hard), 3 (good) or 4 (easy)')
+        return grade
+    return GOOD if data.get('correct', False) else AGAIN
+
+
+def _parse_reviewed_at(value, now: datetime) -> datetime:
+    """Naive UTC review time from an ISO string; clocks ahead of ours are clamped."""
+    if value is None:
+        return now
+    reviewed_at = datetime.fromisoformat(value)
+    if reviewed_at.tzinfo is not None:
+        reviewed_at = reviewed_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(reviewed_at, now)
+
+
+def validate_review_events(events) -> List[Dict]:
+    """Normalize batch review events; raise ValueError for an unusable payload."""
+    if not isinstance(events, list) or not events:
+        raise ValueError('events must be a non-empty array')
+    if len(events) > MAX_BATCH_REVIEWS:
+        raise ValueError(f'At most {MAX_BATCH_REVIEWS} events per request')
+    now = datetime.utcnow()
+    normalized = []
+    for n, event in enumerate(events):
+        if not isinstance(event, dict):
+            raise ValueError(f'events[{n}] must be an object')
+        event_id, card_id = event.get('event_id'), event.get('card_id')
+        if not isinstance(event_id, str) or not event_id or len(event_id) > 64:
+            raise ValueError(f'events[{n}].event_id must be a string of 1-64 characters')
+        if not isinstance(card_id, int) or isinstance(card_id, bool):
+            raise ValueError(f'events[{n}].card_id must be an integer')
+        try:
+            grade = grade_from_request(event)
+            reviewed_at = _parse_reviewed_at(event.get('reviewed_at'), now)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f'events[{n}]: {e}')
+        normalized.append({'event_id': event_id, 'card_id': card_id, 'grade': grade, 'reviewed_at': reviewed_at})
+    return normalized
+
+
+class Scheduler(ABC):
+    """A memory model over arrays of card state.
+
+    State is ``stability`` (days until recall probability drops to the
+    target) and ``difficulty`` (1-10). Every method takes and returns
+    NumPy arrays, so one review and a million rescheduled cards go
+    through the same code; NaN stability marks a card never reviewed.
+    """
+
+    name = ''
+
+    @abstractmethod
+    def review(self, stability: np.ndarray, difficulty: np.ndarray,
+               elapsed_days: np.ndarray, grade: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """New ``(stability, difficulty)`` after reviews with the given grades."""
+
+    @abstractmethod
+    def interval(self, stability: np.ndarray, difficulty: np.ndarray) -> np.ndarray:
+        """Whole days until the next review."""
+
+
+class SM2Scheduler(Scheduler):
+    """SuperMemo-2: stability is the current interval, difficulty the ease factor.
+
+    Ease 2.5 maps to difficulty 1 and the minimum ease 1.3 to difficulty 10.
+    """
+
+    name = 'sm2'
+    QUALITY = np.array([0, 1, 3, 4, 5])  # SM-2 response quality by grade
+
+    @staticmethod
+    def _ease(difficulty):
+        return 1.3 + (MAX_DIFFICULTY - difficulty) * 1.2 / 9
+
+    @staticmethod
+    def _difficulty(ease):
+        return MAX_DIFFICULTY - (ease - 1.3) * 9 / 1.2
+
+    def review(self, stability, difficulty, elapsed_days, grade):
+        new = np.isnan(stability)
+        ease = np.where(new, 2.5, self._ease(np.nan_to_num(difficulty, nan=MIN_DIFFICULTY)))
+        miss = 5 - self.QUALITY[grade]
+        ease = np.clip(ease + 0.1 - miss * (0.08 + miss * 0.02), 1.3, 2.5)
+
+        previous = np.nan_to_num(stability, nan=0.0)
+        stability = np.where(previous < 1, 1.0, np.where(previous < 6, 6.0, previous * ease))
+        stability = np.where(grade == AGAIN, 1.0, stability)
+        return stability, self._difficulty(ease)
+
+    def interval(self, stability, difficulty):
+        return np.clip(np.rint(stability), 1, MAX_INTERVAL_DAYS)
+
+
+class FSRSScheduler(Scheduler):
+    """FSRS-4.5 with its published default weights.
+
+    Intervals target ``desired_retention``, so changing it only needs
+    ``interval`` recomputed from the stored stability of every card.
+    """
+
+    name = 'fsrs'
+    WEIGHTS = (0.4872, 1.4003, 3.7145, 13.8206, 5.1618, 1.2298, 0.8975, 0.031, 1.6474,
+               0.1367, 1.0461, 2.1072, 0.0793, 0.3246, 1.587, 0.2272, 2.8755)
+    DECAY = -0.5
+    FACTOR = 19 / 81
+
+    def __init__(self, desired_retention: float = 0.9, weights: Optional[Sequence[float]] = None):
+        if not 0 < desired_retention < 1:
+            raise ValueError('desired_retention must be between 0 and 1')
+        self.desired_retention = desired_retention
+        self.w = np.asarray(weights or self.WEIGHTS, dtype=float)
+
+    def retrievability(self, stability, elapsed_days):
+        return (1 + self.FACTOR * elapsed_days / stability) ** self.DECAY
+
+    def _initial_difficulty(self, grade):
+        return np.clip(self.w[4] - (grade - 3) * self.w[5], MIN_DIFFICULTY, MAX_DIFFICULTY)
+
+    def review(self, stability, difficulty, elapsed_days, grade):
+        w = self.w
+        new = np.isnan(stability)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            s = np.where(new, 1.0, stability)
+            d = np.where(new, 5.0, difficulty)
+            r = self.retrievability(s, np.maximum(elapsed_days, 0))
+
+            d = d - w[6] * (grade - 3)
+            d = np.clip(w[7] * self._initial_difficulty(GOOD) + (1 - w[7]) * d,
+                        MIN_DIFFICULTY, MAX_DIFFICULTY)
+
+            penalty = np.where(grade == HARD, w[15], 1.0) * np.where(grade == EASY, w[16], 1.0)
+            recalled = s * (1 + np.exp(w[8]) * (11 - d) * s ** -w[9] * (np.exp(w[10] * (1 - r)) - 1) * penalty)
+            forgot = np.minimum(s, w[11] * d ** -w[12] * ((s + 1) ** w[13] - 1) * np.exp(w[14] * (1 - r)))
+            s = np.where(grade == AGAIN, forgot, recalled)
+
+        stability = np.where(new, w[:4][grade - 1], s)
+        difficulty = np.where(new, self._initial_difficulty(grade), d)
+        return np.maximum(stability, 0.1), difficulty
+
+    def interval(self, stability, difficulty):
+        days = stability / self.FACTOR * (self.desired_retention ** (1 / self.DECAY) - 1)
+        return np.clip(np.rint(days), 1, MAX_INTERVAL_DAYS)
+
+
+SCHEDULERS = {cls.name: cls for cls in (SM2Scheduler, FSRSScheduler)}
+
+
+def legacy_state(difficulty: np.ndarray, last_reviewed: np.ndarray,
+                 next_review: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Memory state for cards last scheduled by the old ``2 ** difficulty`` rule.
+
+    The old interval stands in for stability; the 0-5 level maps onto 1-10.
+    """
+    interval = (next_review - last_reviewed) / np.timedelta64(1, 'D')
+    stability = np.where(np.isnan(interval), np.nan, np.maximum(interval, 1.0))
+    return stability, MIN_DIFFICULTY + np.nan_to_num(difficulty, nan=0.0) * 9 / 5
+
+
+def _datetimes(values: List[Optional[datetime]]) -> np.ndarray:
+    return np.array([v if v is not None else 'NaT' for v in values], dtype='datetime64[s]')
+
+
+class SchedulerService:
+    """Applies the configured scheduler to flashcards.
+
+    ``SCHEDULER`` picks the model (``fsrs`` or ``sm2``) and
+    ``DESIRED_RETENTION`` the FSRS recall target.
+    """
+
+    def __init__(self):
+        self.scheduler: Scheduler = FSRSScheduler()
+
+    def init_app(self, app) -> None:
+        name = app.config.get('SCHEDULER', 'fsrs')
+        if name not in SCHEDULERS:
+            raise ValueError(f"Unknown SCHEDULER '{name}' (expected one of: {', '.join(SCHEDULERS)})")
+        if name == 'fsrs':
+            self.scheduler = FSRSScheduler(float(app.config.get('DESIRED_RETENTION', 0.9)))
+        else:
+            self.scheduler = SCHEDULERS[name]()
+
+        @app.cli.command('reschedule-cards')
+        def reschedule_command():
+            """Recompute next_review for every reviewed card with the current scheduler."""
+            print(f"Rescheduled {self.reschedule()} cards")
+
+    def review_cards(self, cards: List, grades: Sequence[int],
+                     reviewed_at: Optional[Sequence[datetime]] = None) -> None:
+        """Apply one review to each card (ORM objects), in place, and log it.
+
+        A review older than the card's ``last_reviewed`` arrived out of
+        order: it is counted and logged but leaves the schedule alone, so
+        it cannot move the card's dates backwards.
+        """
+        from app import db
+        from app.models import ReviewLog
+
+        if not cards:
+            return
+        now = datetime.utcnow()
+        reviewed_at = _datetimes(list(reviewed_at) if reviewed_at is not None else [now] * len(cards))
+        last = _datetimes([c.last_reviewed for c in cards])
+        stability = np.array([c.stability for c in cards], dtype=float)
+        difficulty = np.array([c.memory_difficulty for c in cards], dtype=float)
+
+        legacy = np.isnan(stability) & ~np.isnat(last)
+        if legacy.any():
+            old_s, old_d = legacy_state(
+                np.array([c.difficulty for c in cards], dtype=float), last,
+                _datetimes([c.next_review for c in cards])
+            )
+            stability = np.where(legacy, old_s, stability)
+            difficulty = np.where(legacy, old_d, difficulty)
+
+        since_last = (reviewed_at - last) / np.timedelta64(1, 'D')
+        stale = (since_last < 0).tolist()
+        since_last = np.where(since_last < 0, np.nan, since_last)
+        elapsed = np.nan_to_num(since_last, nan=0.0)
+        grades = np.asarray(grades, dtype=int)
+        stability, difficulty = self.scheduler.review(stability, difficulty, elapsed, grades)
+        next_review = reviewed_at + (self.scheduler.interval(stability, difficulty) * 86400).astype('timedelta64[s]')
+
+        for card, grade, s, d, at, due, late in zip(cards, grades.tolist(), stability.tolist(), difficulty.tolist(),
+                                                    reviewed_at.astype(datetime).tolist(),
+                                                    next_review.astype(datetime).tolist(), stale):
+            card.times_reviewed = (card.times_reviewed or 0) + 1
+            if grade > AGAIN:
+                card.times_correct = (card.times_correct or 0) + 1
+            if late:
+                continue
+            card.stability = s
+            card.memory_difficulty = d
+            # The 0-5 level clients display
+            card.difficulty = int(round((d - MIN_DIFFICULTY) * 5 / 9))
+            card.last_reviewed = at
+            card.next_review = due
+
+        db.session.execute(insert(ReviewLog), [
+            {'flashcard_id': card.id, 'flashcard_set_id': card.flashcard_set_id, 'ts': ts, 'grade': grade,
+             'elapsed_days': None if np.isnan(days) else round(days, 4)}
+            for card, ts, grade, days in zip(cards, reviewed_at.astype('int64').tolist(), grades.tolist(),
+                                             since_last.tolist())
+        ])
+
+    def review(self, card, grade: int, reviewed_at: Optional[datetime] = None) -> None:
+        self.review_cards([card], [grade], [reviewed_at or datetime.utcnow()])
+
+    def submit_reviews(self, events: List[Dict]) -> Dict:
+        """Apply validated review events in order, skipping ids already applied.
+
+        One SELECT finds applied event ids, one loads every card, and the
+        changed cards are written by one executemany UPDATE at commit.
+        Events for the same card are applied in review-time order; all
+        others are scheduled together. The caller commits.
+        """
+        from app import db
+        from app.models import AppliedReviewEvent, Flashcard
+
+        event_ids = list(dict.fromkeys(e['event_id'] for e in events))
+        applied = set(db.session.execute(
+            select(AppliedReviewEvent.event_id).where(AppliedReviewEvent.event_id.in_(event_ids))
+        ).scalars())
+        cards = {
+            card.id: card for card in
+            Flashcard.query.filter(Flashcard.id.in_({e['card_id'] for e in events})).all()
+        }
+
+        duplicates, missing, pending, seen = [], [], [], set()
+        for event in events:
+            if event['event_id'] in applied or event['event_id'] in seen:
+                duplicates.append(event['event_id'])
+            elif event['card_id'] not in cards:
+                missing.append(event['event_id'])
+            else:
+                pending.append(event)
+            seen.add(event['event_id'])
+
+        # Round k holds each card's k-th event, so a round never repeats a card
+        rounds: List[List[Dict]] = []
+        depth: Dict[int, int] = {}
+        for event in sorted(pending, key=lambda e: e['reviewed_at']):
+            k = depth.get(event['card_id'], 0)
+            depth[event['card_id']] = k + 1
+            if k == len(rounds):
+                rounds.append([])
+            rounds[k].append(event)
+        for batch in rounds:
+            self.review_cards([cards[e['card_id']] for e in batch],
+                              [e['grade'] for e in batch],
+                              [e['reviewed_at'] for e in batch])
+
+        db.session.add_all([
+            AppliedReviewEvent(event_id=e['event_id'], flashcard_id=e['card_id']) for e in pending
+        ])
+        return {
+            'applied': len(pending),
+            'duplicates': duplicates,
+            'missing': missing,
+            'cards': [cards[i].to_dict() for i in dict.fromkeys(e['card_id'] for e in events) if i in cards],
+        }
+
+    def reschedule(self, batch_size: int = RESCHEDULE_BATCH_SIZE) -> int:
+        """Recompute ``next_review`` of every reviewed card, a batch at a time.
+
+        Each batch is loaded into arrays, scheduled in one vectorized pass
+        and written back with one executemany UPDATE. Cards still on the
+        old rule get their memory state seeded from it.
+        """
+        from app import db
+        from app.models import Flashcard, FlashcardSet, Subject
+        from app.services.cache_service import cache_service
+        from app.services.dashboard_service import dashboard_service
+        from app.services.due_queue_service import due_queue_service
+        from app.services.sync_service import sync_service
+
+        table = Flashcard.__table__
+        write_back = (
+            update(table)
+            .where(table.c.id == bindparam('card_id'))
+            .values(stability=bindparam('s'), memory_difficulty=bindparam('d'), next_review=bindparam('due'))
+        )
+        rescheduled, last_id = 0, 0
+        while True:
+            rows = db.session.execute(
+                select(Flashcard.id, Flashcard.stability, Flashcard.memory_difficulty, Flashcard.difficulty,
+                       Flashcard.last_reviewed, Flashcard.next_review)
+                .where(Flashcard.last_reviewed.isnot(None), Flashcard.id > last_id)
+                .order_by(Flashcard.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            ids, stability, difficulty, level, last, due = zip(*rows)
+            last = _datetimes(last)
+            stability = np.array(stability, dtype=float)
+            difficulty = np.array(difficulty, dtype=float)
+
+            legacy = np.isnan(stability)
+            if legacy.any():
+                old_s, old_d = legacy_state(np.array(level, dtype=float), last, _datetimes(due))
+                stability = np.where(legacy, old_s, stability)
+                difficulty = np.where(legacy, old_d, difficulty)
+
+            interval = self.scheduler.interval(stability, difficulty)
+            next_review = last + (interval * 86400).astype('timedelta64[s]')
+            db.session.execute(write_back, [
+                {'card_id': i, 's': s, 'd': d, 'due': n}
+                for i, s, d, n in zip(ids, stability.tolist(), difficulty.tolist(),
+                                      next_review.astype(datetime).tolist())
+            ])
+            # Offline clients pick the new due dates up on their next sync
+            sync_service.record(db.session.connection(), 'flashcard', list(ids))
+            db.session.commit()
+            rescheduled += len(ids)
+            last_id = ids[-1]
+
+        # Bulk UPDATEs bypass the flush hooks: refresh set validators, due
+        # totals and cached results
+        db.session.execute(
+            update(FlashcardSet).values(etag_at=datetime.utcnow(), updated_at=FlashcardSet.updated_at)
+        )
+        connection = db.session.connection()
+        subject_ids = connection.execute(select(Subject.id)).scalars().all()
+        dashboard_service.rebuild(connection, subject_ids)
+        db.session.commit()
+        cache_service.bump(subject_ids)
+        if due_queue_service.enabled:
+            due_queue_service.rebuild()
+        return rescheduled
+
+
+# Singleton instance
+scheduler_service = SchedulerService()
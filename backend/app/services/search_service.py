@@ -0,0 +1,548 @@
+"""
+Search Service - Full-text index over notes, lectures, flashcards and quiz questions
+"""
+from sqlalchemy import event, inspect, null, select, text
+from flask_sqlalchemy.session import Session
+from app.signals import rows_inserted
+from typing import Dict, Iterable, List, Optional
+import re
+
+
+# Document kinds and the code folded into each document's key
+KINDS = {'note': 0, 'lecture': 1, 'flashcard': 2, 'question': 3}
+
+# Attributes whose change requires the document to be rewritten
+INDEXED_ATTRIBUTES = {
+    'Note': ('title', 'content', 'subject_id'),
+    'Lecture': ('title', 'transcription', 'subject_id'),
+    'Flashcard': ('front', 'back', 'flashcard_set_id'),
+    'QuizQuestion': ('question', 'quiz_id'),
+}
+
+# Parents whose children the database deletes with ON DELETE CASCADE,
+# without the ORM ever loading them
+CASCADED_CHILDREN = {
+    'Lecture': 'note',
+    'FlashcardSet': 'flashcard',
+    'Quiz': 'question',
+}
+
+
+# Words in a result's snippet, around its best-matching passage
+SNIPPET_WORDS = 24
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def doc_key(kind: str, ref_id: int) -> int:
+    """Stable integer key for a document (rowid / primary key in the index)."""
+    return ref_id * len(KINDS) + KINDS[kind]
+
+
+def _stem(word: str) -> str:
+    """Crude suffix stripping, close enough to the index's stemmer to highlight with."""
+    word = word.casefold()
+    for suffix in ('ing', 'ed', 'es', 's', 'ly'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def _matcher(query: str):
+    stems = [_stem(term) for term in _WORD.findall(query)]
+    return lambda word: any(_stem(word).startswith(stem) for stem in stems)
+
+
+def highlight(content: str, matches) -> str:
+    """Wrap every matching word in ``<mark>``."""
+    return _WORD.sub(lambda m: f'<mark>{m.group()}</mark>' if matches(m.group()) else m.group(), content)
+
+
+def snippet(content: str, matches, words: int = SNIPPET_WORDS) -> str:
+    """The ``words``-word window with the most matches, highlighted."""
+    tokens = content.split()
+    if not tokens:
+        return ''
+    hits = [any(matches(w) for w in _WORD.findall(token)) for token in tokens]
+    start = 0
+    best = count = sum(hits[:words])
+    for i in range(1, max(1, len(tokens) - words + 1)):
+        count += hits[i + words - 1] - hits[i - 1]
+        if count > best:
+            best, start = count, i
+    window = highlight(' '.join(tokens[start:start + words]), matches)
+    return ('…' if start else '') + window + ('…' if start + words < len(tokens) else '')
+
+
+class SQLiteSearchBackend:
+    """FTS5 with BM25 ranking and porter stemming, plus a plain table of document keys.
+
+    On SQLite 3.43+ the FTS5 table is contentless (``contentless_delete``),
+    so it holds only the inverted index and never a second copy of the
+    (compressed) source text. Older SQLite cannot delete from a
+    contentless table, so there FTS5 keeps its own copy of the text.
+    """
+
+    name = 'sqlite'
+
+    @staticmethod
+    def contentless(connection) -> bool:
+        version = connection.execute(text('SELECT sqlite_version()')).scalar()
+        return tuple(int(part) for part in version.split('.')[:2]) >= (3, 43)
+
+    def ensure_schema(self, connection) -> bool:
+        contentless = self.contentless(connection)
+        tables = dict(connection.execute(text(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'table' "
+            "AND name IN ('search_index', 'search_documents')"
+        )).all())
+        if 'search_documents' in tables and ("content = ''" in (tables.get('search_index') or '')) == contentless:
+            return False
+        # Missing, from before the key table existed, or SQLite was upgraded
+        connection.execute(text('DROP TABLE IF EXISTS search_index'))
+        connection.execute(text('DROP TABLE IF EXISTS search_documents'))
+        options = "content = '', contentless_delete = 1, " if contentless else ''
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE search_index USING fts5(title, body, {options}tokenize = 'porter unicode61')"
+        ))
+        connection.execute(text("""
+            CREATE TABLE search_documents (
+                doc_key INTEGER PRIMARY KEY,
+                kind VARCHAR(20) NOT NULL,
+                ref_id INTEGER NOT NULL,
+                subject_id INTEGER,
+                parent_id INTEGER
+            )
+        """))
+        connection.execute(text(
+            "CREATE INDEX ix_search_documents_subject ON search_documents (subject_id)"
+        ))
+        connection.execute(text(
+            "CREATE INDEX ix_search_documents_parent ON search_documents (kind, parent_id)"
+        ))
+        return True
+
+    def upsert(self, connection, docs: List[Dict]) -> None:
+        self.delete(connection, [doc['doc_key'] for doc in docs])
+        connection.execute(text("""
+            INSERT INTO search_documents (doc_key, kind, ref_id, subject_id, parent_id)
+            VALUES (:doc_key, :kind, :ref_id, :subject_id, :parent_id)
+        """), docs)
+        connection.execute(text(
+            "INSERT INTO search_index (rowid, title, body) VALUES (:doc_key, :title, :body)"
+        ), docs)
+
+    def delete(self, connection, keys: List[int]) -> None:
+        if keys:
+            params = [{'doc_key': key} for key in keys]
+            connection.execute(text("DELETE FROM search_index WHERE rowid = :doc_key"), params)
+            connection.execute(text("DELETE FROM search_documents WHERE doc_key = :doc_key"), params)
+
+    def _delete_where(self, connection, condition: str, params) -> None:
+        connection.execute(text(
+            f"DELETE FROM search_index WHERE rowid IN (SELECT doc_key FROM search_documents WHERE {condition})"
+        ), params)
+        connection.execute(text(f"DELETE FROM search_documents WHERE {condition}"), params)
+
+    def delete_subject(self, connection, subject_id: int) -> None:
+        self._delete_where(connection, 'subject_id = :subject_id', {'subject_id': subject_id})
+
+    def delete_children(self, connection, kind: str, parent_ids: List[int]) -> None:
+        if parent_ids:
+            self._delete_where(connection, 'kind = :kind AND parent_id = :parent_id',
+                               [{'kind': kind, 'parent_id': parent_id} for parent_id in parent_ids])
+
+    def clear(self, connection) -> None:
+        connection.execute(text("DELETE FROM search_index"))
+        connection.execute(text("DELETE FROM search_documents"))
+
+    @staticmethod
+    def match_expression(query: str) -> str:
+        """Turn free text into a safe FTS5 expression (AND of quoted terms).
+
+        The last term is a prefix match so results appear while typing.
+        """
+        terms = re.findall(r'\w+', query, flags=re.UNICODE)
+        if not terms:
+            return ''
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def query(self, connection, query: str, subject_id: Optional[int],
+              kinds: Optional[List[str]], limit: int) -> List[Dict]:
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+
+        filters = ''
+        params = {'expression': expression, 'limit': limit}
+        if subject_id:
+            filters += ' AND d.subject_id = :subject_id'
+            params['subject_id'] = subject_id
+        if kinds:
+            filters += f" AND d.kind IN ({', '.join(f':kind_{i}' for i in range(len(kinds)))})"
+            params.update({f'kind_{i}': kind for i, kind in enumerate(kinds)})
+
+        rows = connection.execute(text(f"""
+            SELECT d.kind, d.ref_id, d.subject_id, d.parent_id, bm25(search_index, 4.0, 1.0) AS rank
+            FROM search_index
+            JOIN search_documents d ON d.doc_key = search_index.rowid
+            WHERE search_index MATCH :expression{filters}
+            ORDER BY rank
+            LIMIT :limit
+        """), params)
+        # bm25() is lower-is-better; flip it so higher scores rank first
+        return [dict(row._mapping, rank=-row.rank) for row in rows]
+
+
+class PostgresSearchBackend:
+    """Weighted tsvector column with a GIN index and ts_rank_cd ranking.
+
+    Only the tsvector is stored, not the title and body it was built from.
+    """
+
+    name = 'postgresql'
+
+    def ensure_schema(self, connection) -> bool:
+        exists = connection.execute(text("SELECT to_regclass('search_documents')")).scalar()
+        if exists:
+            copies_text = connection.execute(text(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_name = 'search_documents' AND column_name = 'body'"
+            )).first()
+            if not copies_text:
+                return False
+            # Built when the table kept its own copy of the text
+            connection.execute(text("DROP TABLE search_documents"))
+        connection.execute(text("""
+            CREATE TABLE search_documents (
+                doc_key BIGINT PRIMARY KEY,
+                kind VARCHAR(20) NOT NULL,
+                ref_id INTEGER NOT NULL,
+                subject_id INTEGER,
+                parent_id INTEGER,
+                document tsvector NOT NULL
+            )
+        """))
+        connection.execute(text(
+            "CREATE INDEX ix_search_documents_document ON search_documents USING GIN (document)"
+        ))
+        connection.execute(text(
+            "CREATE INDEX ix_search_documents_subject ON search_documents (subject_id)"
+        ))
+        return True
+
+    def upsert(self, connection, docs: List[Dict]) -> None:
+        connection.execute(text("""
+            INSERT INTO search_documents (doc_key, kind, ref_id, subject_id, parent_id, document)
+            VALUES (:doc_key, :kind, :ref_id, :subject_id, :parent_id,
+                    setweight(to_tsvector('english', :title), 'A') ||
+                    setweight(to_tsvector('english', :body), 'B'))
+            ON CONFLICT (doc_key) DO UPDATE SET
+                subject_id = EXCLUDED.subject_id,
+                parent_id = EXCLUDED.parent_id,
+                document = EXCLUDED.document
+        """), docs)
+
+    def delete(self, connection, keys: List[int]) -> None:
+        if keys:
+            connection.execute(
+                text("DELETE FROM search_documents WHERE doc_key = ANY(:keys)"),
+                {'keys': list(keys)}
+            )
+
+    def delete_subject(self, connection, subject_id: int) -> None:
+        connection.execute(
+            text("DELETE FROM search_documents WHERE subject_id = :subject_id"),
+            {'subject_id': subject_id}
+        )
+
+    def delete_children(self, connection, kind: str, parent_ids: List[int]) -> None:
+        if parent_ids:
+            connection.execute(
+                text("DELETE FROM search_documents WHERE kind = :kind AND parent_id = ANY(:parent_ids)"),
+                {'kind': kind, 'parent_ids': list(parent_ids)}
+            )
+
+    def clear(self, connection) -> None:
+        connection.execute(text("TRUNCATE search_documents"))
+
+    def query(self, connection, query: str, subject_id: Optional[int],
+              kinds: Optional[List[str]], limit: int) -> List[Dict]:
+        filters = ''
+        params = {'query': query, 'limit': limit}
+        if subject_id:
+            filters += ' AND subject_id = :subject_id'
+            params['subject_id'] = subject_id
+        if kinds:
+            filters += ' AND kind = ANY(:kinds)'
+            params['kinds'] = list(kinds)
+
+        rows = connection.execute(text(f"""
+            SELECT kind, ref_id, subject_id, parent_id, ts_rank_cd(document, q) AS rank
+            FROM search_documents, websearch_to_tsquery('english', :query) q
+            WHERE document @@ q{filters}
+            ORDER BY rank DESC
+            LIMIT :limit
+        """), params)
+        return [dict(row._mapping) for row in rows]
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend(),
+    'postgresql': PostgresSearchBackend(),
+}
+
+
+class SearchService:
+    """Keeps the full-text index in step with writes and answers queries."""
+
+    def __init__(self):
+        self._listening = False
+        self._disabled_urls = set()
+
+    def init_app(self, app) -> None:
+        """Create the index for the app's database and hook session writes.
+
+        The backend is picked from the engine dialect: FTS5 on SQLite,
+        tsvector/GIN on Postgres. A freshly created index is backfilled.
+        """
+        from app import db
+
+        @app.cli.command('search-reindex')
+        def reindex_command():
+            """Rebuild the full-text search index from scratch."""
+            print(f"Indexed {self.reindex()} documents")
+
+        with app.app_context():
+            backend = BACKENDS.get(db.engine.dialect.name)
+            if backend is None:
+                return
+            try:
+                with db.engine.begin() as connection:
+                    created = backend.ensure_schema(connection)
+            except Exception as e:
+                print(f"Search index unavailable: {e}")
+                self._disabled_urls.add(str(db.engine.url))
+                return
+            if created:
+                self.reindex()
+
+        if not self._listening:
+            event.listen(Session, 'after_flush', self._after_flush)
+            rows_inserted.connect(self._on_rows_inserted)
+            self._listening = True
+
+    def backend_for(self, connection):
+        if str(connection.engine.url) in self._disabled_urls:
+            return None
+        return BACKENDS.get(connection.dialect.name)
+
+    @property
+    def available(self) -> bool:
+        from app import db
+        return self.backend_for(db.session.connection()) is not None
+
+    def search(self, query: str, subject_id: Optional[int] = None,
+               kinds: Optional[List[str]] = None, limit: int = 20) -> List[Dict]:
+        """Ranked matches with highlighted titles and snippets."""
+        from app import db
+
+        connection = db.session.connection()
+        backend = self.backend_for(connection)
+        if backend is None:
+            raise RuntimeError('Search index is not available for this database')
+        results = backend.query(connection, query, subject_id, kinds, limit)
+
+        # The index keeps no text: highlight the returned rows from their source tables
+        texts = {}
+        for kind in {row['kind'] for row in results}:
+            texts[kind] = self._texts(kind, [row['ref_id'] for row in results if row['kind'] == kind])
+        matches = _matcher(query)
+        return [
+            {
+                'type': row['kind'],
+                'id': row['ref_id'],
+                'subject_id': row['subject_id'],
+                'parent_id': row['parent_id'],
+                'title': highlight(texts[row['kind']][row['ref_id']][0] or '', matches),
+                'snippet': snippet(texts[row['kind']][row['ref_id']][1] or '', matches),
+                'rank': round(float(row['rank']), 4)
+            }
+            for row in results if row['ref_id'] in texts[row['kind']]
+        ]
+
+    @staticmethod
+    def _texts(kind: str, ids: List[int]) -> Dict[int, tuple]:
+        """``{id: (title, body)}`` of documents of one kind, read from their source rows."""
+        from app import db
+        from app.models import Note, Lecture, Flashcard, QuizQuestion
+
+        columns = {
+            'note': (Note.id, Note.title, Note.content),
+            'lecture': (Lecture.id, Lecture.title, Lecture.transcription),
+            'flashcard': (Flashcard.id, Flashcard.front, Flashcard.back),
+            'question': (QuizQuestion.id, QuizQuestion.question, null()),
+        }[kind]
+        rows = db.session.execute(select(*columns).where(columns[0].in_(ids)))
+        return {ref_id: (title, body) for ref_id, title, body in rows}
+
+    def reindex(self) -> int:
+        """Rebuild the whole index from the source tables."""
+        from app import db
+        from app.models import Note, Lecture, Flashcard, FlashcardSet, Quiz, QuizQuestion
+
+        connection = db.session.connection()
+        backend = self.backend_for(connection)
+        if backend is None:
+            return 0
+
+        backend.clear(connection)
+        sources = [
+            ('note', select(Note.id, Note.subject_id, Note.lecture_id, Note.title, Note.content)),
+            ('lecture', select(Lecture.id, Lecture.subject_id, null(), Lecture.title, Lecture.transcription)),
+            ('flashcard', select(Flashcard.id, FlashcardSet.subject_id, Flashcard.flashcard_set_id,
+                                 Flashcard.front, Flashcard.back).join(FlashcardSet)),
+            ('question', select(QuizQuestion.id, Quiz.subject_id, QuizQuestion.quiz_id,
+                                QuizQuestion.question, null()).join(Quiz)),
+        ]
+        total = 0
+        for kind, statement in sources:
+            batch = []
+            for row in db.session.execute(statement.execution_options(yield_per=500)):
+                batch.append(self._document(kind, *row))
+                if len(batch) >= 500:
+                    backend.upsert(connection, batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                backend.upsert(connection, batch)
+                total += len(batch)
+        db.session.commit()
+        return total
+
+    @staticmethod
+    def _document(kind: str, ref_id: int, subject_id: Optional[int], parent_id: Optional[int],
+                  title: Optional[str], body: Optional[str]) -> Dict:
+        return {
+            'doc_key': doc_key(kind, ref_id),
+            'kind': kind,
+            'ref_id': ref_id,
+            'subject_id': subject_id,
+            'parent_id': parent_id,
+            'title': title or '',
+            'body': body or ''
+        }
+
+    def _documents_for(self, session, connection, objects: Iterable) -> List[Dict]:
+        """Build index documents for changed model instances."""
+        from app.models import Note, Lecture, Flashcard, FlashcardSet, Quiz, QuizQuestion
+
+        objects = list(objects)
+        # Resolve subjects of cards and questions with one query per parent type
+        set_ids = {o.flashcard_set_id for o in objects if isinstance(o, Flashcard)}
+        quiz_ids = {o.quiz_id for o in objects if isinstance(o, QuizQuestion)}
+        set_subjects = dict(connection.execute(
+            select(FlashcardSet.id, FlashcardSet.subject_id).where(FlashcardSet.id.in_(set_ids))
+        ).all()) if set_ids else {}
+        quiz_subjects = dict(connection.execute(
+            select(Quiz.id, Quiz.subject_id).where(Quiz.id.in_(quiz_ids))
+        ).all()) if quiz_ids else {}
+
+        docs = []
+        with session.no_autoflush:
+            for o in objects:
+                if isinstance(o, Note):
+                    docs.append(self._document('note', o.id, o.subject_id, o.lecture_id, o.title, o.content))
+                elif isinstance(o, Lecture):
+                    docs.append(self._document('lecture', o.id, o.subject_id, None, o.title, o.transcription))
+                elif isinstance(o, Flashcard):
+                    docs.append(self._document('flashcard', o.id, set_subjects.get(o.flashcard_set_id),
+                                               o.flashcard_set_id, o.front, o.back))
+                elif isinstance(o, QuizQuestion):
+                    docs.append(self._document('question', o.id, quiz_subjects.get(o.quiz_id),
+                                               o.quiz_id, o.question, None))
+        return docs
+
+    def _after_flush(self, session, flush_context) -> None:
+        """Apply index changes inside the same transaction as the write."""
+        from app.models import Subject
+
+        changed = [
+            o for o in session.new
+            if type(o).__name__ in INDEXED_ATTRIBUTES
+        ] + [
+            o for o in session.dirty
+            if type(o).__name__ in INDEXED_ATTRIBUTES and self._indexed_change(o)
+        ]
+        deleted = [o for o in session.deleted if type(o).__name__ in INDEXED_ATTRIBUTES]
+        deleted_subjects = [o.id for o in session.deleted if isinstance(o, Subject)]
+        deleted_parents = [o for o in session.deleted if type(o).__name__ in CASCADED_CHILDREN]
+        if not (changed or deleted or deleted_subjects or deleted_parents):
+            return
+
+        connection = session.connection()
+        backend = self.backend_for(connection)
+        if backend is None:
+            return
+
+        if changed:
+            backend.upsert(connection, self._documents_for(session, connection, changed))
+        if deleted:
+            backend.delete(connection, [doc_key(self._kind(o), o.id) for o in deleted])
+        for subject_id in deleted_subjects:
+            backend.delete_subject(connection, subject_id)
+        for kind in set(CASCADED_CHILDREN.values()):
+            backend.delete_children(connection, kind, [
+                o.id for o in deleted_parents if CASCADED_CHILDREN[type(o).__name__] == kind
+            ])
+
+    def _on_rows_inserted(self, model, rows: List[Dict], subject_id: int) -> None:
+        """Index rows written by set-based inserts, which skip flush hooks."""
+        from app import db
+
+        columns = {
+            'Note': ('note', 'lecture_id', 'title', 'content'),
+            'Lecture': ('lecture', None, 'title', 'transcription'),
+            'Flashcard': ('flashcard', 'flashcard_set_id', 'front', 'back'),
+            'QuizQuestion': ('question', 'quiz_id', 'question', None),
+        }.get(model.__name__)
+        if columns is None:
+            return
+
+        connection = db.session.connection()
+        backend = self.backend_for(connection)
+        if backend is None:
+            return
+
+        kind, parent, title, body = columns
+        backend.upsert(connection, [
+            self._document(
+                kind, row['id'], subject_id,
+                row.get(parent) if parent else None,
+                row.get(title), row.get(body) if body else None
+            )
+            for row in rows
+        ])
+
+    @staticmethod
+    def _indexed_change(obj) -> bool:
+        state = inspect(obj)
+        return any(
+            state.attrs[name].history.has_changes()
+            for name in INDEXED_ATTRIBUTES[type(obj).__name__]
+        )
+
+    @staticmethod
+    def _kind(obj) -> str:
+        return {
+            'Note': 'note',
+            'Lecture': 'lecture',
+            'Flashcard': 'flashcard',
+            'QuizQuestion': 'question',
+        }[type(obj).__name__]
+
+
+# Singleton instance
+search_service = SearchService()
@@ -0,0 +1,449 @@
+"""
+Sync Service - Change log and delta sync for offline clients
+"""
+from flask_sqlalchemy.session import Session
+from sqlalchemy import delete, event, insert, literal, select, text
+from sqlalchemy.orm import undefer
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.signals import rows_inserted
+from app.utils.fields import FieldSelection
+
+
+DEFAULT_SYNC_LIMIT = 1000
+MAX_SYNC_LIMIT = 5000
+MAX_PUSH_CHANGES = 1000
+CHUNK_SIZE = 500
+# Postgres advisory lock taken by every change-log write, so sequence
+# numbers become visible in the order they were handed out
+SYNC_LOCK_KEY = 0x53594E43
+
+# Synced models in parent-to-child order, and the kind stored for them
+KINDS = {
+    'Subject': 'subject',
+    'Note': 'note',
+    'FlashcardSet': 'flashcard_set',
+    'Quiz': 'quiz',
+    'Flashcard': 'flashcard',
+}
+COLLECTIONS = {
+    'subject': 'subjects',
+    'note': 'notes',
+    'flashcard_set': 'flashcard_sets',
+    'quiz': 'quizzes',
+    'flashcard': 'flashcards',
+}
+# Computed keys left out of synced items: they cost a query per row
+SYNC_FIELDS = FieldSelection(exclude=(
+    'lecture_count', 'note_count', 'flashcard_set_count', 'quiz_count', 'card_count',
+    'question_count', 'attempt_count', 'subject_name', 'lecture_title',
+))
+
+# What clients may write back: editable fields, those required on create,
+# and fields naming a parent (an id, or the ``ref`` of a create in the batch)
+WRITABLE = {
+    'subject': ('name', 'description', 'color'),
+    'note': ('title', 'content', 'tags', 'subject_id'),
+    'flashcard_set': ('title', 'description', 'subject_id'),
+    'quiz': ('title', 'description', 'subject_id'),
+    'flashcard': ('front', 'back', 'flashcard_set_id'),
+}
+REQUIRED = {
+    'subject': ('name',),
+    'note': ('title', 'content', 'subject_id'),
+    'flashcard_set': ('title', 'subject_id'),
+    'quiz': ('title', 'subject_id'),
+    'flashcard': ('front', 'back', 'flashcard_set_id'),
+}
+REFERENCES = {'subject_id': 'subject', 'flashcard_set_id': 'flashcard_set'}
+OPERATIONS = ('create', 'update', 'delete')
+
+
+def _models() -> Dict:
+    from app.models import Flashcard, FlashcardSet, Note, Quiz, Subject
+    return {'subject': Subject, 'note': Note, 'flashcard_set': FlashcardSet, 'quiz': Quiz, 'flashcard': Flashcard}
+
+
+def parse_token(value: Optional[str]) -> int:
+    """A client's change token; missing or empty means "from the beginning"."""
+    if value in (None, ''):
+        return 0
+    try:
+        token = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('since must be a change token returned by a previous sync')
+    if token < 0:
+        raise ValueError('since must be a change token returned by a previous sync')
+    return token
+
+
+def validate_changes(changes) -> List[Dict]:
+    """Check a batch of client changes; raises ValueError naming the bad entry."""
+    if not isinstance(changes, list) or not changes:
+        raise ValueError('changes must be a non-empty array')
+    if len(changes) > MAX_PUSH_CHANGES:
+        raise ValueError(f'At most {MAX_PUSH_CHANGES} changes per request')
+
+    refs = set()
+    validated = []
+    for n, change in enumerate(changes):
+        if not isinstance(change, dict):
+            raise ValueError(f'changes[{n}] must be an object')
+        kind, op = change.get('kind'), change.get('op')
+        if kind not in WRITABLE:
+            raise ValueError(f"changes[{n}]: kind must be one of: {', '.join(WRITABLE)}")
+        if op not in OPERATIONS:
+            raise ValueError(f"changes[{n}]: op must be one of: {', '.join(OPERATIONS)}")
+        data = change.get('data') or {}
+        if not isinstance(data, dict):
+            raise ValueError(f'changes[{n}]: data must be an object')
+        unknown = sorted(set(data) - set(WRITABLE[kind]))
+        if unknown:
+            raise ValueError(f"changes[{n}]: {kind} fields cannot include {', '.join(unknown)}")
+        base = change.get('base')
+        if base is not None and (not isinstance(base, int) or isinstance(base, bool) or base < 0):
+            raise ValueError(f'changes[{n}]: base must be a change token')
+
+        if op == 'create':
+            ref = change.get('ref')
+            if not isinstance(ref, str) or not ref or ref in refs:
+                raise ValueError(f'changes[{n}]: create needs a ref unique within the batch')
+            missing = [name for name in REQUIRED[kind] if data.get(name) in (None, '')]
+            if missing:
+                raise ValueError(f"changes[{n}]: {', '.join(missing)} required")
+            refs.add(ref)
+            entry = {'kind': kind, 'op': op, 'ref': ref, 'data': data}
+        else:
+            item_id = change.get('id')
+            if not isinstance(item_id, int) or isinstance(item_id, bool):
+                raise ValueError(f'changes[{n}]: id must be an integer')
+            entry = {'kind': kind, 'op': op, 'id': item_id, 'data': data if op == 'update' else {}, 'base': base}
+
+        for name, value in data.items():
+            if name in REFERENCES and isinstance(value, str) and value not in refs:
+                raise ValueError(f"changes[{n}]: {name} '{value}' is not the ref of an earlier create")
+            if name in REFERENCES and not isinstance(value, (int, str)):
+                raise ValueError(f'changes[{n}]: {name} must be an id or a ref')
+        validated.append(entry)
+    return validated
+
+
+class SyncService:
+    """Records a change log for offline clients and applies their edits.
+
+    Every create, update and delete of a synced item (through the ORM or
+    a bulk insert) replaces that item's row in ``change_log`` with one
+    carrying the next sequence number, or a tombstone. A sync reads the
+    entries after the client's token through the sequence index and
+    loads just those items, so its cost follows the number of changes.
+    Deleting a subject, set or quiz deletes its children by cascade
+    without their own tombstones; a parent's tombstone covers them.
+    Lectures are not synced, so the notes their deletion cascades to are
+    looked up before the flush and get tombstones of their own.
+    """
+
+    def __init__(self):
+        self._listening = False
+
+    def init_app(self, app) -> None:
+        """Seed the log with existing rows on first run and hook session writes."""
+        from app import db
+        from app.models import ChangeLogEntry, Subject
+
+        with app.app_context():
+            with db.engine.connect() as connection:
+                empty = connection.execute(select(
+                    ~select(ChangeLogEntry.seq).exists() & select(Subject.id).exists()
+                )).scalar()
+            if empty:
+                with db.engine.begin() as connection:
+                    self._backfill(connection)
+
+        if not self._listening:
+            event.listen(Session, 'before_flush', self._before_flush)
+            event.listen(Session, 'after_flush', self._after_flush)
+            rows_inserted.connect(self._on_rows_inserted)
+            self._listening = True
+
+    @staticmethod
+    def _backfill(connection) -> None:
+        """One entry per existing item, parents first."""
+        from app.models import ChangeLogEntry, Flashcard, FlashcardSet, Note, Quiz, Subject
+
+        sources = [
+            ('subject', Subject.id, Subject.id),
+            ('note', Note.id, Note.subject_id),
+            ('flashcard_set', FlashcardSet.id, FlashcardSet.subject_id),
+            ('quiz', Quiz.id, Quiz.subject_id),
+            ('flashcard', Flashcard.id, FlashcardSet.subject_id),
+        ]
+        now = datetime.utcnow()
+        for kind, item_id, subject_id in sources:
+            statement = select(literal(kind), item_id, subject_id, literal(False), literal(now))
+            if kind == 'flashcard':
+                statement = statement.select_from(Flashcard).join(FlashcardSet)
+            connection.execute(insert(ChangeLogEntry.__table__).from_select(
+                ['kind', 'item_id', 'subject_id', 'deleted', 'changed_at'], statement.order_by(item_id)
+            ))
+
+    # -- reads -------------------------------------------------------------------
+
+    def changes(self, since: int = 0, limit: int = DEFAULT_SYNC_LIMIT) -> Dict:
+        """Items created or updated, and ids deleted, after the ``since`` token."""
+        from app import db
+        from app.models import ChangeLogEntry, Note, Quiz, QuizQuestion
+
+        entries = db.session.execute(
+            select(ChangeLogEntry.seq, ChangeLogEntry.kind, ChangeLogEntry.item_id, ChangeLogEntry.deleted)
+            .where(ChangeLogEntry.seq > since)
+            .order_by(ChangeLogEntry.seq)
+            .limit(limit)
+        ).all()
+
+        upserts: Dict[str, List[int]] = {}
+        deleted: Dict[str, List[int]] = {}
+        for _, kind, item_id, is_deleted in entries:
+            (deleted if is_deleted else upserts).setdefault(kind, []).append(item_id)
+
+        models = _models()
+        changed = {collection: [] for collection in COLLECTIONS.values()}
+        for kind, ids in upserts.items():
+            model = models[kind]
+            query = model.query
+            if model is Note:
+                query = query.options(undefer(Note.content))
+            found = {}
+            for start in range(0, len(ids), CHUNK_SIZE):
+                found.update((o.id, o) for o in query.filter(model.id.in_(ids[start:start + CHUNK_SIZE])))
+            # Rows removed by a parent's cascade have no tombstone of their own
+            deleted.setdefault(kind, []).extend(i for i in ids if i not in found)
+            items = [found[i] for i in ids if i in found]
+            if model is Quiz:
+                questions: Dict[int, List[Dict]] = {}
+                for question in QuizQuestion.query.filter(QuizQuestion.quiz_id.in_(list(found))).order_by(QuizQuestion.id):
+                    questions.setdefault(question.quiz_id, []).append(question.to_dict())
+                changed['quizzes'] = [{**o.to_dict(SYNC_FIELDS), 'questions': questions.get(o.id, [])} for o in items]
+            elif kind == 'flashcard':
+                changed['flashcards'] = [o.to_dict() for o in items]
+            else:
+                changed[COLLECTIONS[kind]] = [o.to_dict(SYNC_FIELDS) for o in items]
+
+        return {
+            'changes': changed,
+            # Children first, so clients can apply deletions in order
+            'deleted': {COLLECTIONS[kind]: sorted(deleted.get(kind, [])) for kind in reversed(list(COLLECTIONS))},
+            'token': str(entries[-1].seq if entries else since),
+            'has_more': len(entries) == limit,
+        }
+
+    # -- client writes -------------------------------------------------------------
+
+    def apply_changes(self, changes: List[Dict]) -> Dict:
+        """Apply validated client changes in one transaction (the caller commits).
+
+        Creates run parents first so ``ref`` parents resolve to new ids.
+        An update or delete whose ``base`` token predates the item's last
+        server-side change is not applied and comes back as a conflict.
+        """
+        from app import db
+        from app.models import ChangeLogEntry
+
+        models = _models()
+        created: Dict[str, int] = {}
+        conflicts, missing = [], []
+
+        def resolve(data: Dict) -> Dict:
+            values = {name: created[value] if name in REFERENCES and isinstance(value, str) else value
+                      for name, value in data.items()}
+            if isinstance(values.get('tags'), list):
+                values['tags'] = ','.join(str(tag).strip() for tag in values['tags'] if str(tag).strip())
+            return values
+
+        self._check_parents(changes)
+
+        for kind in COLLECTIONS:
+            batch = [c for c in changes if c['op'] == 'create' and c['kind'] == kind]
+            if not batch:
+                continue
+            objects = [models[kind](**resolve(c['data'])) for c in batch]
+            db.session.add_all(objects)
+            db.session.flush()
+            created.update((c['ref'], o.id) for c, o in zip(batch, objects))
+
+        edits = [c for c in changes if c['op'] != 'create']
+        latest = {}
+        for kind in COLLECTIONS:
+            ids = [c['id'] for c in edits if c['kind'] == kind and c['base'] is not None]
+            for start in range(0, len(ids), CHUNK_SIZE):
+                latest.update(((kind, i), seq) for i, seq in db.session.execute(
+                    select(ChangeLogEntry.item_id, ChangeLogEntry.seq)
+                    .where(ChangeLogEntry.kind == kind, ChangeLogEntry.item_id.in_(ids[start:start + CHUNK_SIZE]))
+                ))
+        targets = {}
+        for kind in COLLECTIONS:
+            ids = [c['id'] for c in edits if c['kind'] == kind]
+            model = models[kind]
+            for start in range(0, len(ids), CHUNK_SIZE):
+                targets.update(((kind, o.id), o) for o in model.query.filter(model.id.in_(ids[start:start + CHUNK_SIZE])))
+
+        updated = deleted = 0
+        for change in edits:
+            key = (change['kind'], change['id'])
+            target = targets.get(key)
+            if target is None:
+                missing.append({'kind': change['kind'], 'id': change['id']})
+                continue
+            if change['base'] is not None and latest.get(key, 0) > change['base']:
+                conflicts.append({'kind': change['kind'], 'id': change['id'], 'server': self._serialize(target)})
+                continue
+            if change['op'] == 'delete':
+                db.session.delete(target)
+                targets.pop(key)
+                deleted += 1
+            else:
+                for name, value in resolve(change['data']).items():
+                    setattr(target, name, value)
+                updated += 1
+        db.session.flush()
+        return {'created': created, 'updated': updated, 'deleted': deleted,
+                'conflicts': conflicts, 'missing': missing}
+
+    @staticmethod
+    def _check_parents(changes: List[Dict]) -> None:
+        """Existing parents named by id must exist (one query per parent kind)."""
+        from app import db
+
+        models = _models()
+        for field, kind in REFERENCES.items():
+            ids = {c['data'][field] for c in changes if isinstance(c['data'].get(field), int)}
+            if not ids:
+                continue
+            model = models[kind]
+            found = set(db.session.execute(select(model.id).where(model.id.in_(ids))).scalars())
+            if ids - found:
+                raise ValueError(f"{field} {', '.join(map(str, sorted(ids - found)))} not found")
+
+    @staticmethod
+    def _serialize(obj) -> Dict:
+        return obj.to_dict() if type(obj).__name__ == 'Flashcard' else obj.to_dict(SYNC_FIELDS)
+
+    # -- change capture --------------------------------------------------------------
+
+    @staticmethod
+    def version(kind: str, item_id: int) -> Optional[int]:
+        """Sequence of an item's latest change, a cheap cross-worker version stamp."""
+        from app import db
+        from app.models import ChangeLogEntry
+
+        return db.session.execute(
+            select(ChangeLogEntry.seq).where(ChangeLogEntry.kind == kind, ChangeLogEntry.item_id == item_id)
+        ).scalar()
+
+    def record(self, connection, kind: str, item_ids: List[int]) -> None:
+        """Log updates made by set-based writes, which skip the flush hooks."""
+        self._write(connection, {(kind, i): (False, None) for i in item_ids})
+
+    @staticmethod
+    def _write(connection, entries: Dict[Tuple[str, int], Tuple[bool, Optional[int]]]) -> None:
+        """Replace each item's log entry with a fresh one (or a tombstone)."""
+        from app.models import ChangeLogEntry, Flashcard, FlashcardSet
+
+        if not entries:
+            return
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': SYNC_LOCK_KEY})
+
+        models = _models()
+        log = ChangeLogEntry.__table__
+        now = datetime.utcnow()
+        rows = []
+        for kind in COLLECTIONS:
+            items = {item_id: value for (k, item_id), value in entries.items() if k == kind}
+            if not items:
+                continue
+            # Subjects of live rows; deleted rows bring theirs along
+            unresolved = [i for i, (is_deleted, subject_id) in items.items() if subject_id is None and not is_deleted]
+            subjects = {}
+            for start in range(0, len(unresolved), CHUNK_SIZE):
+                chunk = unresolved[start:start + CHUNK_SIZE]
+                if kind == 'flashcard':
+                    statement = select(Flashcard.id, FlashcardSet.subject_id).join(FlashcardSet)
+                else:
+                    model = models[kind]
+                    statement = select(model.id, model.id if kind == 'subject' else model.subject_id)
+                subjects.update(connection.execute(
+                    statement.where(models[kind].id.in_(chunk))
+                ).all())
+            ids = sorted(items)
+            for start in range(0, len(ids), CHUNK_SIZE):
+                connection.execute(delete(log).where(log.c.kind == kind, log.c.item_id.in_(ids[start:start + CHUNK_SIZE])))
+            rows.extend(
+                {'kind': kind, 'item_id': i, 'subject_id': items[i][1] or subjects.get(i),
+                 'deleted': items[i][0], 'changed_at': now}
+                for i in ids
+            )
+        connection.execute(insert(log), rows)
+
+        # A subject's tombstone stands for everything that was under it
+        gone = [i for (kind, i), (is_deleted, _) in entries.items() if kind == 'subject' and is_deleted]
+        if gone:
+            connection.execute(delete(log).where(log.c.subject_id.in_(gone), log.c.kind != 'subject'))
+
+    @staticmethod
+    def _before_flush(session, flush_context, instances) -> None:
+        """Find notes of deleted lectures while the database still has them."""
+        from app.models import Lecture, Note
+
+        lecture_ids = [o.id for o in session.deleted if isinstance(o, Lecture)]
+        notes = []
+        if lecture_ids:
+            with session.no_autoflush:
+                notes = session.execute(
+                    select(Note.id, Note.subject_id).where(Note.lecture_id.in_(lecture_ids))
+                ).all()
+        session.info['sync_cascaded_notes'] = notes
+
+    def _after_flush(self, session, flush_context) -> None:
+        from app.models import QuizQuestion
+
+        entries: Dict[Tuple[str, int], Tuple[bool, Optional[int]]] = {
+            ('note', note_id): (True, subject_id)
+            for note_id, subject_id in session.info.pop('sync_cascaded_notes', None) or ()
+        }
+        quiz_ids = set()
+
+        def subject_of(obj) -> Optional[int]:
+            if type(obj).__name__ == 'Subject':
+                return obj.id
+            return getattr(obj, 'subject_id', None)
+
+        for obj in [*session.new, *session.dirty]:
+            if isinstance(obj, QuizQuestion):
+                quiz_ids.add(obj.quiz_id)
+            elif type(obj).__name__ in KINDS and (obj in session.new or session.is_modified(obj)):
+                entries[(KINDS[type(obj).__name__], obj.id)] = (False, subject_of(obj))
+        for obj in session.deleted:
+            if isinstance(obj, QuizQuestion):
+                quiz_ids.add(obj.quiz_id)
+            elif type(obj).__name__ in KINDS:
+                entries[(KINDS[type(obj).__name__], obj.id)] = (True, subject_of(obj))
+        # Questions travel inside their quiz
+        for quiz_id in quiz_ids:
+            entries.setdefault(('quiz', quiz_id), (False, None))
+        self._write(session.connection(), entries)
+
+    def _on_rows_inserted(self, model, rows: List[Dict], subject_id: int) -> None:
+        from app import db
+
+        if model.__name__ == 'QuizQuestion':
+            entries = {('quiz', row['quiz_id']): (False, subject_id) for row in rows}
+        elif model.__name__ in KINDS:
+            entries = {(KINDS[model.__name__], row['id']): (False, subject_id) for row in rows}
+        else:
+            return
+        self._write(db.session.connection(), entries)
+
+
+# Singleton instance
+sync_service = SyncService()
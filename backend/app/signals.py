@@ -0,0 +1,13 @@
+"""
+Application signals for AI Study Companion
+
+Set-based writes (bulk inserts, imports) bypass the ORM unit of work, so
+session flush hooks never see them. They announce themselves here instead.
+"""
+from blinker import Namespace
+
+_signals = Namespace()
+
+# Sent with the model class as sender and ``rows`` (inserted values including
+# primary keys) and ``subject_id`` as keyword arguments.
+rows_inserted = _signals.signal('rows-inserted')
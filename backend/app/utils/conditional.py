@@ -0,0 +1,191 @@
+"""
+Conditional GET (ETag / Last-Modified) for polled resources
+
+Validators come from ``etag_at`` columns, read with one small query
+before anything is serialized. ``etag_at`` moves with the row's own
+``updated_at``; bodies also embed data from related rows (counts, parent
+names, a set's cards), so writes to those rows "touch" the parent's
+``etag_at`` in the same transaction. ``updated_at`` is left alone, so a
+flashcard review does not reorder set lists or move their cursors.
+"""
+from flask import Response, g, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, func, inspect, select, update
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Set, Tuple
+import hashlib
+
+from app.signals import rows_inserted
+
+
+# Child model -> (foreign key attribute, parent model) pairs whose serialized
+# form depends on the child
+PARENTS = {
+    'Lecture': (('subject_id', 'Subject'),),
+    'Note': (('subject_id', 'Subject'), ('lecture_id', 'Lecture')),
+    'FlashcardSet': (('subject_id', 'Subject'),),
+    'Quiz': (('subject_id', 'Subject'),),
+    'Flashcard': (('flashcard_set_id', 'FlashcardSet'),),
+}
+
+# Parents whose bodies embed full child rows rather than just counts
+EMBEDS_CHILDREN = {'Flashcard'}
+
+# Rows whose serialized form names their parents (subject_name, lecture_title)
+NAMED_PARENTS = {
+    'Subject': (),
+    'Lecture': (('subject_id', 'Subject'),),
+    'Note': (('subject_id', 'Subject'), ('lecture_id', 'Lecture')),
+    'FlashcardSet': (('subject_id', 'Subject'),),
+}
+
+
+def _models() -> Dict:
+    from app import models
+    return {name: getattr(models, name) for name in NAMED_PARENTS}
+
+
+def _etag_at(model):
+    # Rows written before the column existed fall back to updated_at
+    return func.coalesce(model.etag_at, model.updated_at)
+
+
+def make_etag(*parts, query: bool = True) -> str:
+    """Opaque validator for a version tuple (and the request's query string)."""
+    raw = repr(parts)
+    if query:
+        # ?fields= / ?view= / ?cursor= select different representations
+        raw += request.query_string.decode()
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def resource_version(model, row_id: int) -> Optional[Tuple]:
+    """``(id, etag_at, parent etag_at...)`` for one row, or None if missing."""
+    from app import db
+
+    models = _models()
+    columns = [model.id, _etag_at(model)]
+    statement = select(model.id).where(model.id == row_id)
+    for attribute, parent_name in NAMED_PARENTS[model.__name__]:
+        parent = models[parent_name]
+        columns.append(
+            select(_etag_at(parent))
+            .where(parent.id == getattr(model, attribute))
+            .scalar_subquery()
+        )
+    return db.session.execute(statement.with_only_columns(*columns)).first()
+
+
+def collection_version(query, model) -> Tuple:
+    """``(count, max(etag_at), parents' max(etag_at)...)`` for a filtered query."""
+    models = _models()
+    columns = [func.count(model.id), func.max(_etag_at(model))]
+    for _, parent_name in NAMED_PARENTS[model.__name__]:
+        parent = models[parent_name]
+        columns.append(select(func.max(_etag_at(parent))).scalar_subquery())
+    return tuple(query.order_by(None).with_entities(*columns).one())
+
+
+def not_modified(version: Optional[Tuple], weak: bool = False) -> Optional[Response]:
+    """Answer a conditional GET from a version tuple before serializing.
+
+    Returns a ``304`` response when the client's copy is current, else
+    None after remembering the validators for ``after_request``. Detail
+    versions carry ``(id, etag_at, ...)`` and also yield
+    Last-Modified; collection versions (``weak=True``) only an ETag,
+    since a delete can shrink a collection without moving its max.
+    """
+    if version is None:
+        return None
+
+    etag = make_etag(*version)
+    last_modified = None
+    if not weak:
+        stamps = [v for v in version[1:] if isinstance(v, datetime)]
+        if stamps:
+            last_modified = max(stamps).replace(tzinfo=timezone.utc, microsecond=0)
+    g.conditional = (etag, weak, last_modified)
+
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    elif last_modified and request.if_modified_since:
+        fresh = last_modified <= request.if_modified_since
+    else:
+        fresh = False
+    if not fresh:
+        return None
+
+    response = Response(status=304)
+    _set_validators(response, etag, weak, last_modified)
+    return response
+
+
+def _set_validators(response, etag: str, weak: bool, last_modified: Optional[datetime]) -> None:
+    response.set_etag(etag, weak=weak)
+    if last_modified:
+        response.last_modified = last_modified
+    # Clients may reuse a copy, but must revalidate it first
+    response.cache_control.no_cache = True
+
+
+def init_conditional_requests(app) -> None:
+    """Attach the validators computed by ``not_modified`` to 200 responses."""
+
+    @app.after_request
+    def add_validators(response):
+        conditional = getattr(g, 'conditional', None)
+        if conditional and response.status_code == 200 and request.method in ('GET', 'HEAD'):
+            _set_validators(response, *conditional)
+        return response
+
+
+def _touched_parents(objects: Iterable, updated: bool) -> Dict[str, Set[int]]:
+    """Parent ids whose bodies change with these inserted/deleted or updated rows."""
+    touched: Dict[str, Set[int]] = {}
+    for obj in objects:
+        name = type(obj).__name__
+        if name not in PARENTS:
+            continue
+        state = inspect(obj)
+        for attribute, parent_name in PARENTS[name]:
+            history = state.attrs[attribute].history
+            # A moved row changes both its old and its new parent
+            parent_ids = [*history.added, *history.deleted]
+            if not updated or name in EMBEDS_CHILDREN:
+                parent_ids += history.unchanged
+            touched.setdefault(parent_name, set()).update(i for i in parent_ids if i is not None)
+    return touched
+
+
+def _touch(connection, touched: Dict[str, Set[int]]) -> None:
+    models = _models()
+    now = datetime.utcnow()
+    for parent_name, ids in touched.items():
+        table = models[parent_name].__table__
+        # updated_at is set to itself so its onupdate default does not fire
+        connection.execute(
+            update(table).where(table.c.id.in_(ids)).values(etag_at=now, updated_at=table.c.updated_at)
+        )
+
+
+@event.listens_for(Session, 'after_flush')
+def _touch_after_flush(session, flush_context):
+    touched = _touched_parents([*session.new, *session.deleted], updated=False)
+    for parent_name, ids in _touched_parents(session.dirty, updated=True).items():
+        touched.setdefault(parent_name, set()).update(ids)
+    touched = {name: ids for name, ids in touched.items() if ids}
+    if touched:
+        _touch(session.connection(), touched)
+
+
+@rows_inserted.connect
+def _touch_after_bulk_insert(model, rows, subject_id):
+    from app import db
+
+    touched: Dict[str, Set[int]] = {}
+    for attribute, parent_name in PARENTS.get(model.__name__, ()):
+        ids = {row[attribute] for row in rows if row.get(attribute) is not None}
+        if ids:
+            touched[parent_name] = ids
+    if touched:
+        _touch(db.session.connection(), touched)
@@ -0,0 +1,265 @@
+"""
+Database engine and schema helpers
+"""
+from flask import has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.schema import CreateColumn
+from contextlib import contextmanager
+from typing import Dict, List
+from app.utils.serialization import decode, encode
+import os
+import random
+import time
+
+
+REPLICA_BIND_PREFIX = 'replica_'
+STICKY_COOKIE = 'db_primary_until'
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def sqlite_pragmas() -> dict:
+    """Per-connection SQLite settings for multi-worker deployments.
+
+    WAL lets readers proceed while one writer commits, and the busy timeout
+    makes concurrent writers wait for the lock instead of failing with
+    "database is locked". Foreign keys are off by default in SQLite; the
+    models rely on ON DELETE CASCADE.
+    """
+    return {
+        'foreign_keys': 'ON',
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000),
+        'mmap_size': _env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+        # Negative values are KiB rather than pages
+        'cache_size': -_env_int('SQLITE_CACHE_SIZE_KB', 64 * 1024),
+        'temp_store': 'MEMORY',
+    }
+
+
+def _json_serializer(value) -> str:
+    return encode(value).decode('utf-8')
+
+
+def engine_options(database_url: str) -> dict:
+    """``SQLALCHEMY_ENGINE_OPTIONS`` for the configured database.
+
+    Postgres pool sizing and statement timeout come from ``DB_POOL_SIZE``,
+    ``DB_MAX_OVERFLOW``, ``DB_POOL_TIMEOUT``, ``DB_POOL_RECYCLE`` and
+    ``DB_STATEMENT_TIMEOUT_MS``. JSON columns use the app's fast encoder.
+    """
+    json_options = {'json_serializer': _json_serializer, 'json_deserializer': decode}
+
+    if database_url.startswith('sqlite'):
+        return {
+            **json_options,
+            'connect_args': {
+                # pysqlite's own lock wait, in seconds
+                'timeout': _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000,
+            }
+        }
+
+    if database_url.startswith('postgresql'):
+        options = {
+            **json_options,
+            'pool_size': _env_int('DB_POOL_SIZE', 5),
+            'max_overflow': _env_int('DB_MAX_OVERFLOW', 10),
+            'pool_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+            'pool_recycle': _env_int('DB_POOL_RECYCLE', 1800),
+            'pool_pre_ping': True,
+        }
+        statement_timeout = _env_int('DB_STATEMENT_TIMEOUT_MS', 30000)
+        if statement_timeout:
+            options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+        return options
+
+    return {**json_options, 'pool_pre_ping': True}
+
+
+def configure_engine(engine) -> None:
+    """Apply connection-level tuning that engine options cannot express."""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    pragmas = sqlite_pragmas()
+    in_memory = engine.url.database in (None, '', ':memory:')
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            if in_memory and name == 'journal_mode':
+                continue
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def create_missing_columns(engine, metadata) -> None:
+    """Add nullable columns declared on already-existing tables.
+
+    ``create_all`` skips tables that exist, so columns added to a model
+    later would be missing from existing databases. Only nullable columns
+    are added here; anything stricter needs a maintenance command.
+    """
+    inspector = inspect(engine)
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            ddl = CreateColumn(column).compile(dialect=engine.dialect)
+            try:
+                with engine.begin() as connection:
+                    connection.execute(text(
+                        f'ALTER TABLE {engine.dialect.identifier_preparer.format_table(table)} ADD COLUMN {ddl}'
+                    ))
+            except (OperationalError, ProgrammingError):
+                # Another worker added it between the check and the ALTER
+                pass
+
+
+def create_missing_indexes(engine, metadata) -> None:
+    """Create indexes declared on already-existing tables.
+
+    ``create_all`` only emits CREATE INDEX together with CREATE TABLE, so
+    indexes added to a model later would never reach existing databases.
+    """
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except (OperationalError, ProgrammingError):
+                # Another worker created it between the check and the CREATE
+                pass
+
+
+def upsert(connection, table, keys: List[str], rows: List[Dict], replace: bool = False) -> None:
+    """INSERT ... ON CONFLICT that adds the given deltas (or overwrites with ``replace``)."""
+    if not rows:
+        return
+    columns = sorted({name for row in rows for name in row} - set(keys))
+    rows = [{**{name: 0 for name in columns}, **row} for row in rows]
+    insert = postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=keys,
+        set_={
+            name: statement.excluded[name] if replace else table.c[name] + statement.excluded[name]
+            for name in columns
+        }
+    )
+    connection.execute(statement, rows)
+
+
+def replica_binds(replica_urls: str) -> dict:
+    """``SQLALCHEMY_BINDS`` entries for a comma separated list of replica URLs."""
+    binds = {}
+    urls = [url.strip() for url in (replica_urls or '').split(',') if url.strip()]
+    for n, url in enumerate(urls):
+        if url.startswith('postgresql://'):
+            url = url.replace('postgresql://', 'postgresql+psycopg://', 1)
+        binds[f'{REPLICA_BIND_PREFIX}{n}'] = {'url': url, **engine_options(url)}
+    return binds
+
+
+class RoutingSession(Session):
+    """Session that sends reads to a replica and everything else to the primary.
+
+    Reads go to a replica during GET/HEAD requests and inside
+    ``read_only()``, unless they run inside ``primary()``, this session has
+    already written or the client wrote within the last
+    ``REPLICA_STICKY_SECONDS`` (read-your-writes).
+    Flushes and INSERT/UPDATE/DELETE statements always use the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or engine is not self._db.engines.get(None):
+            return engine
+
+        if getattr(clause, 'is_dml', False):
+            self.info['wrote'] = True
+            return engine
+        if self._flushing or self.info.get('wrote') or not self._replica_allowed():
+            return engine
+
+        replicas = [e for key, e in self._db.engines.items()
+                    if key and key.startswith(REPLICA_BIND_PREFIX)]
+        if not replicas:
+            return engine
+        # One replica per session keeps reads within a request consistent
+        if 'replica' not in self.info:
+            self.info['replica'] = random.choice(replicas)
+        return self.info['replica']
+
+    def _replica_allowed(self) -> bool:
+        if self.info.get('primary'):
+            return False
+        if self.info.get('read_only'):
+            return True
+        if not has_request_context() or request.method not in ('GET', 'HEAD'):
+            return False
+        primary_until = request.cookies.get(STICKY_COOKIE, type=float)
+        return not primary_until or primary_until < time.time()
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_session_wrote(session, flush_context):
+    session.info['wrote'] = True
+
+
+@contextmanager
+def read_only():
+    """Route the enclosed queries to a replica, even outside GET requests."""
+    from app import db
+
+    session = db.session()
+    previous = session.info.get('read_only')
+    session.info['read_only'] = True
+    try:
+        yield session
+    finally:
+        session.info['read_only'] = previous
+
+
+@contextmanager
+def primary():
+    """Route the enclosed queries to the primary, even during GET requests."""
+    from app import db
+
+    session = db.session()
+    previous = session.info.get('primary')
+    session.info['primary'] = True
+    try:
+        yield session
+    finally:
+        session.info['primary'] = previous
+
+
+def init_replica_routing(app) -> None:
+    """Set the read-your-writes cookie after requests that wrote."""
+    from app import db
+
+    sticky_seconds = float(app.config.get('REPLICA_STICKY_SECONDS', 5))
+
+    @app.after_request
+    def mark_primary_sticky(response):
+        if db.session().info.get('wrote'):
+            # The SPA is served from another site in production, so over HTTPS
+            # the cookie must be SameSite=None (sent with credentials: 'include')
+            secure = request.is_secure or request.headers.get('X-Forwarded-Proto', '').startswith('https')
+            response.set_cookie(
+                STICKY_COOKIE, str(time.time() + sticky_seconds),
+                max_age=int(sticky_seconds) + 1, httponly=True, secure=secure,
+                samesite='None' if secure else 'Lax'
+            )
+        return response
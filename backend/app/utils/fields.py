@@ -0,0 +1,67 @@
+"""
+Sparse fieldset support for list and detail endpoints
+"""
+from flask import request
+from sqlalchemy.orm import defer, undefer
+from typing import Iterable, List, Optional
+
+
+VIEWS = ('summary', 'full')
+
+
+class FieldSelection:
+    """The set of keys a client asked to have serialized.
+
+    ``include`` of None means "every key"; ``exclude`` always wins.
+    """
+
+    def __init__(self, include: Optional[Iterable[str]] = None, exclude: Iterable[str] = ()):
+        self.include = frozenset(include) if include is not None else None
+        self.exclude = frozenset(exclude)
+
+    def __contains__(self, name: str) -> bool:
+        if name in self.exclude:
+            return False
+        return self.include is None or name in self.include
+
+    def filter(self, data: dict) -> dict:
+        """Drop keys that were not requested."""
+        if self.include is None and not self.exclude:
+            return data
+        return {key: value for key, value in data.items() if key in self}
+
+
+ALL_FIELDS = FieldSelection()
+
+
+def requested_fields(model, default_view: str = 'full') -> FieldSelection:
+    """Resolve ``?fields=a,b`` or ``?view=summary|full`` for a model.
+
+    ``fields`` takes precedence over ``view``. The summary view leaves out
+    the model's large text columns (``__deferrable__``).
+    """
+    fields = request.args.get('fields')
+    if fields:
+        names = {name.strip() for name in fields.split(',') if name.strip()}
+        # Always keep the primary key so clients can fetch the full row later
+        names.add('id')
+        return FieldSelection(include=names)
+
+    view = request.args.get('view', default_view)
+    if view not in VIEWS:
+        raise ValueError(f"view must be one of: {', '.join(VIEWS)}")
+    if view == 'summary':
+        return FieldSelection(exclude=getattr(model, '__deferrable__', ()))
+    return ALL_FIELDS
+
+
+def load_options(model, fields: FieldSelection) -> List:
+    """Loader options that keep unrequested large columns out of the SELECT.
+
+    Requested ones are undeferred so they arrive with the row instead of
+    costing one extra query per row.
+    """
+    return [
+        undefer(getattr(model, column)) if column in fields else defer(getattr(model, column))
+        for column in getattr(model, '__deferrable__', ())
+    ]
@@ -0,0 +1,102 @@
+"""
+Keyset (cursor) pagination for collection endpoints
+"""
+from flask import request, jsonify
+from sqlalchemy import tuple_
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple
+from urllib.parse import urlencode
+import base64
+import json
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class Page:
+    """One page of results plus the opaque cursor for the next one."""
+
+    def __init__(self, items: List[Any], next_cursor: Optional[str]):
+        self.items = items
+        self.next_cursor = next_cursor
+
+
+def encode_cursor(sort_value: Any, row_id: Any) -> str:
+    """Encode a (sort value, id) position as an opaque URL-safe token."""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, id_type: type = int) -> Tuple[datetime, Any]:
+    """Decode a token produced by ``encode_cursor`` whose id is an ``id_type``."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        # bool is an int to isinstance but never a row id
+        if not isinstance(row_id, id_type) or isinstance(row_id, bool):
+            raise TypeError(row_id)
+        return datetime.fromisoformat(sort_value), row_id
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+
+def page_size() -> int:
+    """Requested page size (``?limit=``), clamped to ``MAX_PAGE_SIZE``."""
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def paginate(
+    query,
+    sort_column,
+    id_column,
+    key: Callable[[Any], Tuple[Any, Any]],
+    descending: bool = True,
+    having: bool = False
+) -> Page:
+    """Apply ``?cursor=`` / ``?limit=`` to a query ordered by (sort, id).
+
+    Seeks past the cursor position instead of using OFFSET, so every page
+    is an index range scan no matter how deep the client has paged.
+    ``key`` extracts the (sort value, id) pair from a result row and
+    ``having`` seeks on an aggregate sort column.
+    """
+    limit = page_size()
+    cursor = request.args.get('cursor')
+
+    if cursor:
+        position = tuple_(sort_column, id_column)
+        bound = tuple_(*decode_cursor(cursor, id_column.type.python_type))
+        condition = position < bound if descending else position > bound
+        query = query.having(condition) if having else query.filter(condition)
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    items = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(*key(items[-1]))
+
+    return Page(items, next_cursor)
+
+
+def paginated_response(body: Any, page: Page):
+    """Build a JSON response carrying the next cursor in the headers.
+
+    The body keeps its existing shape; clients follow ``X-Next-Cursor``
+    (or the ``Link: rel="next"`` header) until it is absent.
+    """
+    response = jsonify(body)
+    if page.next_cursor:
+        response.headers['X-Next-Cursor'] = page.next_cursor
+        args = request.args.to_dict()
+        args['cursor'] = page.next_cursor
+        response.headers['Link'] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+    return response
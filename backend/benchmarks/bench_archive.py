@@ -0,0 +1,92 @@
+"""
+Benchmark: export and re-import of a large subject.
+
+Builds one subject with lectures carrying long transcripts, notes, sets of
+flashcards with review history and a few quizzes, then times streaming
+the subject out as a gzip NDJSON archive and importing that archive back
+as a new subject.
+
+    cd backend
+    python benchmarks/bench_archive.py --cards 10000 --lectures 200
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cards', type=int, default=10000)
+    parser.add_argument('--lectures', type=int, default=200)
+    parser.add_argument('--transcript-words', type=int, default=8000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench.db'
+
+    from app import create_app, db
+    from app.models import Subject
+    from app.services.archive_service import archive_service
+    from app.services.bulk_service import bulk_service
+    from app.models import Lecture, Note, FlashcardSet, Flashcard, Quiz, QuizQuestion
+
+    app = create_app()
+    rng = random.Random(1)
+    vocabulary = [''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(3, 9))) for _ in range(5000)]
+
+    def text(words: int) -> str:
+        return ' '.join(rng.choices(vocabulary, k=words))
+
+    with app.app_context():
+        subject = Subject(name='Benchmark')
+        db.session.add(subject)
+        db.session.flush()
+        sid = subject.id
+
+        lectures = [{'subject_id': sid, 'title': f'Lecture {n}', 'source_type': 'upload',
+                     'transcription': text(args.transcript_words)}
+                    for n in range(args.lectures)]
+        bulk_service.insert_rows(Lecture, lectures, sid)
+        bulk_service.insert_rows(Note, [
+            {'subject_id': sid, 'lecture_id': lecture['id'], 'title': lecture['title'], 'content': text(400)}
+            for lecture in lectures
+        ], sid)
+        sets = [{'subject_id': sid, 'title': f'Set {n}'} for n in range(max(args.cards // 100, 1))]
+        bulk_service.insert_rows(FlashcardSet, sets, sid)
+        for offset in range(0, args.cards, 1000):
+            bulk_service.insert_rows(Flashcard, [
+                {'flashcard_set_id': sets[n % len(sets)]['id'], 'front': text(8), 'back': text(20),
+                 'review_count': n % 7, 'ease_factor': 2.5}
+                for n in range(offset, min(offset + 1000, args.cards))
+            ], sid)
+        quizzes = [{'subject_id': sid, 'title': f'Quiz {n}'} for n in range(20)]
+        bulk_service.insert_rows(Quiz, quizzes, sid)
+        bulk_service.insert_rows(QuizQuestion, [
+            {'quiz_id': quiz['id'], 'question': text(15), 'question_type': 'short_answer',
+             'correct_answer': text(3), 'points': 1}
+            for quiz in quizzes for _ in range(25)
+        ], sid)
+        db.session.commit()
+
+        print(f'{args.lectures} lectures x {args.transcript_words} words, {args.cards} cards\n')
+
+        start = time.perf_counter()
+        archive = b''.join(archive_service.export_subject(sid))
+        export_ms = (time.perf_counter() - start) * 1000
+        print(f'{"export (streamed)":<24} {export_ms:>10.1f} ms   {len(archive) / 1e6:.1f} MB gzip')
+
+        start = time.perf_counter()
+        result = archive_service.import_subject(io.BytesIO(archive), name='Benchmark copy')
+        db.session.commit()
+        import_ms = (time.perf_counter() - start) * 1000
+        print(f'{"import (one transaction)":<24} {import_ms:>10.1f} ms   {result["counts"]}')
+
+
+if __name__ == '__main__':
+    main()
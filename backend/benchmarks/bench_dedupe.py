@@ -0,0 +1,101 @@
+"""
+Benchmark: near-duplicate checks against a large subject.
+
+Fills one subject with synthetic cards (a share of them light rewordings
+of others), then times indexing them, checking a batch of new cards
+against the LSH index, the same check done by shingling and comparing
+against every card in the subject, and a dry-run dedupe pass.
+
+    cd backend
+    python benchmarks/bench_dedupe.py --cards 50000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+def timed(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f'{label:<38} {(time.perf_counter() - start) * 1000:>10.1f} ms')
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cards', type=int, default=50000)
+    parser.add_argument('--batch', type=int, default=20, help='New cards checked per lookup')
+    parser.add_argument('--duplicate-share', type=float, default=0.05)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench.db'
+
+    from sqlalchemy import select
+    from app import create_app, db
+    from app.models import Flashcard, FlashcardSet, Subject
+    from app.services.bulk_service import bulk_service
+    from app.services.dedupe_service import DUPLICATE_THRESHOLD, dedupe_service, item_text, normalize
+
+    rng = random.Random(1)
+    words = [''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(3, 10))) for _ in range(5000)]
+
+    def card():
+        return {'front': f"What does {' '.join(rng.choices(words, k=4))} do?",
+                'back': ' '.join(rng.choices(words, k=8))}
+
+    cards = []
+    for _ in range(args.cards):
+        if cards and rng.random() < args.duplicate_share:
+            source = rng.choice(cards)
+            cards.append({'front': source['front'].upper(), 'back': source['back'] + '.'})
+        else:
+            cards.append(card())
+    batch = [card() for _ in range(args.batch // 2)] + [dict(c) for c in rng.sample(cards, args.batch // 2)]
+
+    app = create_app()
+    with app.app_context():
+        subject = Subject(name='Bench')
+        db.session.add(subject)
+        db.session.flush()
+        card_set = FlashcardSet(title='Bench', subject_id=subject.id)
+        db.session.add(card_set)
+        db.session.commit()
+
+        print(f'{args.cards} cards in one subject, batches of {args.batch}\n')
+
+        def insert():
+            for start in range(0, len(cards), 5000):
+                bulk_service.insert_flashcards(card_set, cards[start:start + 5000])
+            db.session.commit()
+        timed('insert + index', insert)
+
+        matches = timed('LSH lookup', lambda: dedupe_service.find_duplicates(
+            'flashcard', subject.id, [item_text('flashcard', c) for c in batch]))
+
+        def pairwise():
+            def shingles(text):
+                text = normalize(text)
+                return {text[i:i + 4] for i in range(max(len(text) - 3, 1))}
+            existing = [shingles(f'{f} {b}') for f, b in db.session.execute(
+                select(Flashcard.front, Flashcard.back).where(Flashcard.flashcard_set_id == card_set.id))]
+            found = 0
+            for c in batch:
+                new = shingles(item_text('flashcard', c))
+                found += any(len(new & old) / len(new | old) >= DUPLICATE_THRESHOLD for old in existing)
+            return found
+        exact = timed('pairwise Jaccard scan', pairwise)
+        print(f'  duplicates found: LSH {sum(m is not None for m in matches)}, pairwise {exact}')
+
+        result = timed('dedupe pass (dry run)', lambda: dedupe_service.dedupe(subject.id))
+        print(f"  {len(result['clusters'])} clusters, {result['would_remove']} cards to remove")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: latency of fetching the next due flashcards.
+
+Fills a database with cards spread over several subjects (a share of them
+never reviewed, the rest due anywhere in the past or next two months),
+then times the next 20 due cards with and without a subject filter: the
+old NULL-aware query without the due indexes, the indexed lookup, and
+the precomputed due queue.
+
+    cd backend
+    python benchmarks/bench_due_queue.py --cards 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def timed(fn, repeat: int) -> float:
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cards', type=int, default=1000000)
+    parser.add_argument('--subjects', type=int, default=20)
+    parser.add_argument('--sets-per-subject', type=int, default=10)
+    parser.add_argument('--new-share', type=float, default=0.05, help='Share of never-reviewed cards')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench.db'
+
+    from sqlalchemy import insert
+    from app import create_app, db
+    from app.models import Flashcard, FlashcardSet, Subject, NEW_CARD_DUE
+    from app.services.due_queue_service import due_queue_service
+
+    app = create_app()
+    rng = random.Random(1)
+    now = datetime.utcnow()
+    with app.app_context():
+        set_ids, subject_ids = [], []
+        for s in range(args.subjects):
+            subject = Subject(name=f'Subject {s}')
+            db.session.add(subject)
+            db.session.flush()
+            subject_ids.append(subject.id)
+            for k in range(args.sets_per_subject):
+                card_set = FlashcardSet(title=f'Set {k}', subject_id=subject.id)
+                db.session.add(card_set)
+                db.session.flush()
+                set_ids.append(card_set.id)
+        db.session.commit()
+
+        batch = []
+        for i in range(args.cards):
+            new = rng.random() < args.new_share
+            batch.append({
+                'front': f'Q{i}', 'back': f'A{i}', 'flashcard_set_id': rng.choice(set_ids),
+                'next_review': NEW_CARD_DUE if new else now + timedelta(days=rng.uniform(-60, 60)),
+                'last_reviewed': None if new else now - timedelta(days=1),
+            })
+            if len(batch) == 50000:
+                db.session.execute(insert(Flashcard), batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(Flashcard), batch)
+        db.session.commit()
+
+    subject_id = subject_ids[0]
+
+    def legacy(subject: bool):
+        # The pre-sentinel query: NULL-aware filter, join, NULLS FIRST sort
+        query = Flashcard.query.filter(
+            (Flashcard.next_review <= datetime.utcnow()) | (Flashcard.next_review == None)  # noqa: E711
+        )
+        if subject:
+            query = query.join(FlashcardSet).filter(FlashcardSet.subject_id == subject_id)
+        query.order_by(Flashcard.next_review.asc().nullsfirst()).limit(20).all()
+        db.session.expunge_all()
+
+    def due(subject: bool):
+        due_queue_service.due_cards(subject_id=subject_id if subject else None, limit=20)
+        db.session.expunge_all()
+
+    print(f'{args.cards} cards, {args.subjects} subjects\n')
+    print(f'{"lookup":<22} {"all (ms)":>10} {"subject (ms)":>14}')
+    with app.app_context():
+        indexes = [i for i in Flashcard.__table__.indexes if 'next_review' in i.columns]
+        for index in indexes:
+            index.drop(db.engine)
+        print(f'{"old, unindexed":<22} {timed(lambda: legacy(False), 5):>10.2f} {timed(lambda: legacy(True), 5):>14.2f}')
+        for index in indexes:
+            index.create(db.engine)
+
+        for label, enabled in (('indexed', False), ('precomputed queue', True)):
+            due_queue_service.enabled = enabled
+            if enabled:
+                start = time.perf_counter()
+                queued = due_queue_service.rebuild()
+                print(f'  (queue build: {queued} cards in {time.perf_counter() - start:.2f} s)')
+            everything = timed(lambda: due(False), args.repeat)
+            one_subject = timed(lambda: due(True), args.repeat)
+            print(f'{label:<22} {everything:>10.2f} {one_subject:>14.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark: batch grading of a classroom's submissions.
+
+Creates a quiz of mixed multiple-choice, true/false and short-answer
+questions, then times grading a batch of noisy submissions (option
+letters, boolean synonyms, typos) with a cold and a warm answer key, and
+grading plus recording every submission as an attempt.
+
+    cd backend
+    python benchmarks/bench_grading.py --questions 50 --submissions 1000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def timed(label: str, fn) -> None:
+    start = time.perf_counter()
+    fn()
+    print(f'{label:<34} {(time.perf_counter() - start) * 1000:>10.1f} ms')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--submissions', type=int, default=1000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench.db'
+
+    from app import create_app, db
+    from app.models import Subject, Quiz
+    from app.services.bulk_service import bulk_service
+    from app.services.grading_service import grading_service
+
+    app = create_app()
+    rng = random.Random(1)
+    words = ['osmosis', 'mitochondria', 'photosynthesis', 'ribosome', 'chlorophyll', 'enzyme', 'nucleus']
+
+    def typo(word: str) -> str:
+        i = rng.randrange(len(word) - 1)
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+    with app.app_context():
+        subject = Subject(name='Benchmark')
+        db.session.add(subject)
+        db.session.flush()
+        quiz = Quiz(title='Benchmark', subject_id=subject.id)
+        db.session.add(quiz)
+        db.session.flush()
+
+        questions = []
+        for n in range(args.questions):
+            kind = ('multiple_choice', 'true_false', 'short_answer')[n % 3]
+            if kind == 'multiple_choice':
+                options = rng.sample(words, 4)
+                questions.append({'question': f'Q{n}', 'question_type': kind, 'options': options,
+                                  'correct_answer': options[0]})
+            elif kind == 'true_false':
+                questions.append({'question': f'Q{n}', 'question_type': kind, 'correct_answer': 'True'})
+            else:
+                questions.append({'question': f'Q{n}', 'question_type': kind, 'correct_answer': rng.choice(words)})
+        questions = bulk_service.insert_questions(quiz, questions)
+        db.session.commit()
+
+        def answer(question):
+            if question['question_type'] == 'multiple_choice':
+                return rng.choice(['A', 'a)', '1', question['correct_answer'], 'B'])
+            if question['question_type'] == 'true_false':
+                return rng.choice(['yes', 'T', 'true', 'no'])
+            return rng.choice([question['correct_answer'], typo(question['correct_answer']), 'no idea'])
+
+        submissions = [
+            {'answers': {str(q['id']): answer(q) for q in questions}, 'time_taken_seconds': rng.randint(60, 900)}
+            for _ in range(args.submissions)
+        ]
+
+        print(f'{args.questions} questions, {args.submissions} submissions\n')
+        timed('grade, cold answer key', lambda: grading_service.grade_many(quiz, submissions, record=False))
+        timed('grade, cached answer key', lambda: grading_service.grade_many(quiz, submissions, record=False))
+        timed('grade + record attempts', lambda: grading_service.grade_many(quiz, submissions))
+        db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark: encode time and peak memory of JSON list responses.
+
+Fills a database with notes, then serves ``GET /api/notes`` as one
+``jsonify``'d list (the pre-streaming behaviour, all rows in one page)
+and as a streamed JSON array, with the stdlib encoder and with orjson.
+
+    cd backend
+    python benchmarks/bench_json_streaming.py --rows 20000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def measure(label: str, fn) -> None:
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    # Separate run: tracemalloc itself slows allocation-heavy code down
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:<26} {elapsed:>8.2f} s {peak / 1024 / 1024:>10.1f} MiB {size / 1024 / 1024:>9.1f} MiB')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--words', type=int, default=300, help='Words per note')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench.db'
+
+    from sqlalchemy import insert
+    from app import create_app, db
+    from app.models import Note, Subject
+    from app.utils import serialization
+
+    app = create_app()
+    rng = random.Random(1)
+    words = 'cell energy protein gradient matrix theorem proof lecture exam'.split()
+    with app.app_context():
+        subject = Subject(name='Bench')
+        db.session.add(subject)
+        db.session.commit()
+        db.session.execute(insert(Note), [
+            {'title': f'Note {n}', 'subject_id': subject.id,
+             'content': ' '.join(rng.choices(words, k=args.words))}
+            for n in range(args.rows)
+        ])
+        db.session.commit()
+
+    client = app.test_client()
+
+    def full_list():
+        # The old behaviour: every row built into one list and encoded at once
+        with app.test_request_context('/api/notes'):
+            notes = Note.query.order_by(Note.updated_at.desc(), Note.id.desc()).all()
+            return len(app.json.response([n.to_dict() for n in notes]).get_data())
+
+    def streamed():
+        response = client.get('/api/notes?stream=json')
+        return sum(len(chunk) for chunk in response.response)
+
+    print(f'{args.rows} notes\n')
+    print(f'{"response":<26} {"time":>10} {"peak":>14} {"body":>13}')
+    encoders = [('stdlib', None)]
+    if serialization.orjson is not None:
+        encoders.append(('orjson', serialization.orjson))
+    stdlib_encoder = json.JSONEncoder(default=serialization._default, ensure_ascii=False,
+                                      separators=(',', ':'))
+    for name, module in encoders:
+        if module is None:
+            serialization.encode = lambda obj: stdlib_encoder.encode(obj).encode('utf-8')
+        else:
+            serialization.encode = lambda obj: module.dumps(obj, default=serialization._default,
+                                                            option=serialization._ORJSON_OPTIONS)
+        measure(f'list, {name}', full_list)
+        measure(f'streamed, {name}', streamed)
+
+
+if __name__ == '__main__':
+    main()
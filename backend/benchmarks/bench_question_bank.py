@@ -0,0 +1,93 @@
+"""
+Benchmark: assembling practice quizzes from the question bank.
+
+Fills a subject with many questions spread over several quizzes and a
+history of learners' attempts, then times assembling an adaptive quiz
+(with and without a learner's recent misses) and submitting it. No
+language-model call is made; the bank never runs short here.
+
+    cd backend
+    python benchmarks/bench_question_bank.py --questions 2000 --learners 50
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def timed(label: str, fn, repeat: int = 20) -> None:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    print(f'{label:<40} {(time.perf_counter() - start) * 1000 / repeat:>10.1f} ms')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--questions', type=int, default=2000)
+    parser.add_argument('--learners', type=int, default=50)
+    parser.add_argument('--attempts', type=int, default=20, help='practice quizzes per learner')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench.db'
+
+    from app import create_app, db
+    from app.models import Subject, Quiz
+    from app.services.bulk_service import bulk_service
+
+    app = create_app()
+    client = app.test_client()
+    rng = random.Random(1)
+
+    with app.app_context():
+        subject = Subject(name='Benchmark')
+        db.session.add(subject)
+        db.session.flush()
+        questions = []
+        for offset in range(0, args.questions, 100):
+            quiz = Quiz(title=f'Quiz {offset // 100}', subject_id=subject.id)
+            db.session.add(quiz)
+            db.session.flush()
+            questions += bulk_service.insert_questions(quiz, [
+                {'question': f'Question {n}', 'question_type': ('short_answer', 'true_false')[n % 2],
+                 'correct_answer': f'answer {n}'}
+                for n in range(offset, min(offset + 100, args.questions))
+            ])
+        db.session.commit()
+        subject_id = subject.id
+
+    start = time.perf_counter()
+    for learner in range(args.learners):
+        ability = rng.random()
+        for _ in range(args.attempts):
+            picked = rng.sample(questions, 10)
+            client.post('/api/quizzes/practice', json={
+                'learner': f'learner-{learner}',
+                'question_ids': [q['id'] for q in picked],
+                'answers': {str(q['id']): q['correct_answer'] if rng.random() < ability else 'no idea'
+                            for q in picked},
+            })
+    print(f'{args.questions} questions, {args.learners * args.attempts} practice attempts '
+          f'(history {time.perf_counter() - start:.1f} s)\n')
+
+    body = {'subject_id': subject_id, 'num_questions': 20, 'top_up': False}
+    timed('assemble, no learner', lambda: client.post('/api/quizzes/assemble', json=body))
+    timed('assemble, learner with history',
+          lambda: client.post('/api/quizzes/assemble', json={**body, 'learner': 'learner-0'}))
+    timed('assemble, one question type',
+          lambda: client.post('/api/quizzes/assemble', json={**body, 'learner': 'learner-0',
+                                                             'question_types': ['true_false']}))
+
+    quiz = client.post('/api/quizzes/assemble', json={**body, 'learner': 'learner-0'}).json
+    submission = {'learner': 'learner-0', 'question_ids': [q['id'] for q in quiz['questions']],
+                  'answers': {str(q['id']): q['correct_answer'] for q in quiz['questions']}}
+    timed('submit an assembled quiz', lambda: client.post('/api/quizzes/practice', json=submission))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark: per-question statistics from running totals vs. from raw answers.
+
+Fills one quiz with many graded attempts, then times reading every
+question's statistics from ``question_stats`` against aggregating
+``quiz_attempt_answers`` directly, and the cost the running totals add to
+one submission.
+
+    cd backend
+    python benchmarks/bench_question_stats.py --questions 50 --attempts 20000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def timed(label: str, fn, repeat: int = 5) -> None:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    print(f'{label:<40} {(time.perf_counter() - start) * 1000 / repeat:>10.1f} ms')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--attempts', type=int, default=20000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench.db'
+
+    from sqlalchemy import case, func, insert, select
+    from app import create_app, db
+    from app.models import Subject, Quiz, QuizAttempt, QuizAttemptAnswer
+    from app.services.bulk_service import bulk_service
+    from app.services.question_stats_service import question_stats_service
+
+    app = create_app()
+    rng = random.Random(1)
+
+    with app.app_context():
+        subject = Subject(name='Benchmark')
+        db.session.add(subject)
+        db.session.flush()
+        quiz = Quiz(title='Benchmark', subject_id=subject.id)
+        db.session.add(quiz)
+        db.session.flush()
+        questions = bulk_service.insert_questions(quiz, [
+            {'question': f'Question {n}', 'correct_answer': f'answer {n}'} for n in range(args.questions)
+        ])
+
+        # Raw rows without the write hooks; the statistics are rebuilt once below
+        for offset in range(0, args.attempts, 2000):
+            count = min(2000, args.attempts - offset)
+            results = [[rng.random() < 0.6 for _ in questions] for _ in range(count)]
+            attempt_ids = db.session.execute(
+                insert(QuizAttempt).returning(QuizAttempt.id, sort_by_parameter_order=True),
+                [{'quiz_id': quiz.id, 'score': sum(r), 'total_points': len(r),
+                  'time_taken_seconds': rng.randint(60, 900)} for r in results]
+            ).scalars().all()
+            db.session.execute(insert(QuizAttemptAnswer), [
+                {'attempt_id': attempt_id, 'question_id': question['id'], 'answer': 'x',
+                 'is_correct': ok, 'points_awarded': int(ok)}
+                for attempt_id, r in zip(attempt_ids, results) for question, ok in zip(questions, r)
+            ])
+        start = time.perf_counter()
+        question_stats_service.rebuild(db.session.connection(), [subject.id])
+        db.session.commit()
+        print(f'{args.questions} questions, {args.attempts} attempts '
+              f'(rebuild {time.perf_counter() - start:.1f} s)\n')
+
+        def from_answers():
+            db.session.execute(
+                select(QuizAttemptAnswer.question_id, func.count(),
+                       func.sum(case((QuizAttemptAnswer.is_correct, 1), else_=0)))
+                .join(QuizAttempt, QuizAttempt.id == QuizAttemptAnswer.attempt_id)
+                .where(QuizAttempt.quiz_id == quiz.id)
+                .group_by(QuizAttemptAnswer.question_id)
+            ).all()
+
+        timed('counts aggregated from raw answers', from_answers)
+        timed('full statistics from running totals', lambda: question_stats_service.quiz_stats(quiz.id))
+
+        client = app.test_client()
+        body = {'answers': {str(q['id']): f'answer {n}' for n, q in enumerate(questions)}, 'time_taken_seconds': 300}
+        timed('one submission (grading + totals)', lambda: client.post(f'/api/quizzes/{quiz.id}/submit', json=body))
+
+
+if __name__ == '__main__':
+    main()
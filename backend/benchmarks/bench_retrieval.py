@@ -0,0 +1,82 @@
+"""
+Benchmark: retrieving tutor passages from a subject's notes and lectures.
+
+Fills one subject with synthetic lecture transcriptions and notes, then
+times chunking and indexing them, building the subject's matrix on the
+first lookup, and warm lookups against it. No language-model call is
+made.
+
+    cd backend
+    python benchmarks/bench_retrieval.py --lectures 40 --words 10000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def timed(label: str, fn, repeat: int = 1) -> None:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    print(f'{label:<40} {(time.perf_counter() - start) * 1000 / repeat:>10.1f} ms')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--lectures', type=int, default=40)
+    parser.add_argument('--words', type=int, default=10000, help='words per transcription')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench.db'
+
+    from app import create_app, db
+    from app.models import Lecture, Note, Subject, TextChunk
+    from app.services.retrieval_service import retrieval_service
+
+    app = create_app()
+    rng = random.Random(1)
+    vocabulary = [f'term{n}' for n in range(20000)]
+    weights = [1 / (n + 1) for n in range(len(vocabulary))]
+
+    def text(words: int) -> str:
+        return ' '.join(rng.choices(vocabulary, weights, k=words))
+
+    with app.app_context():
+        subject = Subject(name='Benchmark')
+        db.session.add(subject)
+        db.session.commit()
+
+        def write():
+            for n in range(args.lectures):
+                lecture = Lecture(title=f'Lecture {n}', subject_id=subject.id, source_type='upload',
+                                  transcription=text(args.words))
+                db.session.add(lecture)
+                db.session.flush()
+                db.session.add(Note(title=f'Notes {n}', content=text(args.words // 10), subject_id=subject.id,
+                                    lecture_id=lecture.id))
+            db.session.commit()
+
+        timed(f'chunk + index {args.lectures} lectures and notes', write)
+        chunks = TextChunk.query.filter_by(subject_id=subject.id).count()
+        print(f'{chunks} passages\n')
+
+        queries = [text(12) for _ in range(200)]
+        timed('first lookup (builds the matrix)', lambda: retrieval_service.search(subject.id, queries[0]))
+        timed('warm lookup, top 4', lambda: retrieval_service.search(subject.id, rng.choice(queries)), repeat=200)
+        timed('warm lookup, top 20',
+              lambda: retrieval_service.search(subject.id, rng.choice(queries), k=20), repeat=200)
+
+        lecture = Lecture.query.filter_by(subject_id=subject.id).first()
+        timed('re-index one edited transcription', lambda: (
+            setattr(lecture, 'transcription', text(args.words)), db.session.commit()
+        ), repeat=5)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark: review analytics over a large review log.
+
+Fills ``review_log`` with synthetic reviews across many sets, then times
+the first (cold) load into arrays, a report after a few hundred new
+reviews are appended (the steady state), and a report filtered to one
+set.
+
+    cd backend
+    python benchmarks/bench_review_analytics.py --events 2000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def timed(label: str, fn) -> None:
+    start = time.perf_counter()
+    fn()
+    print(f'{label:<34} {(time.perf_counter() - start) * 1000:>10.1f} ms')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--events', type=int, default=2000000)
+    parser.add_argument('--sets', type=int, default=500)
+    parser.add_argument('--append', type=int, default=500, help='Reviews appended before the warm report')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench.db'
+
+    from sqlalchemy import insert
+    from app import create_app, db
+    from app.models import ReviewLog
+    from app.services.analytics_service import analytics_service
+
+    app = create_app()
+    rng = np.random.default_rng(1)
+
+    def rows(n: int, start_ts: int):
+        elapsed = rng.gamma(1.5, 8.0, n)
+        recalled = rng.random(n) < np.exp(-elapsed / 40)
+        first = rng.random(n) < 0.1
+        return [
+            {'flashcard_id': int(card), 'flashcard_set_id': int(card % args.sets) + 1, 'ts': int(ts),
+             'grade': 3 if ok else 1, 'elapsed_days': None if new else float(days)}
+            for card, ts, ok, new, days in zip(rng.integers(1, n // 5 + 2, n), start_ts + np.arange(n),
+                                               recalled, first, elapsed)
+        ]
+
+    with app.app_context():
+        for offset in range(0, args.events, 100000):
+            db.session.execute(insert(ReviewLog), rows(min(100000, args.events - offset), 1700000000 + offset))
+        db.session.commit()
+
+        print(f'{args.events} review events, {args.sets} sets\n')
+        timed('cold load + report', lambda: analytics_service.report(days=30))
+        db.session.execute(insert(ReviewLog), rows(args.append, 1800000000))
+        db.session.commit()
+        timed(f'report after {args.append} new reviews', lambda: analytics_service.report(days=30))
+        timed('report, one set', lambda: analytics_service.report(set_id=1, days=30))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: cards/second for scheduling and bulk rescheduling.
+
+Measures the vectorized FSRS/SM-2 review and interval math on in-memory
+arrays, the same math card by card (as a per-row loop would run it), and
+``scheduler_service.reschedule`` end to end against a SQLite database:
+load, schedule and write back every reviewed card.
+
+    cd backend
+    python benchmarks/bench_scheduler.py --cards 200000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def rate(label: str, cards: int, fn) -> None:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f'{label:<34} {elapsed:>8.3f} s {cards / elapsed:>14,.0f} cards/s')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cards', type=int, default=200000)
+    parser.add_argument('--loop-cards', type=int, default=20000, help='Cards for the per-card loop')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench.db'
+
+    from sqlalchemy import insert
+    from app import create_app, db
+    from app.models import Flashcard, FlashcardSet, Subject
+    from app.services.scheduler_service import FSRSScheduler, SM2Scheduler, scheduler_service
+
+    rng = np.random.default_rng(1)
+    n = args.cards
+    stability = rng.gamma(2.0, 10.0, n)
+    difficulty = rng.uniform(1, 10, n)
+    elapsed = rng.uniform(0, 60, n)
+    grades = rng.integers(1, 5, n)
+
+    print(f'{n} cards\n')
+    for scheduler in (FSRSScheduler(), SM2Scheduler()):
+        def vectorized():
+            s, d = scheduler.review(stability, difficulty, elapsed, grades)
+            scheduler.interval(s, d)
+        rate(f'{scheduler.name} review, vectorized', n, vectorized)
+
+        loop = min(args.loop_cards, n)
+
+        def per_card():
+            for i in range(loop):
+                s, d = scheduler.review(stability[i:i + 1], difficulty[i:i + 1], elapsed[i:i + 1], grades[i:i + 1])
+                scheduler.interval(s, d)
+        rate(f'{scheduler.name} review, per card', loop, per_card)
+
+    app = create_app()
+    random_ = random.Random(1)
+    now = datetime.utcnow()
+    with app.app_context():
+        subject = Subject(name='Bench')
+        db.session.add(subject)
+        db.session.flush()
+        card_set = FlashcardSet(title='Bench', subject_id=subject.id)
+        db.session.add(card_set)
+        db.session.commit()
+        rows = []
+        for i in range(n):
+            last = now - timedelta(days=random_.uniform(0, 60))
+            rows.append({
+                'front': f'Q{i}', 'back': f'A{i}', 'flashcard_set_id': card_set.id,
+                'times_reviewed': 3, 'times_correct': 2, 'difficulty': 2,
+                'stability': float(stability[i]), 'memory_difficulty': float(difficulty[i]),
+                'last_reviewed': last, 'next_review': last + timedelta(days=4),
+            })
+        db.session.execute(insert(Flashcard), rows)
+        db.session.commit()
+
+        scheduler_service.scheduler = FSRSScheduler(desired_retention=0.85)
+        rate('reschedule, SQLite end to end', n, scheduler_service.reschedule)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark: SQLite write throughput with N concurrent worker processes.
+
+Each worker runs short write transactions shaped like flashcard reviews
+(update a card, append a chat-sized row) against one database file while
+also reading, first with SQLite's default settings and then with the
+engine profile from ``app.utils.database``.
+
+    cd backend
+    python benchmarks/bench_sqlite_concurrency.py --workers 1 2 4 8
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from app.utils.database import configure_engine, engine_options  # noqa: E402
+
+
+def make_engine(path: str, tuned: bool):
+    url = f'sqlite:///{path}'
+    if not tuned:
+        # pysqlite waits 5s by default; the pre-tuning app effectively had no busy handling
+        return create_engine(url, connect_args={'timeout': 0})
+    engine = create_engine(url, **engine_options(url))
+    configure_engine(engine)
+    return engine
+
+
+def setup(path: str, tuned: bool) -> None:
+    engine = make_engine(path, tuned)
+    with engine.begin() as connection:
+        connection.execute(text(
+            'CREATE TABLE cards (id INTEGER PRIMARY KEY, times_reviewed INTEGER, next_review TEXT)'
+        ))
+        connection.execute(text(
+            'CREATE TABLE messages (id INTEGER PRIMARY KEY, session_id TEXT, content TEXT)'
+        ))
+        connection.execute(text('INSERT INTO cards (id, times_reviewed) VALUES (:id, 0)'),
+                           [{'id': i} for i in range(1, 1001)])
+    engine.dispose()
+
+
+def worker(path: str, tuned: bool, transactions: int, seed: int, results) -> None:
+    engine = make_engine(path, tuned)
+    done = failed = 0
+    for i in range(transactions):
+        card_id = (seed * 7919 + i) % 1000 + 1
+        try:
+            with engine.connect() as connection:
+                connection.execute(text('SELECT * FROM cards WHERE id = :id'), {'id': card_id}).all()
+            with engine.begin() as connection:
+                connection.execute(text(
+                    "UPDATE cards SET times_reviewed = times_reviewed + 1, "
+                    "next_review = datetime('now', '+1 day') WHERE id = :id"
+                ), {'id': card_id})
+                connection.execute(text(
+                    'INSERT INTO messages (session_id, content) VALUES (:session, :content)'
+                ), {'session': f'worker-{seed}', 'content': 'x' * 400})
+            done += 1
+        except OperationalError:
+            failed += 1
+    engine.dispose()
+    results.put((done, failed))
+
+
+def run(workers: int, tuned: bool, transactions: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        setup(path, tuned)
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=worker, args=(path, tuned, transactions, n, results))
+            for n in range(workers)
+        ]
+        start = time.perf_counter()
+        for p in processes:
+            p.start()
+        totals = [results.get() for _ in processes]
+        for p in processes:
+            p.join()
+        elapsed = time.perf_counter() - start
+
+    done = sum(t[0] for t in totals)
+    failed = sum(t[1] for t in totals)
+    label = 'tuned (WAL)' if tuned else 'default'
+    print(f'{label:<12} {workers:>7} {done / elapsed:>12.0f} {failed:>10}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--transactions', type=int, default=500, help='Per worker')
+    args = parser.parse_args()
+
+    print(f'{"profile":<12} {"workers":>7} {"commits/s":>12} {"locked":>10}')
+    for workers in args.workers:
+        for tuned in (False, True):
+            run(workers, tuned, args.transactions)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark: delta sync cost against collection size.
+
+Fills a subject with many cards, then times a full sync (every page), a
+sync after a handful of edits, and the old way of staying current:
+re-downloading every flashcard set with its cards.
+
+    cd backend
+    python benchmarks/bench_sync.py --cards 200000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def timed(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f'{label:<34} {(time.perf_counter() - start) * 1000:>10.1f} ms')
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cards', type=int, default=200000)
+    parser.add_argument('--sets', type=int, default=100)
+    parser.add_argument('--edits', type=int, default=20)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench.db'
+
+    from app import create_app, db
+    from app.models import Flashcard, FlashcardSet, Subject
+    from app.services.bulk_service import bulk_service
+    from app.services.sync_service import MAX_SYNC_LIMIT
+
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        subject = Subject(name='Bench')
+        db.session.add(subject)
+        db.session.flush()
+        sets = [FlashcardSet(title=f'Set {k}', subject_id=subject.id) for k in range(args.sets)]
+        db.session.add_all(sets)
+        db.session.flush()
+        per_set = args.cards // args.sets
+        for card_set in sets:
+            bulk_service.insert_flashcards(card_set, [
+                {'front': f'Front {card_set.id}-{i}', 'back': f'Back {i}'} for i in range(per_set)
+            ])
+        db.session.commit()
+        set_ids = [s.id for s in sets]
+
+    def full_sync():
+        token, pages = '', 0
+        while True:
+            page = client.get(f'/api/sync?since={token}&limit={MAX_SYNC_LIMIT}').json
+            token, pages = page['token'], pages + 1
+            if not page['has_more']:
+                return token
+
+    def download_sets():
+        for set_id in set_ids:
+            client.get(f'/api/flashcards/sets/{set_id}')
+
+    print(f'{args.cards} cards in {args.sets} sets\n')
+    token = timed('full sync (all pages)', full_sync)
+    with app.app_context():
+        for card in Flashcard.query.limit(args.edits):
+            card.back += ' (edited)'
+        db.session.commit()
+    page = timed(f'delta sync after {args.edits} edits', lambda: client.get(f'/api/sync?since={token}').json)
+    print(f"  {len(page['changes']['flashcards'])} cards returned")
+    timed('re-download every set', download_sets)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark: table size and row fetch time for plain vs compressed text columns.
+
+Generates synthetic lecture transcripts, stores them in a plain ``Text``
+table and in ``CompressedText`` tables (with and without a trained
+dictionary), then reports on-disk size and the time to fetch rows back.
+
+    cd backend
+    python -m benchmarks.bench_text_compression --rows 2000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text, create_engine, select  # noqa: E402
+from app.models.types import CompressedText, default_codec, dictionaries, train_dictionary  # noqa: E402
+
+
+VOCABULARY = (
+    "the a of and to in is that for it as with was on be this are by we so "
+    "you can at which from or an have not but what all were when there "
+    "um uh okay right now let's look at example equation function energy cell "
+    "protein gradient derivative integral matrix vector theorem proof lecture "
+    "professor students exam homework chapter slide question answer because "
+    "therefore remember important notice basically actually essentially"
+).split()
+
+
+def synthetic_transcript(rng: random.Random, words: int) -> str:
+    weights = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+    sentence = []
+    out = []
+    for word in rng.choices(VOCABULARY, weights=weights, k=words):
+        sentence.append(word)
+        if len(sentence) > rng.randint(8, 20):
+            out.append(' '.join(sentence).capitalize() + '.')
+            sentence = []
+    return ' '.join(out)
+
+
+def measure(label: str, column_type, transcripts, directory: str) -> None:
+    path = os.path.join(directory, f'{label}.db')
+    engine = create_engine(f'sqlite:///{path}')
+    metadata = MetaData()
+    table = Table('lectures', metadata,
+                  Column('id', Integer, primary_key=True),
+                  Column('transcription', column_type))
+    metadata.create_all(engine)
+
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        connection.execute(table.insert(), [{'transcription': t} for t in transcripts])
+    write_seconds = time.perf_counter() - start
+
+    with engine.connect() as connection:
+        connection.exec_driver_sql('VACUUM')
+    size = os.path.getsize(path)
+
+    ids = list(range(1, len(transcripts) + 1))
+    random.Random(1).shuffle(ids)
+    start = time.perf_counter()
+    with engine.connect() as connection:
+        for row_id in ids[:500]:
+            connection.execute(select(table.c.transcription).where(table.c.id == row_id)).scalar()
+    fetch_ms = (time.perf_counter() - start) / min(500, len(ids)) * 1000
+
+    engine.dispose()
+    print(f'{label:<22} {size / 1024 / 1024:>9.2f} MiB {write_seconds:>9.2f} s {fetch_ms:>12.3f} ms')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--words', type=int, default=6000, help='Words per transcript')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    transcripts = [synthetic_transcript(rng, args.words) for _ in range(args.rows)]
+    raw_mib = sum(len(t.encode('utf-8')) for t in transcripts) / 1024 / 1024
+    print(f'{args.rows} transcripts, {raw_mib:.1f} MiB of text, codec={default_codec()}\n')
+    print(f'{"storage":<22} {"table size":>13} {"write":>11} {"fetch / row":>15}')
+
+    with tempfile.TemporaryDirectory() as directory:
+        measure('plain text', Text(), transcripts, directory)
+        measure('compressed', CompressedText(), transcripts, directory)
+        dictionaries.register(default_codec(), train_dictionary(transcripts[:200]))
+        measure('compressed + dict', CompressedText(), transcripts, directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Short-answer matching of compiled answer keys, and when grading may call the language model.
+
+    cd backend
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.grading_service import AnswerKey  # noqa: E402
+
+
+def short_answer(correct_answer: str) -> AnswerKey:
+    return AnswerKey(1, 'Question?', 'short_answer', None, correct_answer, None, 1)
+
+
+@pytest.mark.parametrize('correct_answer, answer', [
+    ('Exothermic', 'endothermic'),
+    ('Hypertonic', 'hypotonic'),
+    ('Hyperthermia', 'hypothermia'),
+    ('Hyperglycemia', 'hypoglycemia'),
+    ('Mitosis', 'meiosis'),
+    ('Increase', 'decrease'),
+    ('Anode', 'anion'),
+    ('1945', '1946'),
+])
+def test_opposites_and_near_misses_are_wrong(correct_answer, answer):
+    assert not short_answer(correct_answer).matches(answer)
+
+
+@pytest.mark.parametrize('correct_answer, answer', [
+    ('Photosynthesis', 'photosynthesys'),
+    ('Photosynthesis', 'photosinthesys'),
+    ('Exothermic', 'exothremic'),
+    ('The Mitochondria', 'mitochondira'),
+    ('Carbon dioxide', 'carbon dioxid'),
+    ('Équilibrium', 'equilibrium'),
+])
+def test_typos_after_the_prefix_are_accepted(correct_answer, answer):
+    assert short_answer(correct_answer).matches(answer)
+
+
+def test_short_words_must_match_exactly():
+    key = short_answer('Cell wall')
+    assert key.matches('cell walls') is False
+    assert key.matches('CELL WALL!')
+
+
+@pytest.mark.parametrize('configured, requested, enabled', [
+    (False, True, False),
+    (False, None, False),
+    (True, None, True),
+    (True, True, True),
+    (True, False, False),
+])
+def test_requests_can_only_turn_semantic_grading_off(configured, requested, enabled):
+    from flask import Flask
+    from app.services.grading_service import GradingService
+
+    app = Flask(__name__)
+    app.config['SEMANTIC_GRADING'] = configured
+    with app.app_context():
+        assert GradingService.semantic_enabled(requested) is enabled
@@ -0,0 +1,43 @@
+"""
+ETags of flashcard sets follow their cards without moving ``updated_at``.
+
+    cd backend
+    python -m pytest -q tests
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='module')
+def client():
+    os.environ['DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp()}/conditional.db'
+    os.environ.pop('DATABASE_REPLICA_URLS', None)
+
+    from app import create_app
+    return create_app().test_client()
+
+
+def test_review_changes_etag_but_not_updated_at(client):
+    subject = client.post('/api/subjects', json={'name': 'Biology'}).get_json()
+    flashcard_set = client.post('/api/flashcards/sets', json={'title': 'Cells', 'subject_id': subject['id']}).get_json()
+    card = client.post('/api/flashcards', json={
+        'flashcard_set_id': flashcard_set['id'], 'front': 'Powerhouse of the cell?', 'back': 'Mitochondria'
+    }).get_json()
+
+    before = client.get(f"/api/flashcards/sets/{flashcard_set['id']}")
+    assert client.get(f"/api/flashcards/sets/{flashcard_set['id']}",
+                      headers={'If-None-Match': before.headers['ETag']}).status_code == 304
+
+    assert client.post(f"/api/flashcards/{card['id']}/review", json={'grade': 3}).status_code == 200
+
+    after = client.get(f"/api/flashcards/sets/{flashcard_set['id']}")
+    assert after.headers['ETag'] != before.headers['ETag']
+    assert after.get_json()['updated_at'] == before.get_json()['updated_at']
+
+    listed = client.get(f"/api/flashcards/sets?subject_id={subject['id']}")
+    assert listed.get_json()[0]['updated_at'] == before.get_json()['updated_at']
@@ -0,0 +1,52 @@
+"""
+Batched subject deletion keeps validators, dashboards and cached results current between batches.
+
+    cd backend
+    python -m pytest -q tests
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='module')
+def client():
+    os.environ['DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp()}/deletion.db'
+    os.environ.pop('DATABASE_REPLICA_URLS', None)
+
+    from app import create_app
+    return create_app().test_client()
+
+
+def test_every_batch_is_visible_to_readers(client, monkeypatch):
+    from app.services import cache_service, deletion_service
+
+    subject = client.post('/api/subjects', json={'name': 'Physics'}).get_json()
+    flashcard_set = client.post('/api/flashcards/sets', json={'title': 'Units', 'subject_id': subject['id']}).get_json()
+    for front, back in [('Force?', 'Newton'), ('Energy?', 'Joule'), ('Power?', 'Watt')]:
+        client.post('/api/flashcards', json={'flashcard_set_id': flashcard_set['id'], 'front': front, 'back': back})
+
+    def observe():
+        return (client.get(f"/api/subjects/{subject['id']}/dashboard").get_json()['counts']['flashcards'],
+                client.get(f"/api/flashcards/sets/{flashcard_set['id']}").headers.get('ETag'))
+
+    seen = [observe()]
+    bump = cache_service.bump
+
+    def bump_and_observe(subject_ids):
+        bump(subject_ids)
+        if len(seen) == 1:
+            seen.append(observe())
+
+    monkeypatch.setattr(cache_service, 'bump', bump_and_observe)
+    with client.application.app_context():
+        assert deletion_service.delete_subject(subject['id'], batch_size=2) == 4
+
+    (cards_before, etag_before), (cards_after, etag_after) = seen
+    assert (cards_before, cards_after) == (3, 1)
+    assert etag_after != etag_before
+    assert client.get(f"/api/subjects/{subject['id']}").status_code == 404
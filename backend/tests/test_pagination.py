@@ -0,0 +1,58 @@
+"""
+Cursor decoding for keyset-paginated endpoints.
+
+    cd backend
+    python -m pytest -q tests
+"""
+import base64
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.pagination import decode_cursor, encode_cursor  # noqa: E402
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+
+def test_round_trip():
+    sort_value, row_id = decode_cursor(encode_cursor('2020-01-01T00:00:00', 7))
+    assert (sort_value.year, row_id) == (2020, 7)
+    assert decode_cursor(encode_cursor('2020-01-01T00:00:00', 'abc'), str)[1] == 'abc'
+
+
+@pytest.mark.parametrize('cursor, id_type', [
+    ('not a cursor', int),
+    (raw_cursor(['2020-01-01T00:00:00', {'a': 1}]), int),
+    (raw_cursor(['2020-01-01T00:00:00', [1]]), int),
+    (raw_cursor(['2020-01-01T00:00:00', True]), int),
+    (raw_cursor(['2020-01-01T00:00:00', '7']), int),
+    (raw_cursor(['2020-01-01T00:00:00', 7]), str),
+    (raw_cursor([{'a': 1}, 7]), int),
+    (raw_cursor(['2020-01-01T00:00:00']), int),
+])
+def test_malformed_cursors_are_rejected(cursor, id_type):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, id_type)
+
+
+@pytest.fixture(scope='module')
+def client():
+    os.environ['DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp()}/pagination.db'
+    os.environ.pop('DATABASE_REPLICA_URLS', None)
+
+    from app import create_app
+    return create_app().test_client()
+
+
+def test_malformed_cursor_is_a_bad_request(client):
+    cursor = raw_cursor(['2020-01-01T00:00:00', {'a': 1}])
+    assert client.get(f'/api/notes?cursor={cursor}').status_code == 400
+    assert client.get(f'/api/tutor/sessions?cursor={cursor}').status_code == 400
+    assert client.get(f'/api/tutor/sessions/abc?cursor={cursor}').status_code == 400
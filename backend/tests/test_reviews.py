@@ -0,0 +1,89 @@
+"""
+Review grades and batches of offline review events.
+
+    cd backend
+    python -m pytest -q tests
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='module')
+def client():
+    os.environ['DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp()}/reviews.db'
+    os.environ.pop('DATABASE_REPLICA_URLS', None)
+
+    from app import create_app
+    return create_app().test_client()
+
+
+@pytest.fixture
+def card(client):
+    subject = client.post('/api/subjects', json={'name': 'Chemistry'}).get_json()
+    flashcard_set = client.post('/api/flashcards/sets', json={'title': 'Bonds', 'subject_id': subject['id']}).get_json()
+    return client.post('/api/flashcards', json={
+        'flashcard_set_id': flashcard_set['id'], 'front': 'Bond sharing electrons?', 'back': 'Covalent'
+    }).get_json()
+
+
+def review(client, events):
+    return client.post('/api/flashcards/reviews', json={'events': events})
+
+
+@pytest.mark.parametrize('grade', [3.7, True, 0, 5, 'good'])
+def test_unusable_grades_are_rejected(client, card, grade):
+    assert client.post(f"/api/flashcards/{card['id']}/review", json={'grade': grade}).status_code == 400
+    assert review(client, [{'event_id': 'g', 'card_id': card['id'], 'grade': grade}]).status_code == 400
+
+
+def test_whole_number_grades_are_accepted(client, card):
+    assert client.post(f"/api/flashcards/{card['id']}/review", json={'grade': 3.0}).status_code == 200
+
+
+def test_events_are_applied_in_review_order(client, card):
+    response = review(client, [
+        {'event_id': 'late', 'card_id': card['id'], 'grade': 3, 'reviewed_at': '2026-01-10T00:00:00'},
+        {'event_id': 'early', 'card_id': card['id'], 'grade': 3, 'reviewed_at': '2026-01-01T00:00:00'},
+    ])
+    assert response.status_code == 200
+    reviewed = response.get_json()['cards'][0]
+    assert reviewed['last_reviewed'].startswith('2026-01-10')
+    assert reviewed['times_reviewed'] == 2
+
+
+def test_events_older_than_last_review_leave_schedule_alone(client, card):
+    first = review(client, [
+        {'event_id': 'recent', 'card_id': card['id'], 'grade': 3, 'reviewed_at': '2026-02-10T00:00:00'},
+    ]).get_json()['cards'][0]
+    stale = review(client, [
+        {'event_id': 'stale', 'card_id': card['id'], 'grade': 1, 'reviewed_at': '2026-02-01T00:00:00'},
+    ]).get_json()['cards'][0]
+
+    assert (stale['last_reviewed'], stale['next_review']) == (first['last_reviewed'], first['next_review'])
+    assert stale['times_reviewed'] == first['times_reviewed'] + 1
+
+
+def test_reschedule_retires_cached_results(client, card):
+    from app.services.cache_service import ALL_SUBJECTS, cache_service
+    from app.services.scheduler_service import scheduler_service
+
+    client.post(f"/api/flashcards/{card['id']}/review", json={'grade': 3})
+    version, = cache_service.backend.versions([ALL_SUBJECTS])
+    with client.application.app_context():
+        assert scheduler_service.reschedule() > 0
+    assert cache_service.backend.versions([ALL_SUBJECTS]) == [version + 1]
+
+
+def test_new_set_does_not_inherit_a_deleted_sets_reviews(client, card):
+    client.post(f"/api/flashcards/{card['id']}/review", json={'grade': 3})
+    client.delete(f"/api/flashcards/sets/{card['flashcard_set_id']}")
+
+    subject_id = client.get('/api/subjects').get_json()[-1]['id']
+    flashcard_set = client.post('/api/flashcards/sets', json={'title': 'Again', 'subject_id': subject_id}).get_json()
+    assert flashcard_set['id'] != card['flashcard_set_id']
+    assert client.get(f"/api/flashcards/analytics?set_id={flashcard_set['id']}").get_json()['reviews'] == 0
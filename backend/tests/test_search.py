@@ -0,0 +1,55 @@
+"""
+Full-text search results, highlighted from the source rows.
+
+    cd backend
+    python -m pytest -q tests
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.search_service import _matcher, highlight, snippet  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def client():
+    os.environ['DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp()}/search.db'
+    os.environ.pop('DATABASE_REPLICA_URLS', None)
+
+    from app import create_app
+    return create_app().test_client()
+
+
+def test_highlight_matches_stems_and_prefixes():
+    matches = _matcher('cell divid')
+    assert highlight('Cells divide', matches) == '<mark>Cells</mark> <mark>divide</mark>'
+    assert highlight('Excellent', matches) == 'Excellent'
+
+
+def test_snippet_picks_the_densest_window():
+    words = ['filler'] * 50 + ['osmosis', 'moves', 'water', 'by', 'osmosis'] + ['filler'] * 50
+    result = snippet(' '.join(words), _matcher('osmosis'), words=10)
+    assert result.startswith('…') and result.endswith('…')
+    assert result.count('<mark>osmosis</mark>') == 2
+
+
+def test_results_follow_edits_and_deletes(client):
+    subject = client.post('/api/subjects', json={'name': 'Biology'}).get_json()
+    note = client.post('/api/notes', json={
+        'title': 'Membranes', 'content': 'Water crosses membranes by osmosis.', 'subject_id': subject['id']
+    }).get_json()
+
+    results = client.get('/api/search?q=osmosis').get_json()['results']
+    assert [(r['type'], r['id']) for r in results] == [('note', note['id'])]
+    assert results[0]['snippet'] == 'Water crosses membranes by <mark>osmosis</mark>.'
+
+    client.put(f"/api/notes/{note['id']}", json={'content': 'Solutes move by diffusion.'})
+    assert client.get('/api/search?q=osmosis').get_json()['results'] == []
+    assert client.get('/api/search?q=diffusion').get_json()['results'][0]['title'] == 'Membranes'
+
+    client.delete(f"/api/subjects/{subject['id']}")
+    assert client.get('/api/search?q=diffusion').get_json()['results'] == []
@@ -0,0 +1,67 @@
+"""
+Delta sync for offline clients: changes and tombstones after a token.
+
+    cd backend
+    python -m pytest -q tests
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='module')
+def client():
+    os.environ['DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp()}/sync.db'
+    os.environ.pop('DATABASE_REPLICA_URLS', None)
+
+    from app import create_app
+    return create_app().test_client()
+
+
+@pytest.fixture
+def subject(client):
+    return client.post('/api/subjects', json={'name': 'History'}).get_json()
+
+
+def sync(client, token=None):
+    response = client.get('/api/sync' + (f'?since={token}' if token else ''))
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_delta_carries_creates_updates_and_deletes(client, subject):
+    token = sync(client)['token']
+    note = client.post('/api/notes', json={'title': 'Rome', 'content': 'Founded 753 BC', 'subject_id': subject['id']})
+    note = note.get_json()
+
+    delta = sync(client, token)
+    assert [n['id'] for n in delta['changes']['notes']] == [note['id']]
+
+    client.put(f"/api/notes/{note['id']}", json={'title': 'Ancient Rome'})
+    delta = sync(client, delta['token'])
+    assert [n['title'] for n in delta['changes']['notes']] == ['Ancient Rome']
+
+    client.delete(f"/api/notes/{note['id']}")
+    delta = sync(client, delta['token'])
+    assert delta['deleted']['notes'] == [note['id']]
+    assert sync(client, delta['token'])['token'] == delta['token']
+
+
+def test_deleting_a_lecture_tombstones_its_notes(client, subject):
+    lecture = client.post('/api/lectures', json={
+        'title': 'Empires', 'subject_id': subject['id'], 'transcription': 'Rome and Carthage'
+    }).get_json()
+    note = client.post('/api/notes', json={
+        'title': 'Punic wars', 'content': 'Three wars', 'subject_id': subject['id'], 'lecture_id': lecture['id']
+    }).get_json()
+    token = sync(client)['token']
+
+    assert client.delete(f"/api/lectures/{lecture['id']}").status_code == 200
+
+    delta = sync(client, token)
+    assert delta['deleted']['notes'] == [note['id']]
+    assert delta['token'] != token
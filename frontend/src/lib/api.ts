@@ -26,8 +26,10 @@ async function fetchApi<T>(
     'Content-Type': 'application/json',
   };
 
+  // Credentials carry the backend's read-your-writes cookie across origins
   const response = await fetch(url, {
     ...options,
+    credentials: 'include',
     headers: {
       ...defaultHeaders,
       ...options.headers,
@@ -115,6 +117,7 @@ export const lecturesApi = {
     return fetch(`${API_BASE_URL}/lectures/upload-audio`, {
       method: 'POST',
       body: formData,
+      credentials: 'include',
     }).then(async (response) => {
       if (!response.ok) {
         const errorData = await response.json().catch(() => ({}));
@@ -142,6 +145,7 @@ export const lecturesApi = {
     return fetch(`${API_BASE_URL}/lectures/upload-document`, {
       method: 'POST',
       body: formData,
+      credentials: 'include',
     }).then(async (response) => {
       if (!response.ok) {
         const errorData = await response.json().catch(() => ({}));